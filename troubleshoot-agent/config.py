@@ -13,20 +13,114 @@ load_dotenv(dotenv_path=_env_path)
 
 # --- Embedding & LLM ---
 EMBEDDING_MODEL = "text-embedding-3-small"  # OpenAI; 1536 dims, cost-effective
+# "openai" (EMBEDDING_MODEL over the API) | "local" (CPU ONNX sentence-embedding model, no network per query).
+# Each backend gets its own collection/index (vector sizes differ); re-run ingest.py after switching.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_LOCAL_MODEL = "all-MiniLM-L6-v2"  # 384 dims; ONNX export fetched once from the Hugging Face hub
+EMBEDDING_LOCAL_HUB_REPO = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_LOCAL_ONNX_FILE = "onnx/model.onnx"  # Path of the export inside EMBEDDING_LOCAL_HUB_REPO
+# Optional directory with model.onnx + tokenizer.json (e.g. an int8-quantized export); overrides the hub model
+EMBEDDING_LOCAL_MODEL_DIR = os.getenv("EMBEDDING_LOCAL_MODEL_DIR", "")
+EMBEDDING_LOCAL_BATCH_SIZE = 32
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0"))  # onnxruntime intra-op threads; 0 = runtime default
 LLM_MODEL = "claude-opus-4-6"    # Anthropic Claude via anthropic SDK
 
-# --- Vector DB (ChromaDB: zero-infra, persistent; swap to Pinecone/Weaviate for prod) ---
-VECTOR_DB = "chromadb"
+# --- Vector DB (modules/vector_store.py; swap to Pinecone/Weaviate for prod) ---
+# "chromadb" (SQLite + HNSW) | "flat" (in-process: memory-mapped float16 matrix, exact dot-product scan or IVF)
+VECTOR_DB = os.getenv("VECTOR_DB", "chromadb")
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", str(Path(__file__).parent / "chroma_store"))
+FLAT_STORE_DIR = os.getenv("FLAT_STORE_DIR", str(Path(CHROMA_PERSIST_DIR) / "flat"))  # One subdirectory per collection
+FLAT_IVF_LISTS = int(os.getenv("FLAT_IVF_LISTS", "0"))  # k-means lists; 0 = always exact scan (fine up to ~100k chunks)
+FLAT_IVF_PROBE = 8  # Nearest lists scanned per query when IVF is on
+FLAT_SCAN_FLOAT32 = os.getenv("FLAT_SCAN_FLOAT32", "1") != "0"  # Scan a float32 copy in RAM (~8x faster than float16)
+# Quantized scans: "int8" (1 byte/dim) | "binary" (1 bit/dim) codes in RAM pick a shortlist of
+# FLAT_RESCORE_FACTOR x n_results rows (0 = 4 for int8, 10 for binary), rescored exactly from the float16 file.
+# FLAT_QUANT_DIMS > 0 builds the codes from that many leading dims (Matryoshka truncation; text-embedding-3 supports it).
+FLAT_QUANTIZATION = os.getenv("FLAT_QUANTIZATION", "none")
+FLAT_QUANT_DIMS = int(os.getenv("FLAT_QUANT_DIMS", "0"))
+FLAT_RESCORE_FACTOR = int(os.getenv("FLAT_RESCORE_FACTOR", "0"))
+
+# --- Embedding cache (query + ingestion embeddings; LRU in memory, optional SQLite persistence) ---
+EMBEDDING_CACHE_MAX_ENTRIES = 10000
+EMBEDDING_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# SQLite file bound: expired rows are deleted on open and every EMBEDDING_CACHE_PRUNE_EVERY rows written, then the
+# oldest rows beyond EMBEDDING_CACHE_MAX_ROWS (ingestion writes every chunk vector here: ~6 KB each at 1536 dims)
+EMBEDDING_CACHE_MAX_ROWS = 100000
+EMBEDDING_CACHE_PRUNE_EVERY = 1000
+# Set EMBEDDING_CACHE_PATH="" to keep the cache in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", str(Path(CHROMA_PERSIST_DIR) / "embedding_cache.sqlite3"))
+
+# --- Bulk embedding (ingestion): token-bounded batches, concurrent under a rate limit, retried with backoff ---
+EMBEDDING_BATCH_MAX_TOKENS = 60000   # Per embeddings.create request (API cap is 300k tokens / 2048 inputs)
+EMBEDDING_BATCH_MAX_INPUTS = 512
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # Batches in flight at once
+EMBEDDING_RATE_LIMIT_RPM = int(os.getenv("EMBEDDING_RATE_LIMIT_RPM", "3000"))  # Requests per minute; 0 = unlimited
+EMBEDDING_RATE_LIMIT_TPM = int(os.getenv("EMBEDDING_RATE_LIMIT_TPM", "1000000"))  # Tokens per minute; 0 = unlimited
+EMBEDDING_MAX_RETRIES = 6
+EMBEDDING_BACKOFF_SECONDS = 1.0  # Base for exponential backoff (doubled per attempt, with jitter; Retry-After wins)
 
 # --- Chunking (recursive splitter; semantic boundaries at sentence ends) ---
 CHUNK_SIZE = 512
 CHUNK_OVERLAP = 64
+# Parallel loading/chunking in ingest_directory (process pool); files parsed ahead of the embedding stage are bounded
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+INGEST_QUEUE_FILES = 8
+# Per-document content hashes: re-ingesting an unchanged file is skipped without chunking or embedding
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", str(Path(CHROMA_PERSIST_DIR) / "ingest_manifest.json"))
 
 # --- Retrieval ---
 TOP_K_RAG = 5
+RETRIEVE_CANDIDATES = 50  # Vector and BM25 candidates fetched per query for fusion and scoring
+RERANK_CANDIDATES = 15    # Fused results given to the cross-encoder; its best TOP_K_RAG go to the LLM
 TOP_K_WEB = 3
-RAG_SCORE_THRESHOLD = 0.85  # Below this → trigger web search (support.apple.com, apple.com, etc.)
+RAG_SCORE_THRESHOLD = 0.85  # Top retrieval score below this → web search (when reranking is unavailable; see RERANK_SCORE_THRESHOLD)
+WEB_SPECULATE_THRESHOLD = 0.5  # Predicted P(web needed) at/above this → start web search in parallel with retrieval
+WEB_INCLUDE_THRESHOLD = 0.7    # ...and at/above this, give web results to the first LLM call even if RAG scored well
+
+# --- Query contextualization (modules/query_rewriter.py): follow-ups like "that didn't work" are retrieved with the
+# session's issue and the turn that described it folded in ---
+QUERY_REWRITE_BACKEND = os.getenv("QUERY_REWRITE_BACKEND", "rules")  # | "llm" (small Claude model; rules on error) | "off"
+QUERY_REWRITE_MODEL = "claude-haiku-4-5"
+QUERY_REWRITE_MAX_TERMS = 3     # A message with no issue keyword and at most this many content words is a follow-up
+QUERY_REWRITE_HISTORY_TURNS = 4  # Recent messages shown to the model ("llm" backend)
+QUERY_REWRITE_MAX_CHARS = 300
+
+# --- Session working set (modules/working_set.py): a turn reuses the session's last retrieved chunks instead of
+# querying the vector store again (they are still reranked for the new query), while its query stays on topic ---
+WORKING_SET_ENABLED = os.getenv("WORKING_SET_ENABLED", "1") != "0"
+WORKING_SET_MIN_SIMILARITY = 0.8  # Cosine of the query to the one that built the set; below this the topic drifted
+WORKING_SET_MAX_TURNS = 4         # Re-retrieve after serving this many turns from one set
+
+# --- Hybrid retrieval: BM25 inverted index fused with vector results (reciprocal rank fusion) ---
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", str(Path(CHROMA_PERSIST_DIR) / "bm25_index.json"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # Fused score = sum over result lists of 1 / (RRF_K + rank)
+LEXICAL_SCORE_PIVOT = 8.0  # BM25 score mapped to relevance as s / (s + pivot); used when no vector similarity exists
+RETRIEVE_EMBED_TIMEOUT = 3.0  # Seconds to wait for the query embedding before answering from BM25 alone
+# retrieve() reuses the collection handle and chunk count; refreshed on ingestion in this process, or after this
+# many seconds (picks up knowledge_base/ingest.py runs from another process)
+COLLECTION_STATS_TTL = 30.0
+
+# --- Reranking (cross-encoder; modules/reranker.py micro-batches pairs from concurrent requests) ---
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "sentence_transformers")  # | "onnx" (onnxruntime on CPU, int8 by default)
+# Directory with the ONNX export + tokenizer.json; empty = fetch RERANK_ONNX_FILE from the RERANK_MODEL hub repo
+RERANK_ONNX_MODEL_DIR = os.getenv("RERANK_ONNX_MODEL_DIR", "")
+RERANK_ONNX_FILE = os.getenv("RERANK_ONNX_FILE", "model_quint8_avx2.onnx")  # Dynamic int8 quantization, portable x86
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "0"))  # onnxruntime intra-op threads; 0 = runtime default
+RERANK_MAX_BATCH_PAIRS = 64  # One forward pass scores at most this many (query, chunk) pairs
+RERANK_MAX_WAIT_MS = 4.0     # After the first request arrives, wait this long for others to join its batch
+# Reranker logits are calibrated to 0..1 with Platt scaling, sigmoid(a * logit + b), and stored as rerank_score
+# (relevance_score stays the retrieval score). Fit both and pick the threshold with knowledge_base/tune_threshold.py.
+RERANK_CALIBRATION = (1.0, 0.0)
+RERANK_SCORE_THRESHOLD = 0.5  # Best calibrated rerank_score below this → trigger web search (replaces RAG_SCORE_THRESHOLD)
+
+# --- Semantic answer cache (first-turn, image-free questions; invalidated on every ingestion) ---
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_DISTANCE = 0.08  # Cosine distance between question embeddings to count as "same question"
+ANSWER_CACHE_MAX_ENTRIES = 500
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
 
 # --- Web search (Tavily: RAG/agent-friendly, clean parsed results) ---
 WEB_SEARCH_PRIORITY_DOMAINS = [
@@ -53,6 +147,33 @@ TTS_OPENAI_MODEL = "tts-1-hd"
 TTS_OPENAI_VOICE = "nova"
 TTS_SPEED = 0.95
 TTS_FALLBACK_ELEVENLABS = bool(ELEVENLABS_API_KEY)
+TTS_PIPELINE_CONCURRENCY = 4  # Sentences synthesized in parallel while the LLM streams
+TTS_PIPELINE_MIN_CHARS = 40   # Merge shorter sentences into the next one (fewer, fuller TTS calls)
+TTS_PIPELINE_FIRST_MIN_CHARS = 12  # Smaller floor for the first sentence, so a bare "1." is never spoken alone
+# Content-addressed audio cache (hash of adapted text + voice + speed + model); set TTS_CACHE_DIR="" to disable
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", str(Path(CHROMA_PERSIST_DIR) / "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # Least recently used files evicted beyond this
 
 # --- Session ---
 SESSION_EXPIRE_MINUTES = 30
+
+# --- HTTP connection pools (shared by all API clients; see modules/clients.py) ---
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20
+HTTP_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection is kept for reuse
+HTTP_TIMEOUT = 60.0
+
+# --- Concurrency (blocking SDK / CPU work is offloaded from the event loop) ---
+BLOCKING_POOL_WORKERS = int(os.getenv("BLOCKING_POOL_WORKERS", "32"))  # Max in-flight sync calls per worker
+# Per-stage timeouts (seconds) for the chat turn scheduler; a timed-out stage falls back (e.g. no web results)
+STAGE_TIMEOUTS = {
+    "image": 20.0,
+    "retrieve": 10.0,
+    "rerank": 5.0,
+    "web": 8.0,
+    "rewrite": 2.0,
+}
+
+# --- Warm start (modules/warmup.py): load models and open stores at startup; GET /api/ready gates traffic ---
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") != "0"
+WARMUP_QUERY = "iphone battery drains fast"  # Dummy query sent through embedding, retrieval and reranking
@@ -1,6 +1,7 @@
 """
 CLI script to batch-load documents from knowledge_base/docs into the vector DB.
 Run from project root: python knowledge_base/ingest.py
+Incremental: files unchanged since the last run are skipped (see INGEST_MANIFEST_PATH).
 """
 import logging
 import sys
@@ -21,7 +22,8 @@ def main():
         sys.exit(1)
     result = rag_engine.ingest_directory(str(docs_dir))
     logger.info("Ingest result: %s", result)
-    print("Ingested", result.get("files", 0), "files,", result.get("chunks", 0), "chunks")
+    print("Ingested", result.get("files", 0), "files,", result.get("chunks", 0), "chunks",
+          f"({result.get('skipped', 0)} unchanged files skipped, {result.get('embedded', 0)} chunks embedded)")
     return 0 if result.get("chunks", 0) > 0 else 1
 
 
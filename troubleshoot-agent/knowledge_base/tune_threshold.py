@@ -0,0 +1,114 @@
+"""
+Tune the web-search gate: sweep score thresholds over a labeled query set and report, per threshold, how
+often web search would run and how often the gate makes the right call.
+
+Each labeled query ({"query", "relevant": [source files]}; default tests/data/eval_queries.json) runs
+through retrieve + rerank against the ingested store. A query is answerable from the knowledge base when it
+has relevant docs and one of them was retrieved; the right call is "no web" for those and "web" for the
+rest. Both signals are swept: the retrieval relevance_score (RAG_SCORE_THRESHOLD) and the calibrated
+rerank_score (RERANK_SCORE_THRESHOLD). --fit also fits the Platt calibration (RERANK_CALIBRATION) on the
+reranker logits of every retrieved chunk, labeled by whether its source is relevant.
+
+Run from project root after ingest.py: python knowledge_base/tune_threshold.py [--queries FILE] [--fit]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import RAG_SCORE_THRESHOLD, RERANK_CALIBRATION, RERANK_SCORE_THRESHOLD, TOP_K_RAG
+from modules import rag_engine
+
+DEFAULT_QUERIES = Path(__file__).resolve().parent.parent / "tests" / "data" / "eval_queries.json"
+
+
+def collect(queries: list[dict], top_k: int) -> list[dict]:
+    """Per query: answerable label, top retrieval score, reranker logits of each retrieved chunk."""
+    texts = [q["query"] for q in queries]
+    retrieved = rag_engine.retrieve_many(texts, top_k=top_k)  # One embedding call and one Chroma query
+    reranked_all = rag_engine.rerank_many([[dict(r) for r in results] for results in retrieved], texts)
+    samples = []
+    for q, results, reranked in zip(queries, retrieved, reranked_all):
+        relevant = set(q["relevant"])
+        samples.append({
+            "query": q["query"],
+            "answerable": any(r["source_file"] in relevant for r in results),
+            "vector": max((r["relevance_score"] for r in results), default=0.0),
+            "logits": [r["rerank_logit"] for r in reranked if "rerank_logit" in r],
+            "chunk_labels": [r["source_file"] in relevant for r in reranked if "rerank_logit" in r],
+        })
+    return samples
+
+
+def fit_platt(logits: list[float], labels: list[bool], iterations: int = 2000, lr: float = 0.1) -> tuple[float, float]:
+    """Logistic regression of label on logit (gradient descent); returns (a, b) for sigmoid(a * logit + b)."""
+    x = np.asarray(logits, dtype=np.float64)
+    y = np.asarray(labels, dtype=np.float64)
+    a, b = 1.0, 0.0
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(a * x + b)))
+        a -= lr * float(np.mean((p - y) * x))
+        b -= lr * float(np.mean(p - y))
+    return round(a, 4), round(b, 4)
+
+
+def sweep(scores: list[float], answerable: list[bool], thresholds: list[float]) -> list[dict]:
+    """For each threshold t (web search when score < t): web rate, wasted web calls, missed web calls, accuracy."""
+    n = len(scores)
+    rows = []
+    for t in thresholds:
+        web = [s < t for s in scores]
+        wasted = sum(1 for w, a in zip(web, answerable) if w and a)        # KB had it; Tavily called anyway
+        missed = sum(1 for w, a in zip(web, answerable) if not w and not a)  # KB lacked it; no web context
+        rows.append({
+            "threshold": round(t, 3),
+            "web_rate": sum(web) / n if n else 0.0,
+            "wasted": wasted,
+            "missed": missed,
+            "accuracy": (n - wasted - missed) / n if n else 0.0,
+        })
+    return rows
+
+
+def _report(title: str, rows: list[dict], current: float) -> None:
+    best = max(rows, key=lambda r: (r["accuracy"], -r["web_rate"]))
+    print(f"\n{title}")
+    print(f"{'threshold':>9} {'web rate':>9} {'wasted':>7} {'missed':>7} {'accuracy':>9}")
+    for r in rows:
+        mark = " <- best" if r is best else (" <- current" if abs(r["threshold"] - current) < 1e-9 else "")
+        print(f"{r['threshold']:>9.2f} {r['web_rate']:>9.2f} {r['wasted']:>7} {r['missed']:>7} {r['accuracy']:>9.2f}{mark}")
+    print(f"Recommended threshold: {best['threshold']:.2f} (current {current:.2f})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", default=str(DEFAULT_QUERIES))
+    parser.add_argument("--top-k", type=int, default=TOP_K_RAG)
+    parser.add_argument("--fit", action="store_true", help="Fit RERANK_CALIBRATION on the reranker logits")
+    args = parser.parse_args()
+
+    queries = json.loads(Path(args.queries).read_text(encoding="utf-8"))
+    samples = collect(queries, args.top_k)
+    answerable = [s["answerable"] for s in samples]
+    print(f"{len(samples)} queries, {sum(answerable)} answerable from the knowledge base")
+    grid = [i / 20 for i in range(21)]
+    _report("Retrieval relevance_score (used when reranking is unavailable)",
+            sweep([s["vector"] for s in samples], answerable, grid), RAG_SCORE_THRESHOLD)
+
+    if not any(s["logits"] for s in samples):
+        print("\nReranker unavailable: no rerank scores to sweep")
+        return 0
+    calibration = RERANK_CALIBRATION
+    if args.fit:
+        calibration = fit_platt([x for s in samples for x in s["logits"]], [y for s in samples for y in s["chunk_labels"]])
+        print(f"\nFitted RERANK_CALIBRATION = {calibration} (configured {RERANK_CALIBRATION})")
+    rerank = [max((rag_engine.calibrate_rerank_score(x, calibration) for x in s["logits"]), default=0.0) for s in samples]
+    _report(f"Calibrated rerank_score, calibration {calibration}", sweep(rerank, answerable, grid), RERANK_SCORE_THRESHOLD)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
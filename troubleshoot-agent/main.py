@@ -2,16 +2,18 @@
 FastAPI entry point for the iPhone Troubleshooting Agent.
 CORS, request logging, global exception handler, and all API routes.
 """
+import asyncio
 import base64
+import json
 import logging
 import time
 import uuid
 from contextlib import asynccontextmanager
-from typing import Any
+from typing import Any, AsyncGenerator
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
@@ -20,8 +22,23 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from config import RAG_SCORE_THRESHOLD, TOP_K_RAG, TOP_K_WEB
-from modules import context_manager, image_handler, llm_agent, rag_engine, voice_stt, voice_tts, web_search
+from config import (
+    ANSWER_CACHE_ENABLED,
+    RAG_SCORE_THRESHOLD,
+    RERANK_CANDIDATES,
+    STAGE_TIMEOUTS,
+    TOP_K_RAG,
+    TOP_K_WEB,
+    WEB_INCLUDE_THRESHOLD,
+    WEB_SPECULATE_THRESHOLD,
+    WARMUP_ON_STARTUP,
+)
+from modules import (
+    answer_cache, clients, context_manager, image_handler, llm_agent, metrics, query_rewriter, rag_engine, reranker,
+    voice_stt, voice_tts, warmup, web_search, working_set,
+)
+from modules.executor import run_blocking, shutdown as shutdown_executor
+from modules.stage_scheduler import StageScheduler
 
 # Guardrail: only allow web search for iPhone/Apple device troubleshooting
 IPHONE_RELATED_KEYWORDS = (
@@ -42,16 +59,33 @@ def is_iphone_related_query(message: str) -> bool:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Any ingestion can change answers: drop the semantic answer cache
+rag_engine.add_ingest_listener(answer_cache.answer_cache.invalidate)
+
 # In-memory session store (session_id -> ConversationContext)
 sessions: dict[str, context_manager.ConversationContext] = {}
+# ...and the chunks each session reuses across turns
+rag_engine.add_ingest_listener(lambda: working_set.drop(list(sessions.values())))
 # In-memory document list for GET /api/documents (optional: could query Chroma)
 ingested_docs: list[dict] = []
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    warm_task = None
+    if WARMUP_ON_STARTUP:
+        # Clients, models and collection load in the background; /api/ready reports 503 until done
+        warm_task = asyncio.create_task(run_blocking(warmup.warmup.run))
+    else:
+        clients.startup()
+        warmup.warmup.mark_ready()
     yield
+    if warm_task is not None and not warm_task.done():
+        warm_task.cancel()
     sessions.clear()
+    reranker.shutdown()
+    shutdown_executor(wait=False)
+    await clients.aclose()
 
 
 app = FastAPI(title="ARIA iPhone Troubleshooting Agent", lifespan=lifespan)
@@ -107,7 +141,7 @@ async def upload_documents(file: UploadFile = File(...)) -> dict[str, Any]:
         tmp.write(contents)
         path = tmp.name
     try:
-        n = rag_engine.ingest_document(path, metadata={"source_file": file.filename})
+        n = await run_blocking(rag_engine.ingest_document, path, metadata={"source_file": file.filename})
         ingested_docs.append({"filename": file.filename, "chunks_created": n})
         return {"success": True, "chunks_created": n, "filename": file.filename}
     finally:
@@ -121,114 +155,428 @@ async def transcribe(audio: UploadFile = File(...)) -> dict[str, Any]:
     if audio.filename and ".wav" in audio.filename.lower():
         fmt = "wav"
     data = await audio.read()
-    result = voice_stt.transcribe_audio(data, format=fmt)
+    result = await run_blocking(voice_stt.transcribe_audio, data, format=fmt)
     return {"text": result.get("text", ""), "confidence": result.get("confidence", 0)}
 
 
-@app.post("/api/chat")
-async def chat(body: ChatBody) -> dict[str, Any]:
-    """Orchestrate: context → RAG → web (if needed) → LLM → TTS. Return text + audio_base64 + sources + steps (Think/Act/Observe)."""
+def _step(steps: list[dict[str, str]], phase: str, text: str) -> tuple[str, dict[str, str]]:
+    """Record a Think/Act/Observe step and return it as a stream event."""
+    step = {"phase": phase, "text": text}
+    steps.append(step)
+    return "step", step
+
+
+async def _generate_answer(
+    stream_tokens: bool,
+    message: str,
+    history: list[dict],
+    rag_results: list[dict],
+    web_results: list[dict],
+    image_description: str | None,
+    timings: dict[str, float],
+) -> AsyncGenerator[tuple[str, dict[str, Any]], None]:
+    """
+    Yield ("answer", llm_out) with the finalized response. When streaming, first yield ("token", {...}) deltas
+    interleaved with ("audio_segment", {...}) events from the sentence-pipelined TTS, in arrival order. If the
+    stream breaks off midway, ("reset", {}) discards what was sent and the answer comes from one run() call.
+    First-token and first-audio latencies (seconds from LLM start) are written into `timings`.
+    """
+    if not stream_tokens:
+        llm_out = await run_blocking(
+            llm_agent.run,
+            user_message=message,
+            conversation_history=history,
+            rag_context=rag_results,
+            web_context=web_results,
+            image_description=image_description,
+        )
+        yield "answer", llm_out
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+    pipeline = voice_tts.SentencePipeline(on_segment=lambda seg: queue.put_nowait(("audio_segment", seg)))
+    parts: list[str] = []
+    started = time.perf_counter()
+
+    async def pump() -> None:
+        nonlocal pipeline
+        try:
+            try:
+                async for delta in llm_agent.stream_run(
+                    user_message=message,
+                    conversation_history=history,
+                    rag_context=rag_results,
+                    web_context=web_results,
+                    image_description=image_description,
+                ):
+                    if not parts:
+                        timings["first_token_seconds"] = round(time.perf_counter() - started, 4)
+                        metrics.observe("llm_first_token_seconds", time.perf_counter() - started)
+                    parts.append(delta)
+                    queue.put_nowait(("token", {"text": delta}))
+                    pipeline.feed(delta)
+            except llm_agent.StreamInterrupted:
+                # Truncated text must not become the answer: discard it (and its audio) and answer in one call
+                metrics.incr("llm_stream_interrupted")
+                pipeline.cancel()
+                parts.clear()
+                queue.put_nowait(("reset", {}))
+                pipeline = voice_tts.SentencePipeline(on_segment=lambda seg: queue.put_nowait(("audio_segment", seg)))
+                llm_out = await run_blocking(
+                    llm_agent.run,
+                    user_message=message,
+                    conversation_history=history,
+                    rag_context=rag_results,
+                    web_context=web_results,
+                    image_description=image_description,
+                )
+                parts.append(llm_out["text"])
+                queue.put_nowait(("token", {"text": llm_out["text"]}))
+                pipeline.feed(llm_out["text"])
+            pipeline.close()
+            await pipeline.drain()
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.create_task(pump())
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        await producer
+    finally:
+        producer.cancel()
+        pipeline.cancel()
+    if pipeline.first_audio_seconds is not None:
+        timings["first_audio_seconds"] = round(pipeline.first_audio_seconds, 4)
+    yield "answer", llm_agent.finalize_response("".join(parts).strip(), rag_results, web_results)
+
+
+def _retrieve(ctx: context_manager.ConversationContext, query: str) -> list[dict]:
+    """
+    RAG search pre-filtered to the issue category the (rewritten) query names (chunk metadata from doc
+    frontmatter; chunks without one are filed under "general" and always pass), which shrinks the candidate
+    set. When the filtered best score is under the web-search gate, the unfiltered search is merged in, so a
+    wrong or too-narrow category never hides a better chunk. Served from the session's working set while the
+    query stays on its topic.
+    """
+    category = context_manager.classify_issue(query)
+    reused = working_set.lookup(ctx, query, category)
+    if reused is not None:
+        return reused
+    if category == "general":
+        return rag_engine.retrieve(query, top_k=RERANK_CANDIDATES)
+    results = rag_engine.retrieve(query, top_k=RERANK_CANDIDATES, filter_metadata={"category": {"$in": [category, "general"]}})
+    if max((r["relevance_score"] for r in results), default=0.0) >= RAG_SCORE_THRESHOLD:
+        return results
+    metrics.incr("retrieve_category_fallback")
+    merged = {}
+    for r in results + rag_engine.retrieve(query, top_k=RERANK_CANDIDATES):
+        merged.setdefault(r.get("chunk_id") or (r["source_file"], r["content"]), r)
+    return sorted(merged.values(), key=lambda r: r["relevance_score"], reverse=True)[:RERANK_CANDIDATES]
+
+
+def _rerank(ctx: context_manager.ConversationContext, query: str, results: list[dict]) -> list[dict]:
+    """Cross-encoder rerank against this turn's query; fresh (not reused) results become the session's working set."""
+    reused = bool(results) and all(r.get("reused") for r in results)
+    results = rag_engine.rerank_results(results, query)
+    if not reused:
+        working_set.remember(ctx, query, context_manager.classify_issue(query), results)
+    return results
+
+
+def _join_audio_segments(segments_base64: list[str]) -> str:
+    """Concatenate per-sentence MP3 segments (MP3 frames concatenate cleanly) into one base64 clip."""
+    if not segments_base64:
+        return ""
+    return base64.standard_b64encode(b"".join(base64.standard_b64decode(s) for s in segments_base64)).decode("ascii")
+
+
+def _describe_image(image_base64: str, message: str) -> str:
+    """Run Claude Vision on a base64 image and flatten the result into a context string for the LLM."""
+    raw = base64.b64decode(image_base64)
+    img_result = image_handler.analyze_image(raw, message)
+    return f"{img_result.get('description', '')} Issue: {img_result.get('issue_detected', '')}. Focus: {img_result.get('suggested_focus', '')}"
+
+
+async def _chat_events(body: ChatBody, stream_tokens: bool = False) -> AsyncGenerator[tuple[str, dict[str, Any]], None]:
+    """
+    Orchestrate one chat turn: context → RAG → web (if needed) → LLM → TTS, yielding (event, data) pairs:
+    step (Think/Act/Observe, as it happens), token (Claude deltas, only when stream_tokens), reset (discard
+    streamed text/audio before a retry), audio_segment (per-sentence TTS, only when stream_tokens), sources,
+    audio (whole-answer TTS, non-streaming only), and a final done event carrying the full response.
+    Every SDK call runs on the bounded executor so one slow Claude/TTS call doesn't block other sessions;
+    stages still running when the turn ends (or the client disconnects) are cancelled.
+    """
+    scheduler = StageScheduler()
+    try:
+        async for item in _run_turn(body, scheduler, stream_tokens):
+            yield item
+    finally:
+        scheduler.cancel_all()
+
+
+async def _run_turn(
+    body: ChatBody,
+    scheduler: StageScheduler,
+    stream_tokens: bool,
+) -> AsyncGenerator[tuple[str, dict[str, Any]], None]:
     session_id = body.session_id or str(uuid.uuid4())
     if session_id not in sessions:
         sessions[session_id] = context_manager.ConversationContext(session_id)
     ctx = sessions[session_id]
     message = (body.message or "").strip()
-    image_description: str | None = None
+    iphone_related = is_iphone_related_query(message)
     steps: list[dict[str, str]] = []  # [{ "phase": "think"|"act"|"observe", "text": "..." }]
-
-    if body.image_base64:
-        try:
-            raw = base64.b64decode(body.image_base64)
-            img_result = image_handler.analyze_image(raw, message)
-            image_description = f"{img_result.get('description', '')} Issue: {img_result.get('issue_detected', '')}. Focus: {img_result.get('suggested_focus', '')}"
-            ctx.uploaded_images.append(body.image_base64[:50])
-        except Exception as e:
-            logger.warning("Image analysis skipped: %s", e)
+    timings: dict[str, float] = {}
+    used_stages = ["rewrite", "retrieve", "rerank"]
 
     ctx.add_turn("user", message)
     if llm_agent.detect_frustration(message):
         ctx.frustration_signals += 1
+    category = ctx.detect_issue_category()
+
+    # ——— Stage graph: image ∥ rewrite → retrieve → rerank, with a speculative web search ———
+    if body.image_base64:
+        scheduler.add(
+            "image", lambda _: run_blocking(_describe_image, body.image_base64, message),
+            timeout=STAGE_TIMEOUTS["image"], fallback=None,
+        )
+    # Follow-ups ("that didn't work") are retrieved and searched with the session's issue folded in
+    scheduler.add(
+        "rewrite", lambda _: run_blocking(query_rewriter.rewrite, ctx, message),
+        timeout=STAGE_TIMEOUTS["rewrite"], fallback=message,
+    )
+    scheduler.add(
+        "retrieve", lambda d: run_blocking(_retrieve, ctx, d["rewrite"]),
+        deps=("rewrite",), timeout=STAGE_TIMEOUTS["retrieve"], fallback=[],
+    )
+    # Rerank gets copies: it adds rerank scores and re-sorts in place while the speculative check reads vector scores
+    scheduler.add(
+        "rerank", lambda d: run_blocking(_rerank, ctx, d["rewrite"], [dict(r) for r in d["retrieve"]]),
+        deps=("rewrite", "retrieve"), timeout=STAGE_TIMEOUTS["rerank"], fallback=lambda d: d["retrieve"],
+    )
+    # Speculative web search: if the predictor expects web context to be needed, start it now (∥ retrieval);
+    # otherwise start it from the vector scores (∥ rerank) when those already look weak.
+    web_need = web_search.predictor.predict(message, category)
+    search_web = lambda d: run_blocking(web_search.search, d["rewrite"], top_k=TOP_K_WEB)
+    if iphone_related and web_need >= WEB_SPECULATE_THRESHOLD:
+        scheduler.add("web_speculative", search_web, deps=("rewrite",), timeout=STAGE_TIMEOUTS["web"], fallback=[])
+    else:
+        scheduler.add(
+            "web_speculative", search_web,
+            deps=("rewrite", "retrieve"), timeout=STAGE_TIMEOUTS["web"], fallback=[],
+            when=lambda d: iphone_related and web_search.is_web_search_needed(
+                sorted((r["relevance_score"] for r in d["retrieve"]), reverse=True), threshold=RAG_SCORE_THRESHOLD),
+        )
+    scheduler.start()
 
     # ——— Think: Checking RAG ———
-    steps.append({"phase": "think", "text": "Checking knowledge base (RAG) for relevant docs…"})
-    rag_results = rag_engine.retrieve(message, top_k=TOP_K_RAG)
-    rag_results = rag_engine.rerank_results(rag_results, message)
-    rag_scores = [r["relevance_score"] for r in rag_results]
+    yield _step(steps, "think", "Checking knowledge base (RAG) for relevant docs…")
+    # Rerank sees RERANK_CANDIDATES; only the best TOP_K_RAG reach the gate, the cache key and the LLM
+    rag_results = (await scheduler.result("rerank"))[:TOP_K_RAG]
+    # Calibrated reranker probabilities gate web search; retrieval scores only if reranking failed
+    rag_scores, score_threshold = rag_engine.gating_scores(rag_results)
     top_score = float(rag_scores[0]) if rag_scores else 0.0
     if not rag_results:
-        steps.append({"phase": "observe", "text": "No matching documents in knowledge base."})
-    elif top_score < RAG_SCORE_THRESHOLD:
-        steps.append({"phase": "observe", "text": f"No strong match (best score {top_score:.2f}). Will try web search if query is iPhone-related."})
+        yield _step(steps, "observe", "No matching documents in knowledge base.")
+    elif top_score < score_threshold:
+        yield _step(steps, "observe", f"No strong match (best score {top_score:.2f}). Will try web search if query is iPhone-related.")
     else:
-        steps.append({"phase": "observe", "text": f"Found {len(rag_results)} relevant chunk(s) (best score {top_score:.2f})."})
-
-    # ——— Act/Observe: Web search (guardrail: only for iPhone-related queries) ———
+        yield _step(steps, "observe", f"Found {len(rag_results)} relevant chunk(s) (best score {top_score:.2f}).")
+
+    # ——— Semantic answer cache: same opening question + same retrieved docs → reuse text, sources, audio ———
+    cache_key_embedding: list[float] | None = None
+    doc_key = answer_cache.doc_set_key(rag_results)
+    cacheable = ANSWER_CACHE_ENABLED and not body.image_base64 and len(ctx.history) == 1 and bool(rag_results)
+    cached = None
+    if cacheable:
+        try:
+            cache_key_embedding = await run_blocking(rag_engine.embed_query, message)
+            cached = answer_cache.answer_cache.lookup(cache_key_embedding, doc_key)
+        except Exception as e:
+            logger.warning("Answer cache lookup skipped: %s", e)
     web_results: list[dict] = []
-    if web_search.is_web_search_needed(rag_scores, threshold=RAG_SCORE_THRESHOLD):
-        if is_iphone_related_query(message):
-            steps.append({"phase": "act", "text": "Searching web (support.apple.com, apple.com, discussions.apple.com)…"})
-            web_results = web_search.search(message, top_k=TOP_K_WEB)
-            steps.append({"phase": "observe", "text": f"Found {len(web_results)} web result(s)."})
-        else:
-            steps.append({"phase": "observe", "text": "Web search skipped (only allowed for iPhone/Apple device troubleshooting)."})
-
-    steps.append({"phase": "act", "text": "Generating response…"})
-    history = ctx.get_history()
-    llm_out = llm_agent.run(
-        user_message=message,
-        conversation_history=history,
-        rag_context=rag_results,
-        web_context=web_results,
-        image_description=image_description,
-    )
-    final_text = llm_out["text"]
-    final_sources = llm_out.get("sources", [])
-
-    # ——— If response sounds like "I don't have that" and we didn't use web yet, try web search and retry ———
-    if llm_agent.sounds_like_no_knowledge(final_text) and not web_results and is_iphone_related_query(message):
-        steps.append({"phase": "observe", "text": "Answer not in knowledge base. Trying web search…"})
-        steps.append({"phase": "act", "text": "Searching support.apple.com, apple.com for more info…"})
-        web_results = web_search.search(message, top_k=TOP_K_WEB)
-        steps.append({"phase": "observe", "text": f"Found {len(web_results)} web result(s)."})
-        steps.append({"phase": "act", "text": "Generating response using web results…"})
-        llm_out_2 = llm_agent.run(
-            user_message=message,
-            conversation_history=history,
-            rag_context=rag_results,
-            web_context=web_results,
-            image_description=image_description,
-        )
-        final_text = llm_out_2["text"]
-        final_sources = llm_out_2.get("sources", [])
+    streamed_audio: list[str] = []  # Per-sentence segments (streaming mode), kept to cache the full answer audio
+
+    if cached is not None:
+        yield _step(steps, "observe", "This question was answered recently from the same docs; reusing that answer.")
+        if await scheduler.wait_started("web_speculative"):  # Decided already: its deps finished before rerank
+            metrics.incr("web_speculative_started")
+            metrics.incr("web_speculative_wasted")
+        scheduler.cancel("web_speculative")
+        final_text, final_sources = cached.text, cached.sources
+        no_knowledge = False
+        if stream_tokens:
+            yield "token", {"text": final_text}
+            if cached.audio_base64:
+                yield "audio_segment", {"index": 0, "text": final_text, "audio_base64": cached.audio_base64}
+    else:
+        # ——— Act/Observe: Web search (guardrail: only for iPhone-related queries) ———
+        speculative_ran = await scheduler.wait_started("web_speculative")
+        if speculative_ran:
+            metrics.incr("web_speculative_started")
+        needed_by_score = web_search.is_web_search_needed(rag_scores, threshold=score_threshold)
+        proactive = not needed_by_score and speculative_ran and web_need >= WEB_INCLUDE_THRESHOLD
+        if needed_by_score or proactive:
+            if iphone_related:
+                yield _step(steps, "act", "Searching web (support.apple.com, apple.com, discussions.apple.com)…")
+                if speculative_ran:
+                    web_results = await scheduler.result("web_speculative")
+                    used_stages.append("web_speculative")
+                    metrics.incr("web_speculative_used")
+                else:
+                    scheduler.add("web", search_web, deps=("rewrite", "rerank"), timeout=STAGE_TIMEOUTS["web"], fallback=[])
+                    web_results = await scheduler.result("web")
+                    used_stages.append("web")
+                yield _step(steps, "observe", f"Found {len(web_results)} web result(s).")
+            else:
+                yield _step(steps, "observe", "Web search skipped (only allowed for iPhone/Apple device troubleshooting).")
+
+        image_description: str | None = None
+        if scheduler.has("image"):
+            image_description = await scheduler.result("image")
+            used_stages.append("image")
+            if image_description is not None:
+                ctx.uploaded_images.append(body.image_base64[:50])
+
+        yield _step(steps, "act", "Generating response…")
+        history = ctx.get_history()
+        llm_out: dict[str, Any] = {}
+        async for event, data in _generate_answer(stream_tokens, message, history, rag_results, web_results, image_description, timings):
+            if event == "answer":
+                llm_out = data
+            else:
+                if event == "audio_segment":
+                    streamed_audio.append(data["audio_base64"])
+                elif event == "reset":
+                    streamed_audio.clear()
+                yield event, data
+        final_text = llm_out["text"]
+        final_sources = llm_out.get("sources", [])
+        no_knowledge = llm_agent.sounds_like_no_knowledge(final_text)
+        if proactive and web_results and not no_knowledge:
+            # Answered with web context the score gate alone would not have fetched. Not "retries avoided": whether
+            # the answer would have needed a retry without it is unknown.
+            metrics.incr("web_proactive_answered")
+
+        # ——— If response sounds like "I don't have that" and we didn't use web yet, try web search and retry ———
+        if no_knowledge and not web_results and iphone_related:
+            metrics.incr("web_retry")
+            yield _step(steps, "observe", "Answer not in knowledge base. Trying web search…")
+            yield _step(steps, "act", "Searching support.apple.com, apple.com for more info…")
+            if speculative_ran:
+                # Already in flight (or done) from the speculative stage — no second search
+                web_results = await scheduler.result("web_speculative")
+                used_stages.append("web_speculative")
+                metrics.incr("web_speculative_used")
+            else:
+                scheduler.add("web_retry", search_web, deps=("rewrite",), timeout=STAGE_TIMEOUTS["web"], fallback=[])
+                web_results = await scheduler.result("web_retry")
+                used_stages.append("web_retry")
+            yield _step(steps, "observe", f"Found {len(web_results)} web result(s).")
+            yield _step(steps, "act", "Generating response using web results…")
+            if stream_tokens:
+                streamed_audio.clear()
+                yield "reset", {}
+            async for event, data in _generate_answer(stream_tokens, message, history, rag_results, web_results, image_description, timings):
+                if event == "answer":
+                    llm_out = data
+                else:
+                    if event == "audio_segment":
+                        streamed_audio.append(data["audio_base64"])
+                    elif event == "reset":
+                        streamed_audio.clear()
+                    yield event, data
+            final_text = llm_out["text"]
+            final_sources = llm_out.get("sources", [])
+
+        if speculative_ran and "web_speculative" not in used_stages:
+            scheduler.cancel("web_speculative")
+            metrics.incr("web_speculative_wasted")
+        # The predictor models retrieval scores (it is consulted before reranking), so feed it those
+        top_vector = max((r["relevance_score"] for r in rag_results), default=0.0)
+        web_search.predictor.record(category, top_vector, needed_web=needed_by_score or no_knowledge)
+
+    yield "sources", {"sources": final_sources}
 
     ctx.add_turn("assistant", final_text)
     ctx.current_issue = ctx.detect_issue_category()
     ctx.step_counter += 1
     ctx.steps_attempted.append(final_text[:80])
 
-    # TTS
-    audio_base64 = ""
-    try:
-        audio_bytes = voice_tts.synthesize(final_text)
-        if audio_bytes:
-            audio_base64 = base64.standard_b64encode(audio_bytes).decode("ascii")
-    except Exception as e:
-        logger.warning("TTS failed: %s", e)
-
-    return {
+    # TTS (streaming mode already sent per-sentence audio_segment events)
+    audio_base64 = cached.audio_base64 if cached is not None and not stream_tokens else ""
+    if not stream_tokens and cached is None:
+        try:
+            audio_bytes = await run_blocking(voice_tts.synthesize, final_text)
+            if audio_bytes:
+                audio_base64 = base64.standard_b64encode(audio_bytes).decode("ascii")
+        except Exception as e:
+            logger.warning("TTS failed: %s", e)
+    if audio_base64 and not stream_tokens:
+        yield "audio", {"audio_base64": audio_base64}
+    if cacheable and cached is None and cache_key_embedding is not None and not web_results and not no_knowledge:
+        full_audio = audio_base64 or _join_audio_segments(streamed_audio)
+        answer_cache.answer_cache.store(cache_key_embedding, doc_key, final_text, final_sources, full_audio)
+    if "first_audio_seconds" in timings:
+        logger.info("Session %s: first token %.3fs, first audio %.3fs after LLM start", session_id,
+                    timings.get("first_token_seconds", 0.0), timings["first_audio_seconds"])
+
+    yield "done", {
         "text": final_text,
         "audio_base64": audio_base64,
         "sources": final_sources,
         "session_id": session_id,
         "steps": steps,
+        "timings": timings,
+        "stages": scheduler.report(used_stages),
+        "web_need": web_need,
+        "retrieval_query": await scheduler.result("rewrite"),
+        "answer_cache": "hit" if cached is not None else ("miss" if cacheable else "skip"),
     }
 
 
+@app.post("/api/chat")
+async def chat(body: ChatBody) -> dict[str, Any]:
+    """Orchestrate one turn. Return text + audio_base64 + sources + steps (Think/Act/Observe)."""
+    result: dict[str, Any] = {}
+    async for event, data in _chat_events(body):
+        if event == "done":
+            result = data
+    return result
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(body: ChatBody) -> StreamingResponse:
+    """
+    Streaming variant of /api/chat (Server-Sent Events). Steps are sent as they happen, then Claude tokens
+    as they arrive, then sources and audio; the final `done` event carries the same payload as /api/chat.
+    """
+    async def frames():
+        try:
+            async for event, data in _chat_events(body, stream_tokens=True):
+                yield _sse(event, data)
+        except Exception as e:
+            logger.exception("Streaming chat failed: %s", e)
+            yield _sse("error", {"detail": str(e), "type": type(e).__name__})
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/upload-image")
 async def upload_image(file: UploadFile = File(...)) -> dict[str, Any]:
     """Accept image file, return analyze_image result."""
     data = await file.read()
-    result = image_handler.analyze_image(data, "")
+    result = await run_blocking(image_handler.analyze_image, data, "")
     return {"description": result.get("description", ""), "issue_detected": result.get("issue_detected", "")}
 
 
@@ -249,6 +597,19 @@ async def delete_session(session_id: str) -> dict[str, str]:
     return {"status": "deleted", "session_id": session_id}
 
 
+@app.get("/api/metrics")
+async def get_metrics() -> dict[str, Any]:
+    """In-process counters and latency percentiles (e.g. tts_first_audio_seconds, llm_first_token_seconds)."""
+    return metrics.snapshot()
+
+
+@app.get("/api/ready")
+async def ready() -> JSONResponse:
+    """Readiness probe: 503 until startup warm-up has finished; per-component status and seconds."""
+    state = warmup.warmup.snapshot()
+    return JSONResponse(status_code=200 if state["ready"] else 503, content=state)
+
+
 @app.get("/api/documents")
 async def list_documents() -> dict[str, Any]:
     """List ingested documents (from upload history)."""
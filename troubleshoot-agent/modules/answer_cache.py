@@ -0,0 +1,131 @@
+"""
+Semantic answer cache for first-turn, image-free questions.
+
+Many sessions open with the same few issues (battery, Wi-Fi, storage). If a new opening question's
+embedding is within ANSWER_CACHE_MAX_DISTANCE (cosine distance) of a cached one AND retrieval returned
+the same set of knowledge-base chunks, the cached text, sources and audio are served without calling
+Claude or TTS. Every knowledge-base ingestion invalidates the whole cache.
+"""
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import ANSWER_CACHE_MAX_DISTANCE, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    text: str
+    sources: list[str]
+    audio_base64: str
+    doc_key: str
+    created: float
+
+
+def doc_set_key(rag_results: list[dict]) -> str:
+    """Order-independent fingerprint of the retrieved chunks (source file + chunk index, or content hash)."""
+    ids = set()
+    for r in rag_results:
+        meta = r.get("metadata") or {}
+        if "chunk_index" in meta:
+            ids.add(f"{r.get('source_file', '')}#{meta['chunk_index']}")
+        else:
+            ids.add(hashlib.sha1((r.get("content") or "").encode("utf-8")).hexdigest()[:16])
+    return hashlib.sha1("|".join(sorted(ids)).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """Nearest-neighbour lookup over cached question embeddings (exact cosine, NumPy). Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_distance: float = ANSWER_CACHE_MAX_DISTANCE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._vectors: list[np.ndarray] = []  # Unit-normalized question embeddings
+        self._answers: list[CachedAnswer] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _unit(vec: list[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def lookup(self, query_embedding: list[float], doc_key: str) -> Optional[CachedAnswer]:
+        q = self._unit(query_embedding)
+        now = time.time()
+        with self._lock:
+            best = None
+            if self._vectors:
+                if self._matrix is None:
+                    self._matrix = np.stack(self._vectors)
+                distances = 1.0 - self._matrix @ q
+                for idx in np.argsort(distances):
+                    if distances[idx] > self.max_distance:
+                        break
+                    answer = self._answers[idx]
+                    if answer.doc_key == doc_key and now - answer.created <= self.ttl_seconds:
+                        best = answer
+                        break
+            if best is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        metrics.incr("answer_cache_hits" if best else "answer_cache_misses")
+        return best
+
+    def store(self, query_embedding: list[float], doc_key: str, text: str, sources: list[str], audio_base64: str) -> None:
+        with self._lock:
+            self._vectors.append(self._unit(query_embedding))
+            self._answers.append(CachedAnswer(text=text, sources=list(sources), audio_base64=audio_base64,
+                                              doc_key=doc_key, created=time.time()))
+            if len(self._vectors) > self.max_entries:  # FIFO eviction
+                del self._vectors[0]
+                del self._answers[0]
+            self._matrix = None
+
+    def invalidate(self) -> None:
+        """Drop everything (called after any knowledge-base ingestion)."""
+        with self._lock:
+            dropped = len(self._answers)
+            self._vectors.clear()
+            self._answers.clear()
+            self._matrix = None
+            self._invalidations += 1
+        if dropped:
+            logger.info("Answer cache invalidated (%d entries)", dropped)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._answers),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "invalidations": self._invalidations,
+            }
+
+
+answer_cache = AnswerCache()
+metrics.register_gauge("answer_cache", answer_cache.stats)
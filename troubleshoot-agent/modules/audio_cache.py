@@ -0,0 +1,189 @@
+"""
+Content-addressed TTS audio cache.
+
+Greetings, escalation messages, cached answers and common step instructions are synthesized over and
+over. Audio is stored on local disk under sha256(provider, model, voice, speed, adapted text), so a
+repeated phrase costs no API call. Hot files stay memory-mapped (served from the page cache), total size
+is bounded by TTS_CACHE_MAX_BYTES with least-recently-used eviction, and the index is rebuilt from the
+directory on startup so the cache survives restarts. Hits/misses are exported as metrics counters and a
+`tts_cache` gauge.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+# Open mappings kept for the hottest files (each holds one file descriptor)
+MAX_OPEN_MAPS = 64
+_SUFFIX = ".mp3"
+
+
+def audio_key(text: str, voice: str, speed: float, model: str, provider: str = "openai") -> str:
+    """Cache key for already-adapted text; any change to voice, speed or model yields a new key."""
+    return hashlib.sha256(f"{provider}\x00{model}\x00{voice}\x00{speed:.3f}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Disk-backed, size-bounded LRU of synthesized audio. Thread-safe."""
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] = OrderedDict()  # key -> size in bytes, least recently used first
+        self._maps: OrderedDict[str, mmap.mmap] = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}{_SUFFIX}"
+
+    def _load_index(self) -> None:
+        """Rebuild the LRU order from file mtimes (touched on every hit)."""
+        entries = []
+        for path in self.directory.glob(f"*/*{_SUFFIX}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path.stem, st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _map(self, key: str) -> Optional[mmap.mmap]:
+        mapped = self._maps.get(key)
+        if mapped is not None:
+            self._maps.move_to_end(key)
+            return mapped
+        try:
+            with open(self._path(key), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        self._maps[key] = mapped
+        while len(self._maps) > MAX_OPEN_MAPS:
+            _, old = self._maps.popitem(last=False)
+            old.close()
+        return mapped
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for key, or None."""
+        with self._lock:
+            audio = None
+            if key in self._index:
+                mapped = self._map(key)
+                if mapped is None:
+                    # File vanished underneath us (manual cleanup); forget it
+                    self._total_bytes -= self._index.pop(key)
+                else:
+                    audio = mapped[:]
+                    self._index.move_to_end(key)
+                    try:
+                        os.utime(self._path(key))
+                    except OSError:
+                        pass
+            if audio is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        metrics.incr("tts_cache_hits" if audio is not None else "tts_cache_misses")
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        if not audio or len(audio) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so readers never map a half-written file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("TTS cache write failed: %s", e)
+            return
+        with self._lock:
+            old = self._maps.pop(key, None)
+            if old is not None:
+                old.close()
+            self._total_bytes += len(audio) - self._index.pop(key, 0)
+            self._index[key] = len(audio)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._evictions += 1
+            mapped = self._maps.pop(key, None)
+            if mapped is not None:
+                mapped.close()
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            for key in list(self._index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+            self._hits = self._misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "evictions": self._evictions,
+            }
+
+
+_cache: Optional[AudioCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[AudioCache]:
+    """Process-wide cache, or None when TTS_CACHE_DIR is empty or unusable."""
+    global _cache
+    if _cache is None and TTS_CACHE_DIR:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = AudioCache()
+                except OSError as e:
+                    logger.warning("TTS cache disabled (%s): %s", TTS_CACHE_DIR, e)
+                    return None
+                metrics.register_gauge("tts_cache", _cache.stats)
+    return _cache
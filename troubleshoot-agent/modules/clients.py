@@ -0,0 +1,179 @@
+"""
+Shared API client registry: one pooled client per provider for the whole process.
+
+Constructing `anthropic.Anthropic()`, `OpenAI()` or `TavilyClient` per call throws away the connection
+pool, so every request paid DNS + TCP + TLS again. Here every SDK client is built once with a persistent
+connection pool (HTTP/2 when `h2` is installed, keep-alive, tuned limits), and the ElevenLabs/Deepgram
+fallbacks share one httpx pool. `startup()` / `aclose()` tie the lifecycle to the FastAPI lifespan; the
+getters also work lazily from scripts and tests.
+"""
+import asyncio
+import importlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    ANTHROPIC_API_KEY,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT,
+    OPENAI_API_KEY,
+    TAVILY_API_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_sync: dict[str, Any] = {}
+# Async clients are bound to the event loop that created them
+_async: dict[str, Any] = {}
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _limits(httpx_module=httpx):
+    return httpx_module.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _sdk_http_client(client_cls):
+    """
+    Build an SDK's own DefaultHttpxClient / DefaultAsyncHttpxClient with the shared pool settings.
+    The SDKs pin their httpx flavour (httpx or a fork), so Limits must come from the same package.
+    """
+    httpx_module = importlib.import_module(client_cls.__mro__[1].__module__.split(".")[0])
+    return client_cls(http2=HTTP2_AVAILABLE, limits=_limits(httpx_module))
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT, connect=10.0)
+
+
+def _get_sync(name: str, factory) -> Any:
+    client = _sync.get(name)
+    if client is None:
+        with _lock:
+            client = _sync.get(name)
+            if client is None:
+                client = factory()
+                _sync[name] = client
+    return client
+
+
+def _get_async(name: str, factory) -> Any:
+    global _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_loop is not loop:
+        # New loop (e.g. scripts/tests calling asyncio.run repeatedly): old pools can't be reused
+        _async.clear()
+        _async_loop = loop
+    client = _async.get(name)
+    if client is None:
+        client = factory()
+        _async[name] = client
+    return client
+
+
+def get_http() -> httpx.Client:
+    """Shared sync httpx pool (ElevenLabs/Deepgram fallbacks)."""
+    return _get_sync("http", lambda: httpx.Client(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=_timeout()))
+
+
+def get_async_http() -> httpx.AsyncClient:
+    """Shared async httpx pool for the current event loop."""
+    return _get_async("http", lambda: httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=_timeout()))
+
+
+def get_anthropic():
+    import anthropic
+    return _get_sync("anthropic", lambda: anthropic.Anthropic(
+        api_key=ANTHROPIC_API_KEY or None, http_client=_sdk_http_client(anthropic.DefaultHttpxClient)))
+
+
+def get_async_anthropic():
+    import anthropic
+    return _get_async("anthropic", lambda: anthropic.AsyncAnthropic(
+        api_key=ANTHROPIC_API_KEY or None, http_client=_sdk_http_client(anthropic.DefaultAsyncHttpxClient)))
+
+
+def get_openai(max_retries: Optional[int] = None):
+    """Shared OpenAI client; max_retries overrides the SDK's own retry count (a copy on the same pool)."""
+    import openai
+    client = _get_sync("openai", lambda: openai.OpenAI(
+        api_key=OPENAI_API_KEY, http_client=_sdk_http_client(openai.DefaultHttpxClient)))
+    if max_retries is None:
+        return client
+    return _get_sync(f"openai:max_retries={max_retries}", lambda: client.with_options(max_retries=max_retries))
+
+
+def get_async_openai():
+    import openai
+    return _get_async("openai", lambda: openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY, http_client=_sdk_http_client(openai.DefaultAsyncHttpxClient)))
+
+
+def get_tavily():
+    """TavilyClient uses a requests.Session internally; widen its pool to match HTTP_MAX_KEEPALIVE."""
+    def factory():
+        from tavily import TavilyClient
+        client = TavilyClient(api_key=TAVILY_API_KEY)
+        session = getattr(client, "session", None)
+        if session is not None:
+            from requests.adapters import HTTPAdapter
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_MAX_KEEPALIVE))
+        return client
+    return _get_sync("tavily", factory)
+
+
+def startup() -> None:
+    """Build the pools and whichever SDK clients have keys configured (FastAPI lifespan start)."""
+    get_http()
+    if ANTHROPIC_API_KEY:
+        get_anthropic()
+    if OPENAI_API_KEY:
+        get_openai()
+    if TAVILY_API_KEY:
+        try:
+            get_tavily()
+        except Exception as e:
+            logger.warning("Tavily client unavailable: %s", e)
+    logger.info("API clients ready (http2=%s)", HTTP2_AVAILABLE)
+
+
+async def aclose() -> None:
+    """Close every pooled connection (FastAPI lifespan shutdown)."""
+    global _async_loop
+    for client in list(_async.values()):
+        close = getattr(client, "aclose", None) or getattr(client, "close", None)
+        try:
+            result = close() if close else None
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.debug("Error closing async client: %s", e)
+    _async.clear()
+    _async_loop = None
+    with _lock:
+        for client in list(_sync.values()):
+            try:
+                close = getattr(client, "close", None)
+                if close:
+                    close()
+            except Exception as e:
+                logger.debug("Error closing client: %s", e)
+        _sync.clear()
@@ -3,13 +3,38 @@ Multi-turn conversation memory: history, issue category, steps attempted, escala
 """
 import logging
 import re
-from typing import Any
+from typing import Any, Iterable
 
 logger = logging.getLogger(__name__)
 
 # Approximate chars per token for truncation
 CHARS_PER_TOKEN = 4
 
+# Issue categories, checked in order; the first pattern that matches wins
+ISSUE_PATTERNS = [
+    ("battery", re.compile(r"battery|drain|charging|low power|percent")),
+    ("wifi", re.compile(r"wifi|wi-fi|network|internet|connection|router")),
+    ("storage", re.compile(r"storage|full|space|icloud|offload")),
+    ("crashes", re.compile(r"crash|crashes|freeze|force quit|reinstall")),
+    ("overheating", re.compile(r"overheat|hot|warming|temperature")),
+    ("bluetooth", re.compile(r"bluetooth|bluetooth|airpods|pairing")),
+    ("screen", re.compile(r"screen|display|touch|calibrat|true tone")),
+]
+
+
+def classify_issue(text: str) -> str:
+    """Issue category of a piece of text (one message or a whole conversation); "general" if none matches."""
+    text = (text or "").lower()
+    for category, pattern in ISSUE_PATTERNS:
+        if pattern.search(text):
+            return category
+    return "general"
+
+
+def latest_issue(texts: Iterable[str]) -> str:
+    """Issue category of the last text that names one; "general" if none does."""
+    return next((c for c in map(classify_issue, reversed(list(texts))) if c != "general"), "general")
+
 
 class ConversationContext:
     """
@@ -25,6 +50,8 @@ class ConversationContext:
         self.step_counter: int = 0
         self.frustration_signals: int = 0
         self.uploaded_images: list[str] = []
+        self.query_rewrites: dict[tuple[int, str], str] = {}  # (user turn, message) -> retrieval query; current turn only
+        self.working_set = None  # modules.working_set.RetrievalWorkingSet: last retrieved chunks, reused while on topic
 
     def add_turn(self, role: str, content: str) -> None:
         """Append a message to history."""
@@ -48,25 +75,13 @@ class ConversationContext:
     def detect_issue_category(self) -> str:
         """
         Infer category from conversation: battery, wifi, storage, crash, overheat, bluetooth, screen.
+        The latest user turn that names an issue wins (a session that moves from battery to wifi follows it);
+        the whole conversation is used only when no user turn names one (e.g. the issue came from an image).
         """
-        text = " ".join(
-            (m.get("content") or "") for m in self.history
-        ).lower()
-        if re.search(r"battery|drain|charging|low power|percent", text):
-            return "battery"
-        if re.search(r"wifi|wi-fi|network|internet|connection|router", text):
-            return "wifi"
-        if re.search(r"storage|full|space|icloud|offload", text):
-            return "storage"
-        if re.search(r"crash|crashes|freeze|force quit|reinstall", text):
-            return "crashes"
-        if re.search(r"overheat|hot|warming|temperature", text):
-            return "overheating"
-        if re.search(r"bluetooth|bluetooth|airpods|pairing", text):
-            return "bluetooth"
-        if re.search(r"screen|display|touch|calibrat|true tone", text):
-            return "screen"
-        return "general"
+        issue = latest_issue((m.get("content") or "") for m in self.history if m.get("role") == "user")
+        if issue != "general":
+            return issue
+        return classify_issue(" ".join((m.get("content") or "") for m in self.history))
 
     def should_escalate(self) -> bool:
         """True if 3+ steps failed or high frustration."""
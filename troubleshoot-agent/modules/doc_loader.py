@@ -0,0 +1,137 @@
+"""
+Document loading and chunking for ingestion.
+
+Kept free of Chroma/OpenAI imports so `load_and_chunk` can run in worker processes (ingest_directory
+parses and chunks files in a process pool). Text goes straight from the parsed file to the splitter;
+PDFs are read from memory, never written back out to temp files. YAML frontmatter (category, severity,
+updated, has_images, image_urls, ...) is parsed into metadata carried by every chunk of the document.
+"""
+import datetime
+import hashlib
+import io
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_MODEL
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_PATTERNS = ("*.md", "*.txt", "*.pdf")
+# Bump when loading/metadata extraction changes so the ingest manifest re-processes every file
+LOADER_VERSION = 3  # 3: numeric scoring features (domain_class, updated_epoch, token_count) in chunk metadata
+
+# One splitter per process
+_splitter: Optional[RecursiveCharacterTextSplitter] = None
+
+
+def _get_splitter() -> RecursiveCharacterTextSplitter:
+    global _splitter
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=["\n\n", "\n", ". ", " ", ""],
+        )
+    return _splitter
+
+
+def file_hash(data: bytes, meta: dict, model: str = EMBEDDING_MODEL) -> str:
+    """Hash of the raw file plus everything that affects its chunks and vectors (`model`: embedding model id)."""
+    h = hashlib.sha256()
+    h.update(json.dumps({"meta": meta, "model": model, "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP,
+                         "loader": LOADER_VERSION},
+                        sort_keys=True, default=str).encode("utf-8"))
+    h.update(data)
+    return h.hexdigest()
+
+
+def split_frontmatter(raw: str) -> tuple[str, str]:
+    """Return (frontmatter YAML, body); frontmatter is "" when the text has none."""
+    if raw.startswith("---"):
+        parts = raw.split("---", 2)
+        if len(parts) >= 3:
+            return parts[1], parts[2].strip()
+    return "", raw
+
+
+def strip_frontmatter(raw: str) -> str:
+    return split_frontmatter(raw)[1]
+
+
+def _metadata_value(value: Any) -> Any:
+    """Chroma metadata values must be str/int/float/bool: dates become ISO strings, lists newline-joined."""
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()[:10]
+    if isinstance(value, (list, tuple)):
+        return "\n".join(str(_metadata_value(v)) for v in value if v is not None)
+    return None
+
+
+def parse_frontmatter(yaml_text: str) -> dict[str, Any]:
+    """Frontmatter as flat chunk metadata; unparseable YAML yields {} (the document is still ingested)."""
+    if not yaml_text.strip():
+        return {}
+    try:
+        data = yaml.safe_load(yaml_text)
+    except yaml.YAMLError as e:
+        logger.warning("Invalid frontmatter ignored: %s", e)
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    meta = {}
+    for key, value in data.items():
+        value = _metadata_value(value)
+        if value is not None:
+            meta[str(key)] = value
+    if isinstance(meta.get("category"), str):
+        meta["category"] = meta["category"].strip().lower()
+    return meta
+
+
+def read_text(data: bytes) -> str:
+    # Frontmatter is not chunked (it becomes metadata, see load_and_chunk)
+    return strip_frontmatter(data.decode("utf-8", errors="replace"))
+
+
+def read_pdf(data: bytes) -> str:
+    import pypdf
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    return "\n".join(p.extract_text() or "" for p in reader.pages)
+
+
+def chunk_text(text: str) -> list[str]:
+    return _get_splitter().split_text(text)
+
+
+def load_and_chunk(path: str) -> dict[str, Any]:
+    """
+    Parse (PDF by suffix, else UTF-8 text) and chunk one file. Picklable in and out, for process pools.
+    Returns {"path", "chunks", "metadata" (from frontmatter), "load_seconds", "chunk_seconds"}.
+    """
+    start = time.perf_counter()
+    data = Path(path).read_bytes()
+    metadata: dict[str, Any] = {}
+    if path.lower().endswith(".pdf"):
+        text = read_pdf(data)
+    else:
+        frontmatter, text = split_frontmatter(data.decode("utf-8", errors="replace"))
+        metadata = parse_frontmatter(frontmatter)
+    loaded = time.perf_counter()
+    chunks = chunk_text(text)
+    return {
+        "path": path,
+        "chunks": chunks,
+        "metadata": metadata,
+        "load_seconds": round(loaded - start, 4),
+        "chunk_seconds": round(time.perf_counter() - loaded, 4),
+    }
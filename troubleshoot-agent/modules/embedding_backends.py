@@ -0,0 +1,179 @@
+"""
+Pluggable embedding backends for rag_engine (selected by EMBEDDING_BACKEND).
+
+- "openai": EMBEDDING_MODEL over the API, token-bounded batches (one network round trip per query).
+- "local":  CPU-only ONNX sentence-embedding model run in-process with onnxruntime — by default the
+            all-MiniLM-L6-v2 export from the Hugging Face hub (downloaded once), or any model.onnx + tokenizer.json directory
+            (e.g. an int8-quantized export) via EMBEDDING_LOCAL_MODEL_DIR. Batched inference with
+            per-batch dynamic padding, mean pooling and L2 normalization; a query embeds in a few ms.
+
+Vectors from different backends are not comparable, so each backend has its own `name`/`model` that
+rag_engine uses to scope the collection, chunk ids, caches and indexes.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_LOCAL_BATCH_SIZE,
+    EMBEDDING_LOCAL_HUB_REPO,
+    EMBEDDING_LOCAL_MODEL,
+    EMBEDDING_LOCAL_MODEL_DIR,
+    EMBEDDING_LOCAL_ONNX_FILE,
+    EMBEDDING_LOCAL_THREADS,
+    EMBEDDING_MODEL,
+)
+from modules import clients
+from modules.embedding_pipeline import batch_by_tokens
+
+logger = logging.getLogger(__name__)
+
+_caller_retries = threading.local()
+
+# Max sequence length used by sentence-transformers for MiniLM
+LOCAL_MAX_TOKENS = 256
+
+
+@contextmanager
+def caller_retries():
+    """
+    In this block (this thread), API backends make a single attempt per request: the caller retries with
+    its own backoff (EmbeddingPipeline), and the SDK's retries would otherwise multiply with its attempts.
+    """
+    previous = getattr(_caller_retries, "active", False)
+    _caller_retries.active = True
+    try:
+        yield
+    finally:
+        _caller_retries.active = previous
+
+
+class EmbeddingBackend:
+    """Interface: embed(texts) -> vectors (same order); warm_up() loads models/opens connections."""
+
+    name = "base"
+    model = ""
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def warm_up(self) -> float:
+        """Load everything and embed one dummy string; returns seconds taken."""
+        start = time.perf_counter()
+        self.embed(["warm up"])
+        return time.perf_counter() - start
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        self.model = model
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        client = clients.get_openai(max_retries=0) if getattr(_caller_retries, "active", False) else clients.get_openai()
+        vectors: list[list[float]] = []
+        # Token-bounded requests: a long document must not exceed the per-request input/token caps
+        for batch in batch_by_tokens(texts):
+            out = client.embeddings.create(input=[texts[i] for i in batch], model=self.model)
+            vectors.extend(d.embedding for d in out.data)
+        return vectors
+
+
+class LocalOnnxBackend(EmbeddingBackend):
+    """Sentence embeddings from an ONNX transformer on CPU. Thread-safe (onnxruntime sessions are)."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_dir: str = EMBEDDING_LOCAL_MODEL_DIR,
+        batch_size: int = EMBEDDING_LOCAL_BATCH_SIZE,
+        threads: int = EMBEDDING_LOCAL_THREADS,
+    ):
+        self.model_dir = model_dir
+        self.model = f"local:{Path(model_dir).name}" if model_dir else f"local:{EMBEDDING_LOCAL_MODEL}"
+        self.batch_size = batch_size
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._session = None
+        self._tokenizer = None
+        self._input_names: set[str] = set()
+
+    def _model_files(self) -> tuple[Path, Path]:
+        """(model.onnx, tokenizer.json): from model_dir, else from the hub repo (cached after the first download)."""
+        if self.model_dir:
+            return Path(self.model_dir) / "model.onnx", Path(self.model_dir) / "tokenizer.json"
+        from huggingface_hub import hf_hub_download
+        return (Path(hf_hub_download(EMBEDDING_LOCAL_HUB_REPO, EMBEDDING_LOCAL_ONNX_FILE)),
+                Path(hf_hub_download(EMBEDDING_LOCAL_HUB_REPO, "tokenizer.json")))
+
+    def _load(self) -> None:
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+            model_path, tokenizer_path = self._model_files()
+            tokenizer = Tokenizer.from_file(str(tokenizer_path))
+            tokenizer.enable_truncation(max_length=LOCAL_MAX_TOKENS)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")  # Pad to the longest text in each batch
+            options = ort.SessionOptions()
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = ort.InferenceSession(str(model_path), sess_options=options,
+                                           providers=["CPUExecutionProvider"])
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._tokenizer = tokenizer
+            self._session = session
+            logger.info("Local embedding model loaded from %s", model_path)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        self._load()
+        out: list[list[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self._tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feed = {"input_ids": input_ids, "attention_mask": attention}
+            if "token_type_ids" in self._input_names:
+                feed["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self._session.run(None, feed)[0]
+            # Attention-weighted mean pooling, then L2 normalization (cosine == dot product)
+            mask = attention[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.extend(pooled.astype(np.float32).tolist())
+        return out
+
+
+_BACKENDS = {"openai": OpenAIBackend, "local": LocalOnnxBackend}
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str) -> EmbeddingBackend:
+    try:
+        return _BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r}; expected one of {sorted(_BACKENDS)}") from None
+
+
+def get_backend() -> EmbeddingBackend:
+    """Process-wide backend chosen by EMBEDDING_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(EMBEDDING_BACKEND)
+    return _backend
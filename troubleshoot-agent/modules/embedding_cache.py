@@ -0,0 +1,184 @@
+"""
+Embedding cache shared by retrieval and ingestion.
+
+Keyed on (EMBEDDING_MODEL, normalized text) so "Battery draining fast " and "battery draining fast"
+hit the same entry. Bounded in-memory LRU with TTL; optionally persisted to SQLite so hot queries
+survive restarts (the file is pruned of expired rows and capped at EMBEDDING_CACHE_MAX_ROWS, oldest first). Hits/misses are exported as metrics counters and an `embedding_cache` gauge.
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MAX_ROWS,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_PRUNE_EVERY,
+    EMBEDDING_CACHE_TTL_SECONDS,
+)
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form used for cache keys."""
+    return _WHITESPACE.sub(" ", (text or "").strip().lower())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """LRU + TTL embedding cache with optional SQLite persistence. Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS,
+        persist_path: Optional[str] = EMBEDDING_CACHE_PATH,
+        max_rows: int = EMBEDDING_CACHE_MAX_ROWS,
+        prune_every: int = EMBEDDING_CACHE_PRUNE_EVERY,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._written = 0  # Rows written since the last prune
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()  # key -> (created, vector)
+        self._hits = 0
+        self._misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            try:
+                Path(persist_path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(persist_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, created REAL, vector BLOB)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+                self._db.commit()
+                self._prune(time.time())
+            except sqlite3.Error as e:
+                logger.warning("Embedding cache persistence disabled (%s): %s", persist_path, e)
+                self._db = None
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created > self.ttl_seconds
+
+    def _prune(self, now: float) -> None:
+        """Delete expired rows, then the oldest rows beyond max_rows (caller holds the lock or is __init__)."""
+        if self.ttl_seconds > 0:
+            self._db.execute("DELETE FROM embeddings WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_rows > 0:
+            excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_rows
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created LIMIT ?)", (excess,)
+                )
+        self._db.commit()
+        self._written = 0
+
+    def _get_one(self, key: str, now: float) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[0], now):
+                self._entries.move_to_end(key)
+                return entry[1]
+            del self._entries[key]
+        if self._db is not None:
+            row = self._db.execute("SELECT created, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row and not self._expired(row[0], now):
+                vec = np.frombuffer(row[1], dtype=np.float32)
+                self._set_memory(key, row[0], vec)
+                return vec
+        return None
+
+    def _set_memory(self, key: str, created: float, vec: np.ndarray) -> None:
+        self._entries[key] = (created, vec)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, texts: list[str], model: str) -> list[Optional[list[float]]]:
+        """Return cached vectors (or None) for each text, in order."""
+        now = time.time()
+        with self._lock:
+            out = []
+            for text in texts:
+                vec = self._get_one(cache_key(text, model), now)
+                out.append(vec.tolist() if vec is not None else None)
+            hits = sum(1 for v in out if v is not None)
+            self._hits += hits
+            self._misses += len(out) - hits
+        metrics.incr("embedding_cache_hits", hits)
+        metrics.incr("embedding_cache_misses", len(out) - hits)
+        return out
+
+    def put_many(self, texts: list[str], model: str, vectors: list[list[float]]) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(text, model)
+                vec = np.asarray(vector, dtype=np.float32)
+                self._set_memory(key, now, vec)
+                rows.append((key, now, vec.tobytes()))
+            if self._db is not None and rows:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings (key, created, vector) VALUES (?, ?, ?)", rows)
+                    self._db.commit()
+                    self._written += len(rows)
+                    if self._written >= self.prune_every:
+                        self._prune(now)
+                except sqlite3.Error as e:
+                    logger.warning("Embedding cache write failed: %s", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    """Process-wide cache (created on first use so importing this module has no side effects)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+                metrics.register_gauge("embedding_cache", _cache.stats)
+    return _cache
@@ -0,0 +1,273 @@
+"""
+Bulk embedding pipeline for ingestion.
+
+Chunks from many files are packed into token-bounded batches (EMBEDDING_BATCH_MAX_TOKENS /
+EMBEDDING_BATCH_MAX_INPUTS), up to EMBEDDING_CONCURRENCY batches are embedded at once under a shared
+requests/tokens-per-minute limiter, and retriable failures (429, 5xx, timeouts) back off exponentially,
+honouring Retry-After. Each finished batch is handed to `on_batch` right away so results stream into
+Chroma while later batches are still in flight; submit() blocks when too many batches are pending.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    EMBEDDING_BACKOFF_SECONDS,
+    EMBEDDING_BATCH_MAX_INPUTS,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RATE_LIMIT_RPM,
+    EMBEDDING_RATE_LIMIT_TPM,
+)
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token for English); never 0 so empty strings still count as an input."""
+    return max(1, len(text) // 4)
+
+
+def batch_by_tokens(
+    texts: Iterable[str],
+    max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+    max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+) -> Iterator[list[int]]:
+    """Yield lists of indexes into `texts`, each within the token and input budget (order preserved)."""
+    batch: list[int] = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        n = approx_tokens(text)
+        if batch and (tokens + n > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(i)
+        tokens += n
+    if batch:
+        yield batch
+
+
+class RateLimiter:
+    """Token buckets for requests/minute and tokens/minute shared by all workers. 0 disables a limit."""
+
+    def __init__(self, requests_per_minute: int = EMBEDDING_RATE_LIMIT_RPM, tokens_per_minute: int = EMBEDDING_RATE_LIMIT_TPM):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int) -> float:
+        """Block until one request of `tokens` fits both budgets; returns seconds waited."""
+        waited = 0.0
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # An oversized batch still goes through, once the bucket is full
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self._paused_until - now)
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+                if wait <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """Server said slow down: hold every worker for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retriable(exc: Exception) -> bool:
+    """Rate limits, server errors, timeouts and connection failures are worth retrying; 4xx are not."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    try:
+        import openai
+        return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError))
+    except ImportError:
+        return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+@dataclass
+class PipelineStats:
+    chunks: int = 0
+    tokens: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    rate_limited_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "rate_limited_seconds": round(self.rate_limited_seconds, 3),
+            "seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+class EmbeddingPipeline:
+    """
+    submit(text, payload) chunks from any number of files; close() flushes and waits.
+    on_batch(payloads, vectors) runs on a worker thread for every embedded batch; on_error(payloads, exc)
+    for batches that still failed after retries. Use as a context manager.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+        on_batch: Callable[[list[Any], list[list[float]]], None],
+        on_error: Optional[Callable[[list[Any], Exception], None]] = None,
+        max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+        max_batch_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        backoff_seconds: float = EMBEDDING_BACKOFF_SECONDS,
+    ):
+        self._embed_fn = embed_fn
+        self._on_batch = on_batch
+        self._on_error = on_error
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.limiter = limiter or RateLimiter()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="aria-embed")
+        # Backpressure: at most 2x concurrency batches queued or running
+        self._slots = threading.BoundedSemaphore(max(1, concurrency) * 2)
+        self._futures: list[Future] = []
+        self._texts: list[str] = []
+        self._payloads: list[Any] = []
+        self._tokens = 0
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.stats = PipelineStats()
+
+    def __enter__(self) -> "EmbeddingPipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def submit(self, text: str, payload: Any) -> None:
+        n = approx_tokens(text)
+        if self._texts and (self._tokens + n > self.max_batch_tokens or len(self._texts) >= self.max_batch_inputs):
+            self.flush()
+        self._texts.append(text)
+        self._payloads.append(payload)
+        self._tokens += n
+
+    def flush(self) -> None:
+        """Dispatch the partially filled batch (blocks while the pipeline is saturated)."""
+        if not self._texts:
+            return
+        texts, payloads, tokens = self._texts, self._payloads, self._tokens
+        self._texts, self._payloads, self._tokens = [], [], 0
+        self._slots.acquire()
+        future = self._pool.submit(self._run_batch, texts, payloads, tokens)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def close(self) -> dict[str, Any]:
+        """Flush, wait for every batch, stop the workers; returns stats as a dict. Idempotent."""
+        if self._closed:
+            return self.stats.as_dict()
+        self._closed = True
+        self.flush()
+        for future in self._futures:
+            future.result()
+        self._pool.shutdown(wait=True)
+        self.stats.seconds = time.perf_counter() - self.stats.started
+        metrics.observe("embedding_pipeline_seconds", self.stats.seconds)
+        return self.stats.as_dict()
+
+    def _run_batch(self, texts: list[str], payloads: list[Any], tokens: int) -> None:
+        attempt = 0
+        while True:
+            waited = self.limiter.acquire(tokens)
+            try:
+                start = time.perf_counter()
+                vectors = self._embed_fn(texts)
+                metrics.observe("embedding_batch_seconds", time.perf_counter() - start)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retriable(e):
+                    logger.error("Embedding batch of %d chunks failed after %d attempt(s): %s", len(texts), attempt + 1, e)
+                    with self._stats_lock:
+                        self.stats.failed_batches += 1
+                        self.stats.rate_limited_seconds += waited
+                    metrics.incr("embedding_batches_failed")
+                    if self._on_error:
+                        self._on_error(payloads, e)
+                    return
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self.backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+                if getattr(e, "status_code", None) == 429:
+                    self.limiter.pause(delay)
+                logger.warning("Embedding batch retry %d in %.2fs: %s", attempt + 1, delay, e)
+                with self._stats_lock:
+                    self.stats.retries += 1
+                    self.stats.rate_limited_seconds += waited
+                metrics.incr("embedding_batch_retries")
+                time.sleep(delay)
+                attempt += 1
+        with self._stats_lock:
+            self.stats.chunks += len(texts)
+            self.stats.tokens += tokens
+            self.stats.batches += 1
+            self.stats.rate_limited_seconds += waited
+        try:
+            self._on_batch(payloads, vectors)
+        except Exception as e:
+            logger.exception("Storing embedded batch failed: %s", e)
+            with self._stats_lock:
+                self.stats.failed_batches += 1
+            if self._on_error:
+                self._on_error(payloads, e)
@@ -0,0 +1,47 @@
+"""
+Bounded thread pool for blocking work called from async FastAPI handlers.
+
+The Claude, OpenAI, Tavily and Chroma SDK calls and the cross-encoder are synchronous;
+running them directly inside an `async def` route freezes every other session on the
+uvicorn worker. `run_blocking` hands them to a shared, bounded executor instead so the
+event loop keeps serving other conversations while one call waits on the network.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import BLOCKING_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_WORKERS, thread_name_prefix="aria-blocking")
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a sync callable on the bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    """Stop the executor (called from the FastAPI lifespan on shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+        logger.info("Blocking executor shut down")
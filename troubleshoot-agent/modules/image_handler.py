@@ -9,6 +9,7 @@ from typing import Any
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import ANTHROPIC_API_KEY, LLM_MODEL
+from modules import clients
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +35,7 @@ def analyze_image(image_bytes: bytes, user_context: str = "") -> dict[str, Any]:
             "suggested_focus": "",
         }
     try:
-        import anthropic
-        client = anthropic.Anthropic()
+        client = clients.get_anthropic()
         b64 = _encode_image(image_bytes)
         media_type = "image/png"
         if image_bytes[:3] == b"\xff\xd8\xff":
@@ -0,0 +1,190 @@
+"""
+In-process BM25 inverted index over knowledge-base chunks.
+
+Dense search misses exact terms ("Error 4013", "Face ID", model numbers). This index is kept in step with
+the Chroma collection during ingestion (same chunk ids, text and metadata), persisted as JSON next to
+CHROMA_PERSIST_DIR, and fused with vector results in rag_engine.retrieve via reciprocal rank fusion.
+Because it needs no embedding call, it also answers on its own when the embedding API is slow or down.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import BM25_B, BM25_K1, LEXICAL_INDEX_PATH
+from modules import vector_store
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its my of on or so "
+    "that the their then there these this to was what when where which why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased alphanumeric terms minus stopwords; numbers are kept ("4013", "15")."""
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 (Okapi) over chunks keyed by Chroma id. Thread-safe; call save() after a batch of changes."""
+
+    def __init__(self, path: Optional[str] = LEXICAL_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs: dict[str, tuple[str, dict[str, Any], int]] = {}  # id -> (text, metadata, length)
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)  # term -> {id: term frequency}
+        self._total_length = 0
+        self._dirty = False
+        self._file_stamp: Optional[tuple[int, int]] = None  # (mtime_ns, size) of the file as last saved/loaded
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _add(self, doc_id: str, text: str, metadata: dict[str, Any]) -> None:
+        self._remove(doc_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self._docs[doc_id] = (text, dict(metadata or {}), length)
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def _remove(self, doc_id: str) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        self._total_length -= entry[2]
+        for term in set(tokenize(entry[0])):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def upsert(self, ids: list[str], documents: list[str], metadatas: list[dict[str, Any]]) -> None:
+        with self._lock:
+            for doc_id, text, meta in zip(ids, documents, metadatas):
+                self._add(doc_id, text or "", meta)
+            self._dirty = True
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict[str, Any]]) -> None:
+        with self._lock:
+            for doc_id, meta in zip(ids, metadatas):
+                if doc_id in self._docs:
+                    text, _, length = self._docs[doc_id]
+                    self._docs[doc_id] = (text, dict(meta or {}), length)
+            self._dirty = True
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            self._total_length = 0
+            self._dirty = True
+
+    def replace_all(self, ids: list[str], documents: list[str], metadatas: list[dict[str, Any]]) -> None:
+        """Swap the whole contents at once (searches never see a half-built index)."""
+        with self._lock:
+            self.clear()
+            self.upsert(ids, documents, metadatas)
+
+    def _stamp(self) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def changed_on_disk(self) -> bool:
+        """True if the index file was written since this index last saved or loaded it (another process)."""
+        stamp = self._stamp() if self.path else None
+        return stamp is not None and stamp != self._file_stamp
+
+    def get(self, doc_id: str) -> Optional[tuple[str, dict[str, Any]]]:
+        entry = self._docs.get(doc_id)
+        return (entry[0], entry[1]) if entry else None
+
+    @staticmethod
+    def _matches(meta: dict[str, Any], where: Optional[dict[str, Any]]) -> bool:
+        return vector_store.matches(meta, where)
+
+    def search(self, query: str, top_k: int, where: Optional[dict[str, Any]] = None) -> list[tuple[str, float]]:
+        """Return [(id, bm25 score)] best first; `where` filters on chunk metadata (Chroma syntax, e.g. $in)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+            avg_len = self._total_length / n or 1.0
+            scores: dict[str, float] = defaultdict(float)
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1.0 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    length = self._docs[doc_id][2]
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            if where:
+                ranked = [(d, s) for d, s in ranked if self._matches(self._docs[d][1], where)]
+        return ranked[:top_k]
+
+    def save(self) -> None:
+        """Persist (atomic replace) if anything changed since the last save/load."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "docs": {k: [text, meta] for k, (text, meta, _) in self._docs.items()}}
+            self._dirty = False
+        try:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self._file_stamp = self._stamp()
+        except OSError as e:
+            logger.warning("Could not write lexical index %s: %s", self.path, e)
+
+    def load(self) -> bool:
+        """Load from disk; False if there is no (readable) index file."""
+        if not self.path:
+            return False
+        stamp = self._stamp()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.clear()
+            for doc_id, (text, meta) in data.get("docs", {}).items():
+                self._add(doc_id, text, meta)
+            self._dirty = False
+            self._file_stamp = stamp
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"chunks": len(self._docs), "terms": len(self._postings), "persistent": bool(self.path)}
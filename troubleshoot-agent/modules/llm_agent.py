@@ -4,14 +4,23 @@ LLM orchestration: build context from RAG + web + image, call Claude, return str
 import logging
 import re
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncGenerator
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import ANTHROPIC_API_KEY, LLM_MODEL
+from modules import clients
 
 logger = logging.getLogger(__name__)
 
+MAX_TOKENS = 1024
+NOT_CONFIGURED_TEXT = "I'm sorry, the assistant is not configured. Please set ANTHROPIC_API_KEY."
+ERROR_TEXT = "I'm sorry, I couldn't process that. Please try again or contact Apple Support."
+
+
+class StreamInterrupted(Exception):
+    """stream_run failed after yielding part of the answer; the caller must discard what it received."""
+
 SYSTEM_PROMPT = """You are an expert Apple iPhone support technician named ARIA (Adaptive Resolution Intelligence Agent).
 Your role is to guide users through troubleshooting iPhone issues step-by-step.
 
@@ -115,17 +124,14 @@ def build_context_prompt(
     return "\n\n".join(parts) if parts else "No additional context."
 
 
-def run(
+def _build_request(
     user_message: str,
     conversation_history: list[dict],
     rag_context: list[dict],
     web_context: list[dict],
     image_description: str | None,
-) -> dict[str, Any]:
-    """
-    Orchestrate: build context-stuffed prompt → call Claude → return response.
-    Returns: { "text": str, "sources": list[str], "step_number": int, "has_next_step": bool }
-    """
+) -> tuple[str, list[dict]]:
+    """Return (system prompt with context block, Claude messages list)."""
     context_block = build_context_prompt(rag_context, web_context, image_description)
     system = SYSTEM_PROMPT + "\n\n## Current context (retrieved docs, web, image)\n" + context_block
 
@@ -133,22 +139,62 @@ def run(
     for m in conversation_history:
         messages.append({"role": m.get("role", "user"), "content": m.get("content", "")})
     messages.append({"role": "user", "content": user_message})
+    return system, messages
+
+
+def finalize_response(text: str, rag_context: list[dict], web_context: list[dict]) -> dict[str, Any]:
+    """Attach sources and step heuristics to a completed response text (shared by run and stream_run)."""
+    # Extract sources from context
+    sources = []
+    for r in rag_context:
+        src = r.get("source_file")
+        if src and src not in sources:
+            sources.append(src)
+    for w in web_context:
+        url = w.get("url")
+        if url and url not in sources:
+            sources.append(url)
+
+    # Heuristic: step number and has_next_step from response
+    step_match = re.search(r"(?:step|step)\s*(\d+)", text.lower())
+    step_number = int(step_match.group(1)) if step_match else 1
+    has_next_step = "next step" in text.lower() or "then " in text.lower() or "after that" in text.lower()
+
+    return {
+        "text": text,
+        "sources": sources,
+        "step_number": step_number,
+        "has_next_step": has_next_step,
+    }
+
+
+def run(
+    user_message: str,
+    conversation_history: list[dict],
+    rag_context: list[dict],
+    web_context: list[dict],
+    image_description: str | None,
+) -> dict[str, Any]:
+    """
+    Orchestrate: build context-stuffed prompt → call Claude → return response.
+    Returns: { "text": str, "sources": list[str], "step_number": int, "has_next_step": bool }
+    """
+    system, messages = _build_request(user_message, conversation_history, rag_context, web_context, image_description)
 
     if not ANTHROPIC_API_KEY:
         logger.warning("ANTHROPIC_API_KEY not set; returning placeholder")
         return {
-            "text": "I'm sorry, the assistant is not configured. Please set ANTHROPIC_API_KEY.",
+            "text": NOT_CONFIGURED_TEXT,
             "sources": [],
             "step_number": 0,
             "has_next_step": False,
         }
 
     try:
-        import anthropic
-        client = anthropic.Anthropic()
+        client = clients.get_anthropic()
         resp = client.messages.create(
             model=LLM_MODEL,
-            max_tokens=1024,
+            max_tokens=MAX_TOKENS,
             system=system,
             messages=messages,
         )
@@ -156,34 +202,52 @@ def run(
     except Exception as e:
         logger.exception("Claude API error: %s", e)
         return {
-            "text": "I'm sorry, I couldn't process that. Please try again or contact Apple Support.",
+            "text": ERROR_TEXT,
             "sources": [],
             "step_number": 0,
             "has_next_step": False,
         }
 
-    # Extract sources from context
-    sources = []
-    for r in rag_context:
-        src = r.get("source_file")
-        if src and src not in sources:
-            sources.append(src)
-    for w in web_context:
-        url = w.get("url")
-        if url and url not in sources:
-            sources.append(url)
+    return finalize_response(text, rag_context, web_context)
 
-    # Heuristic: step number and has_next_step from response
-    step_match = re.search(r"(?:step|step)\s*(\d+)", text.lower())
-    step_number = int(step_match.group(1)) if step_match else 1
-    has_next_step = "next step" in text.lower() or "then " in text.lower() or "after that" in text.lower()
 
-    return {
-        "text": text,
-        "sources": sources,
-        "step_number": step_number,
-        "has_next_step": has_next_step,
-    }
+async def stream_run(
+    user_message: str,
+    conversation_history: list[dict],
+    rag_context: list[dict],
+    web_context: list[dict],
+    image_description: str | None,
+) -> AsyncGenerator[str, None]:
+    """
+    Same prompt as run(), but yield Claude's text deltas as they arrive (AsyncAnthropic streaming).
+    Callers join the deltas and pass the result to finalize_response(). A failure before any text yields
+    ERROR_TEXT; a failure midway raises StreamInterrupted, since the text so far is not an answer.
+    """
+    system, messages = _build_request(user_message, conversation_history, rag_context, web_context, image_description)
+
+    if not ANTHROPIC_API_KEY:
+        logger.warning("ANTHROPIC_API_KEY not set; returning placeholder")
+        yield NOT_CONFIGURED_TEXT
+        return
+
+    emitted = False
+    try:
+        client = clients.get_async_anthropic()
+        async with client.messages.stream(
+            model=LLM_MODEL,
+            max_tokens=MAX_TOKENS,
+            system=system,
+            messages=messages,
+        ) as stream:
+            async for delta in stream.text_stream:
+                if delta:
+                    emitted = True
+                    yield delta
+    except Exception as e:
+        logger.exception("Claude streaming error: %s", e)
+        if emitted:
+            raise StreamInterrupted(str(e)) from e
+        yield ERROR_TEXT
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+In-process metrics: monotonic counters, latency observations with percentiles, and gauges
+(callables polled at snapshot time, e.g. cache size/hit rate).
+Exposed via GET /api/metrics; reset per process (no external metrics backend).
+"""
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable
+
+# Keep the most recent observations per timing for percentile estimates
+MAX_OBSERVATIONS = 1024
+
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_timings: dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_OBSERVATIONS))
+_gauges: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def incr(name: str, n: int = 1) -> None:
+    """Increment a counter."""
+    with _lock:
+        _counters[name] += n
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one latency observation (seconds)."""
+    with _lock:
+        _timings[name].append(float(seconds))
+
+
+def register_gauge(name: str, fn: Callable[[], dict[str, Any]]) -> None:
+    """Register a callable whose dict result is included in snapshot()["gauges"][name]."""
+    with _lock:
+        _gauges[name] = fn
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+def snapshot() -> dict[str, Any]:
+    """Return counters and per-timing count/p50/p95/max (seconds)."""
+    with _lock:
+        counters = dict(_counters)
+        timings = {k: sorted(v) for k, v in _timings.items()}
+        gauges = dict(_gauges)
+    return {
+        "counters": counters,
+        "gauges": {k: fn() for k, fn in gauges.items()},
+        "timings": {
+            k: {
+                "count": len(v),
+                "p50": round(_percentile(v, 50), 4),
+                "p95": round(_percentile(v, 95), 4),
+                "max": round(v[-1], 4) if v else 0.0,
+            }
+            for k, v in timings.items()
+        },
+    }
+
+
+def reset() -> None:
+    """Clear all counters and timings (tests, benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _timings.clear()
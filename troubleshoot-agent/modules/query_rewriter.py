@@ -0,0 +1,139 @@
+"""
+Conversation-aware query rewriting: follow-ups such as "that didn't work" or "what next?" carry no topic of
+their own, so retrieving on them returns unrelated chunks, scores low and sends the turn to web search and
+the LLM retry. rewrite() folds the session's issue and the user turn that described it into the retrieval
+query; messages that name an issue themselves are left alone.
+
+Rule-based by default. QUERY_REWRITE_BACKEND="llm" asks a small Claude model to write the standalone query
+instead (only for turns the rules flag as follow-ups; the rule-based query is used when it fails). Results
+are memoized per session turn on ConversationContext.query_rewrites.
+"""
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    ANTHROPIC_API_KEY,
+    QUERY_REWRITE_BACKEND,
+    QUERY_REWRITE_HISTORY_TURNS,
+    QUERY_REWRITE_MAX_CHARS,
+    QUERY_REWRITE_MAX_TERMS,
+    QUERY_REWRITE_MODEL,
+)
+from modules import clients, metrics
+from modules.context_manager import ConversationContext, classify_issue, latest_issue
+
+logger = logging.getLogger(__name__)
+
+# Words that point back at earlier turns or report on a step ("it still", "that didn't work", "what next")
+FOLLOW_UP = re.compile(
+    r"\b(?:it|that|this|those|these|them|still|again|also|instead|next|else|same|now|tried|done|worked|"
+    r"didn'?t|doesn'?t|did not|does not|won'?t|isn'?t|nothing|yes|yeah|yep|no|nope|ok|okay|shows?|says?)\b",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"[a-z0-9%][a-z0-9%'\-]*")
+_STOPWORDS = frozenset(
+    "a an and are be but can could do does for from have how i if in is my me of on or should so the then "
+    "to was what when where which why will with would you your".split()
+)
+# Query used when the session has an issue but no earlier user turn names it (e.g. it came from an image)
+ISSUE_QUERIES = {
+    "battery": "iPhone battery draining fast",
+    "wifi": "iPhone Wi-Fi connection problems",
+    "storage": "iPhone storage full",
+    "crashes": "iPhone apps crashing or freezing",
+    "overheating": "iPhone overheating",
+    "bluetooth": "iPhone Bluetooth pairing problems",
+    "screen": "iPhone screen display problems",
+}
+
+REWRITE_PROMPT = """You rewrite the user's last message in an iPhone support chat as a standalone search query for \
+the support knowledge base. Include the device, the problem and what the user is reporting or asking now. \
+Reply with the query only, at most 25 words."""
+
+
+def _content_terms(message: str) -> list[str]:
+    return [w for w in _WORD.findall(message.lower()) if w not in _STOPWORDS and not FOLLOW_UP.fullmatch(w)]
+
+
+def is_follow_up(message: str) -> bool:
+    """True if the message names no issue and refers back to the conversation or is too short to stand alone."""
+    if classify_issue(message) != "general":
+        return False
+    return bool(FOLLOW_UP.search(message)) or len(_content_terms(message)) <= QUERY_REWRITE_MAX_TERMS
+
+
+def _earlier_turns(ctx: ConversationContext, message: str) -> list[dict]:
+    """History before this turn (the orchestrator records the user message before retrieving)."""
+    history = ctx.history
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+        history = history[:-1]
+    return history
+
+
+def rule_rewrite(history: list[dict], issue: str, message: str) -> str:
+    """
+    The user turn that opened the current issue (the first one about `issue` since the user last talked about
+    another issue; a canned query for it if none), followed by the message.
+    """
+    users = [m["content"] for m in history if m["role"] == "user"]
+    anchor = None
+    for u in reversed(users):
+        category = classify_issue(u)
+        if issue == "general" or category not in (issue, "general"):
+            break
+        if category == issue:
+            anchor = u
+    if anchor is None:
+        anchor = ISSUE_QUERIES.get(issue) or (users[-1] if users else "")
+    if not anchor:
+        return message
+    return f"{anchor[:max(0, QUERY_REWRITE_MAX_CHARS - len(message) - 1)]} {message}".strip()
+
+
+def llm_rewrite(history: list[dict], message: str) -> str:
+    """Standalone query written by QUERY_REWRITE_MODEL from the last few messages."""
+    transcript = "\n".join(
+        f"{m['role']}: {m['content'][:QUERY_REWRITE_MAX_CHARS]}" for m in history[-QUERY_REWRITE_HISTORY_TURNS:]
+    )
+    resp = clients.get_anthropic().messages.create(
+        model=QUERY_REWRITE_MODEL,
+        max_tokens=64,
+        system=REWRITE_PROMPT,
+        messages=[{"role": "user", "content": f"{transcript}\nuser (last message): {message}"}],
+    )
+    text = (resp.content[0].text if resp.content else "").strip().strip('"')
+    if not text:
+        raise ValueError("empty rewrite")
+    return text[:QUERY_REWRITE_MAX_CHARS]
+
+
+def rewrite(ctx: ConversationContext, message: str, backend: str = QUERY_REWRITE_BACKEND) -> str:
+    """Retrieval query for this turn's message; memoized per (user turn, message) on the session."""
+    turn = sum(1 for m in ctx.history if m["role"] == "user")
+    key = (turn, message)
+    if key in ctx.query_rewrites:
+        metrics.incr("query_rewrite_cached")
+        return ctx.query_rewrites[key]
+
+    started = time.perf_counter()
+    history = _earlier_turns(ctx, message)
+    query = message
+    if backend != "off" and history and is_follow_up(message):
+        # The issue the user raised last, not the session's first one
+        issue = latest_issue(m["content"] for m in history if m["role"] == "user")
+        if issue == "general":
+            issue = ctx.current_issue or classify_issue(" ".join(m["content"] for m in history))
+        query = rule_rewrite(history, issue, message)
+        if backend == "llm" and ANTHROPIC_API_KEY:
+            try:
+                query = llm_rewrite(history, message)
+            except Exception as e:
+                logger.warning("Query rewrite model failed, using rule-based query: %s", e)
+        metrics.incr("query_rewritten")
+    metrics.observe("query_rewrite_seconds", time.perf_counter() - started)
+    ctx.query_rewrites = {key: query}  # Earlier turns are never asked for again
+    return query
@@ -3,46 +3,87 @@ RAG engine: document ingestion, chunking, embedding, vector search, and rerankin
 
 Technology choices (inline):
 - Vector DB: ChromaDB — zero-infrastructure local persistence; ideal for dev; swap to Pinecone/Weaviate for production scale.
+  Pluggable (modules/vector_store.py): VECTOR_DB=flat keeps vectors in an in-process memory-mapped float16
+  matrix searched exactly (or via IVF lists), which beats HNSW at this corpus size.
 - Embedding: OpenAI text-embedding-3-small — best cost/quality for short troubleshooting chunks; 1536 dims; 62% cheaper than ada-002.
+  Pluggable (modules/embedding_backends.py): EMBEDDING_BACKEND=local embeds on CPU with an ONNX model, no API
+  round trip per query. Non-default backends get their own collection, manifest and BM25 index.
 - Chunking: Recursive character splitter with semantic boundary detection at sentence ends.
+- Ingestion is incremental and idempotent: chunk ids are content hashes, unchanged files are skipped via a
+  manifest of file hashes, changed chunks are upserted and chunks that disappeared are deleted.
+- Retrieval is hybrid: BM25 (modules/lexical_index.py, kept in step with the collection) fused with vector
+  results by reciprocal rank fusion; if the query embedding is slow or fails, BM25 answers alone.
 """
+import hashlib
+import json
 import logging
+import math
+import multiprocessing
+import os
 import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterator, Optional
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from openai import OpenAI
 
 # Import config from parent package (run from troubleshoot-agent root)
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import (
     CHROMA_PERSIST_DIR,
-    CHUNK_OVERLAP,
-    CHUNK_SIZE,
+    COLLECTION_STATS_TTL,
     EMBEDDING_MODEL,
+    FLAT_STORE_DIR,
+    INGEST_MANIFEST_PATH,
+    INGEST_QUEUE_FILES,
+    INGEST_WORKERS,
+    LEXICAL_INDEX_PATH,
+    LEXICAL_SCORE_PIVOT,
     OPENAI_API_KEY,
+    RAG_SCORE_THRESHOLD,
+    RERANK_CALIBRATION,
+    RERANK_SCORE_THRESHOLD,
+    RETRIEVE_CANDIDATES,
+    RETRIEVE_EMBED_TIMEOUT,
+    RRF_K,
     TOP_K_RAG,
+    VECTOR_DB,
 )
+from modules import doc_loader, embedding_backends, embedding_cache, metrics, reranker, vector_store
+from modules.lexical_index import LexicalIndex
+from modules.embedding_pipeline import EmbeddingPipeline
 
 logger = logging.getLogger(__name__)
 
 # Lazy-initialized globals
 _embeddings: Optional[OpenAIEmbeddings] = None
-_client: Optional[OpenAI] = None
 _chroma_client: Optional[chromadb.PersistentClient] = None
 _collection_name = "troubleshoot_docs"
-_reranker = None
+# Called after every successful ingestion (cache invalidation, collection stats, ...)
+_ingest_listeners: list[Callable[[], None]] = []
+# Serializes ingestion so the manifest and collection stay consistent
+_ingest_lock = threading.RLock()
+_lexical: Optional[LexicalIndex] = None
+_lexical_lock = threading.Lock()
+# Query embeddings run here so retrieve() can give up on a slow embedding API and answer from BM25
+_query_embed_pool: Optional[ThreadPoolExecutor] = None
 
 # Scoring constants (documented in spec)
 BOOST_SUPPORT_APPLE = 0.15
 BOOST_RECENT_6MO = 0.10
 PENALTY_SHORT_CHUNK = 0.05
 MIN_TOKENS_FOR_PENALTY = 50
+RECENT_SECONDS = 180 * 86400  # "Recent" = updated within the last 6 months
+# domain_class chunk metadata (0 = other)
+DOMAIN_CLASSES = {"support.apple.com": 1, "discussions.apple.com": 2, "apple.com": 3}
 
 
 def _get_embeddings() -> OpenAIEmbeddings:
@@ -52,13 +93,6 @@ def _get_embeddings() -> OpenAIEmbeddings:
     return _embeddings
 
 
-def _get_openai_client() -> OpenAI:
-    global _client
-    if _client is None:
-        _client = OpenAI(api_key=OPENAI_API_KEY)
-    return _client
-
-
 def _get_chroma() -> chromadb.PersistentClient:
     global _chroma_client
     if _chroma_client is None:
@@ -66,18 +100,202 @@ def _get_chroma() -> chromadb.PersistentClient:
     return _chroma_client
 
 
-def _get_collection():
-    return _get_chroma().get_or_create_collection(
-        name=_collection_name,
-        metadata={"hnsw:space": "cosine"},
-    )
+def _embedding_model() -> str:
+    """Model id of the active embedding backend (keys chunk ids, file hashes and the embedding cache)."""
+    return embedding_backends.get_backend().model
+
+
+def _store_suffix() -> str:
+    """Empty for the default OpenAI model (existing stores keep their names), else a slug of the backend model."""
+    backend = embedding_backends.get_backend()
+    if backend.name == "openai" and backend.model == EMBEDDING_MODEL:
+        return ""
+    return "_" + re.sub(r"[^a-z0-9]+", "_", backend.model.lower()).strip("_")
+
+
+def _scoped_path(path: str) -> str:
+    """Per-backend variant of a store file (manifest, BM25 index): vectors of different models never mix."""
+    p = Path(path)
+    return str(p.with_name(p.stem + _store_suffix() + p.suffix))
+
+
+def _get_collection() -> vector_store.VectorStore:
+    """The VECTOR_DB store for the active embedding backend (Chroma collection API; see modules/vector_store.py)."""
+    name = _collection_name + _store_suffix()
+    if VECTOR_DB == "flat":
+        return vector_store.get_flat_store(os.path.join(FLAT_STORE_DIR, name))
+    return vector_store.ChromaStore(_get_chroma(), name)
+
+
+def _store_key() -> tuple:
+    """Identity of the store _get_collection() would return (backend, client or directory, collection name)."""
+    client = FLAT_STORE_DIR if VECTOR_DB == "flat" else id(_get_chroma())
+    return VECTOR_DB, client, _collection_name + _store_suffix()
+
+
+class CollectionStats:
+    """
+    Collection handle and chunk count for the query path, so retrieve() skips the get_or_create_collection
+    round trip and collection.count() on every call. Dropped on ingestion events, after `ttl` seconds, and
+    whenever the vector store, Chroma client or embedding backend (collection name) changes. Each reload
+    also brings the BM25 index back in step with the store (_refresh_lexical).
+    """
+
+    def __init__(self, ttl: float = COLLECTION_STATS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._key: Optional[tuple] = None
+        self._collection = None
+        self._count = 0
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self) -> tuple[Any, int]:
+        """(collection, chunk count), cached."""
+        key = _store_key()
+        with self._lock:
+            if self._key == key and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._collection, self._count
+        collection = _get_collection()
+        count = collection.count()
+        _refresh_lexical(collection, count)
+        with self._lock:
+            self.misses += 1
+            self._key, self._collection, self._count = key, collection, count
+            self._loaded_at = time.monotonic()
+        return collection, count
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+            self._collection = None
+            self.invalidations += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "count": self._count if self._key else None}
+
+
+collection_stats = CollectionStats()
+metrics.register_gauge("collection_stats", collection_stats.stats)
+
+
+def _get_lexical(collection=None) -> LexicalIndex:
+    """BM25 index, loaded from disk; rebuilt from the collection if missing or out of step with it."""
+    global _lexical
+    if _lexical is None:
+        with _lexical_lock:
+            if _lexical is None:
+                index = LexicalIndex(path=_scoped_path(LEXICAL_INDEX_PATH))
+                index.load()
+                collection = collection if collection is not None else _get_collection()
+                _rebuild_lexical_if_stale(index, collection, collection.count())
+                _lexical = index
+    return _lexical
+
+
+def _rebuild_lexical_if_stale(index: LexicalIndex, collection, count: int) -> None:
+    if len(index) != count:
+        logger.info("Rebuilding BM25 index from collection (%d chunks, index had %d)", count, len(index))
+        data = collection.get(include=["documents", "metadatas"]) if count else {"ids": [], "documents": [], "metadatas": []}
+        index.replace_all(data["ids"], data["documents"], data["metadatas"])
+        index.save()
+
+
+def _refresh_lexical(collection, count: int) -> None:
+    """
+    Bring the loaded BM25 index in step with the store after another process (knowledge_base/ingest.py)
+    changed it: reload the index file if it was rewritten, rebuild from the collection if the chunk count
+    still differs. Skipped while this process is ingesting (it keeps the index current itself).
+    """
+    index = _lexical
+    if index is None or not _ingest_lock.acquire(blocking=False):
+        return
+    try:
+        if index.changed_on_disk() and index.load():
+            logger.info("Reloaded BM25 index written by another process (%d chunks)", len(index))
+            metrics.incr("lexical_index_reloaded")
+        _rebuild_lexical_if_stale(index, collection, count)
+    finally:
+        _ingest_lock.release()
+
+
+def _store_upsert(collection, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]) -> None:
+    collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    _get_lexical(collection).upsert(ids, documents, metadatas)
 
 
 def _embed_texts(texts: list[str]) -> list[list[float]]:
-    """Batch embed via OpenAI API (Chroma can use OpenAI embedding function)."""
-    client = _get_openai_client()
-    out = client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
-    return [d.embedding for d in out.data]
+    """
+    Batch embed with the configured backend (OpenAI API or local ONNX model).
+    Goes through the shared embedding cache: only texts not already cached are sent to the backend.
+    """
+    backend = embedding_backends.get_backend()
+    cache = embedding_cache.get_cache()
+    vectors = cache.get_many(texts, backend.model)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = backend.embed([texts[i] for i in missing])
+        cache.put_many([texts[i] for i in missing], backend.model, fresh)
+        for i, vec in zip(missing, fresh):
+            vectors[i] = vec
+    return vectors
+
+
+def embed_query(query: str) -> list[float]:
+    """Embedding for a single query (served from the embedding cache when retrieve already embedded it)."""
+    return _embed_texts([query])[0]
+
+
+def chunk_embeddings(ids: list[str]) -> np.ndarray:
+    """Stored embeddings for chunk ids, unit-normalized, one row per id (zeros for ids no longer stored)."""
+    collection, _ = collection_stats.get()
+    got = collection.get(ids=list(ids), include=["embeddings"]) if ids else {"ids": []}
+    out = np.zeros((len(ids), 0), dtype=np.float32)
+    if len(got["ids"]):
+        stored = np.asarray(got["embeddings"], dtype=np.float32)
+        stored /= np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+        row = {cid: i for i, cid in enumerate(got["ids"])}
+        out = np.zeros((len(ids), stored.shape[1]), dtype=np.float32)
+        for i, cid in enumerate(ids):
+            if cid in row:
+                out[i] = stored[row[cid]]
+    return out
+
+
+def warm_up_store() -> int:
+    """Open the vector store and collection and load the BM25 index; returns the chunk count."""
+    collection, count = collection_stats.get()
+    _get_lexical(collection)
+    return count
+
+
+def warm_up_embeddings() -> float:
+    """Load the embedding backend (model, session, connection) with one dummy embed; returns seconds."""
+    backend = embedding_backends.get_backend()
+    seconds = backend.warm_up()
+    metrics.observe("embedding_warm_up_seconds", seconds)
+    logger.info("Embedding backend %s (%s) warm in %.3fs", backend.name, backend.model, seconds)
+    return seconds
+
+
+def add_ingest_listener(fn: Callable[[], None]) -> None:
+    """Register a callback fired after each document ingestion."""
+    if fn not in _ingest_listeners:
+        _ingest_listeners.append(fn)
+
+
+def _notify_ingested() -> None:
+    collection_stats.invalidate()  # Before listeners, so they already see the new count
+    for fn in list(_ingest_listeners):
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Ingest listener %s failed: %s", getattr(fn, "__name__", fn), e)
 
 
 def _approx_tokens(text: str) -> int:
@@ -92,16 +310,14 @@ def _parse_updated_date(metadata: dict) -> str | None:
     return metadata.get("updated") or metadata.get("updated_date")
 
 
-def _is_recent_6mo(updated_str: str | None) -> bool:
-    """True if updated within last 6 months (YYYY-MM-DD)."""
+def _updated_epoch(updated_str: str | None) -> int:
+    """'updated' date (YYYY-MM-DD...) as a UTC epoch; 0 when missing or unparseable."""
     if not updated_str:
-        return False
+        return 0
     try:
-        from datetime import datetime, timedelta
-        dt = datetime.strptime(updated_str[:10], "%Y-%m-%d")
-        return dt >= datetime.utcnow() - timedelta(days=180)
-    except Exception:
-        return False
+        return int(datetime.strptime(str(updated_str)[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return 0
 
 
 def _source_domain(source_file: str) -> str:
@@ -115,84 +331,425 @@ def _source_domain(source_file: str) -> str:
     return source_file
 
 
+def _chunk_features(chunk: str, meta: dict) -> dict[str, int]:
+    """Numeric scoring features stored with every chunk at ingestion, so retrieve() scores candidates as arrays."""
+    return {
+        "domain_class": DOMAIN_CLASSES.get(_source_domain(meta.get("source_file", "")), 0),
+        "updated_epoch": _updated_epoch(_parse_updated_date(meta)),
+        "token_count": _approx_tokens(chunk),
+    }
+
+
+def _chunk_ids(source_file: str, chunks: list[str]) -> list[str]:
+    """Content-addressed ids: an unchanged chunk keeps its id even if its position moves."""
+    ids = []
+    seen: dict[str, int] = {}
+    model = _embedding_model()
+    for c in chunks:
+        digest = hashlib.sha256(f"{model}\x00{c}".encode("utf-8")).hexdigest()[:24]
+        n = seen.get(digest, 0)
+        seen[digest] = n + 1
+        ids.append(f"{source_file}#{digest}" + (f"-{n}" if n else ""))
+    return ids
+
+
+def _load_manifest(collection) -> dict:
+    try:
+        with open(_scoped_path(INGEST_MANIFEST_PATH), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"documents": {}}
+    if manifest.get("documents") and collection.count() == 0:
+        # Collection was wiped underneath the manifest: nothing can be skipped
+        logger.warning("Ingest manifest ignored: collection is empty")
+        return {"documents": {}}
+    return manifest
+
+
+def _save_manifest(manifest: dict) -> None:
+    try:
+        path = _scoped_path(INGEST_MANIFEST_PATH)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not write ingest manifest: %s", e)
+
+
+def _plan_chunks(collection, chunks: list[str], meta: dict) -> dict[str, Any]:
+    """
+    Diff `chunks` for meta["source_file"] against what the collection holds: new chunks need embedding,
+    moved chunks only a metadata update, orphans deletion.
+    """
+    source_file = meta["source_file"]
+    ids = _chunk_ids(source_file, chunks)
+    existing = collection.get(where={"source_file": source_file}, include=["metadatas"])
+    existing_meta = dict(zip(existing["ids"], existing["metadatas"] or [{}] * len(existing["ids"])))
+
+    metadatas = [{**meta, "chunk_index": i, "content_preview": c[:100], **_chunk_features(c, meta)}
+                 for i, c in enumerate(chunks)]
+    id_set = set(ids)
+    return {
+        "ids": ids,
+        "chunks": chunks,
+        "metadatas": metadatas,
+        "new": [i for i, cid in enumerate(ids) if cid not in existing_meta],
+        "moved": [i for i, cid in enumerate(ids) if cid in existing_meta and existing_meta[cid] != metadatas[i]],
+        "orphans": [cid for cid in existing_meta if cid not in id_set],
+    }
+
+
+def _apply_plan(collection, plan: dict[str, Any], delete_orphans: bool = True) -> None:
+    """
+    Everything except embedding: metadata refresh for moved chunks and (unless the caller does it once the
+    new chunks are stored, see _delete_chunks) deletion of orphans.
+    """
+    lexical = _get_lexical(collection)
+    if plan["moved"]:
+        ids = [plan["ids"][i] for i in plan["moved"]]
+        metadatas = [plan["metadatas"][i] for i in plan["moved"]]
+        collection.update(ids=ids, metadatas=metadatas)
+        lexical.update_metadata(ids, metadatas)
+    if delete_orphans:
+        _delete_chunks(collection, plan["orphans"])
+
+
+def _delete_chunks(collection, ids: list[str]) -> None:
+    if ids:
+        collection.delete(ids=ids)
+        _get_lexical(collection).delete(ids)
+
+
+def _plan_stats(plan: dict[str, Any]) -> dict[str, int]:
+    n = len(plan["chunks"])
+    return {"chunks": n, "added": len(plan["new"]), "updated": len(plan["moved"]), "deleted": len(plan["orphans"]),
+            "unchanged": n - len(plan["new"]) - len(plan["moved"])}
+
+
+def _doc_meta(path: Path, metadata: dict | None, frontmatter: dict | None = None) -> dict:
+    """Chunk metadata: document frontmatter, overridden by caller-supplied metadata."""
+    meta = {**(frontmatter or {}), **(metadata or {})}
+    meta.setdefault("source_file", path.name)
+    meta.setdefault("updated", meta.get("updated", ""))
+    meta.setdefault("category", "general")  # Uploads have no frontmatter; category pre-filters always include "general"
+    return meta
+
+
 def ingest_document(filepath: str, metadata: dict | None = None) -> int:
     """
-    Load, chunk, embed, and store a single document.
-    Returns number of chunks created.
+    Load, chunk, embed, and store a single document. Idempotent: only new/changed chunks are embedded,
+    and an unchanged file is skipped entirely.
+    Returns number of chunks the document has in the store.
     """
     path = Path(filepath)
     if not path.exists():
         raise FileNotFoundError(f"Document not found: {filepath}")
 
-    raw = path.read_text(encoding="utf-8", errors="replace")
-    # Strip YAML frontmatter for chunking
-    if raw.startswith("---"):
-        parts = raw.split("---", 2)
-        if len(parts) >= 3:
-            raw = parts[2].strip()
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n\n", "\n", ". ", " ", ""],
-    )
-    chunks = splitter.split_text(raw)
-    if not chunks:
-        logger.warning("No chunks produced for %s", filepath)
-        return 0
-
-    meta = metadata or {}
-    meta.setdefault("source_file", path.name)
-    meta.setdefault("updated", meta.get("updated", ""))
+    meta = _doc_meta(path, metadata)
+    source_file = meta["source_file"]
+    with _ingest_lock:
+        collection = _get_collection()
+        manifest = _load_manifest(collection)
+        file_hash = doc_loader.file_hash(path.read_bytes(), meta, _embedding_model())
+        known = manifest["documents"].get(source_file)
+        if known and known.get("hash") == file_hash:
+            return known.get("chunks", 0)
+        loaded = doc_loader.load_and_chunk(str(path))
+        chunks = loaded["chunks"]
+        meta = _doc_meta(path, metadata, loaded["metadata"])
+        if not chunks:
+            logger.warning("No chunks produced for %s", filepath)
+        plan = _plan_chunks(collection, chunks, meta)
+        if plan["new"]:
+            new_chunks = [plan["chunks"][i] for i in plan["new"]]
+            _store_upsert(
+                collection,
+                ids=[plan["ids"][i] for i in plan["new"]],
+                embeddings=_embed_texts(new_chunks),
+                documents=new_chunks,
+                metadatas=[plan["metadatas"][i] for i in plan["new"]],
+            )
+        _apply_plan(collection, plan)
+        manifest["documents"][source_file] = {"hash": file_hash, "chunks": len(chunks)}
+        _save_manifest(manifest)
+        _get_lexical(collection).save()
+    stats = _plan_stats(plan)
+    logger.info("Ingested %s: %d chunks (%d embedded, %d deleted)", filepath, stats["chunks"], stats["added"], stats["deleted"])
+    if stats["added"] or stats["updated"] or stats["deleted"]:
+        _notify_ingested()
+    return stats["chunks"]
+
+
+def _log_progress(event: dict[str, Any]) -> None:
+    if event.get("error"):
+        logger.error("[%d/%d] %s failed: %s", event["done"], event["total"], event["source_file"], event["error"])
+    elif event["skipped"]:
+        logger.info("[%d/%d] %s unchanged", event["done"], event["total"], event["source_file"])
+    else:
+        logger.info("[%d/%d] %s: %d chunks (%d new), load %.3fs, chunk %.3fs, plan %.3fs",
+                    event["done"], event["total"], event["source_file"], event["chunks"], event["added"],
+                    event["load_seconds"], event["chunk_seconds"], event["plan_seconds"])
 
-    collection = _get_collection()
-    ids = [f"{path.name}_{i}" for i in range(len(chunks))]
-    embeddings = _embed_texts(chunks)
-    metadatas = []
-    for i, c in enumerate(chunks):
-        m = {**meta, "chunk_index": i, "content_preview": c[:100]}
-        metadatas.append(m)
 
-    collection.add(ids=ids, embeddings=embeddings, documents=chunks, metadatas=metadatas)
-    logger.info("Ingested %s: %d chunks", filepath, len(chunks))
-    return len(chunks)
+def _load_failed(path: Path, e: Exception) -> dict[str, Any]:
+    logger.error("Failed to load %s: %s", path, e)
+    return {"path": str(path), "error": f"{e.__class__.__name__}: {e}"}
 
 
-def ingest_directory(dir_path: str) -> dict[str, Any]:
-    """Batch ingest all .md, .txt, and .pdf files in a directory."""
+def _loaded_files(paths: list[Path], workers: int, max_ahead: int) -> Iterator[dict[str, Any]]:
+    """
+    Yield doc_loader.load_and_chunk results as files finish parsing. With more than one worker, files are
+    parsed in a process pool, never more than `max_ahead` files beyond what the consumer has taken.
+    A file that fails to load yields {"path", "error"} instead, so one bad file never stops the run.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                yield doc_loader.load_and_chunk(str(path))
+            except Exception as e:
+                yield _load_failed(path, e)
+        return
+    # spawn: the parent already runs Chroma and embedding threads, which fork() does not copy safely
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=ctx) as pool:
+        queue = iter(paths)
+        in_flight: dict = {}  # future -> path
+        for path in queue:
+            in_flight[pool.submit(doc_loader.load_and_chunk, str(path))] = path
+            if len(in_flight) >= max_ahead:
+                break
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                next_path = next(queue, None)
+                if next_path is not None:
+                    in_flight[pool.submit(doc_loader.load_and_chunk, str(next_path))] = next_path
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield _load_failed(path, e)
+
+
+def ingest_directory(
+    dir_path: str,
+    workers: int = INGEST_WORKERS,
+    progress: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> dict[str, Any]:
+    """
+    Batch ingest all .md, .txt, and .pdf files in a directory (unchanged files are skipped).
+    Changed files are parsed and chunked in a process pool (`workers`) and fed, at most INGEST_QUEUE_FILES
+    ahead, into one EmbeddingPipeline: token-bounded batches embedded concurrently under the rate limit and
+    upserted as each batch lands. A file is recorded in the manifest only once all of its chunks are stored,
+    so a failed batch is retried on the next run; its outdated chunks are deleted at that point too, so a
+    failure never leaves a document half missing. `progress` gets one event per file (default: log line).
+    """
     base = Path(dir_path)
     if not base.is_dir():
         return {"error": f"Not a directory: {dir_path}", "files": 0, "chunks": 0}
+    progress = progress or _log_progress
+
+    paths = []
+    for pattern in doc_loader.SUPPORTED_PATTERNS:
+        for path in sorted(base.glob(pattern)):
+            if path.suffix.lower() == ".pdf":
+                try:
+                    import pypdf  # noqa: F401
+                except ImportError:
+                    logger.warning("PDF support requires pypdf; skipping %s", path)
+                    continue
+            paths.append(path)
 
-    total_chunks = 0
     files_ingested = []
-    for ext in ("*.md", "*.txt", "*.pdf"):
-        for path in base.glob(ext):
+    store_lock = threading.Lock()
+    pending: dict[str, int] = {}       # source_file -> chunks not yet stored
+    awaiting: dict[str, dict] = {}     # source_file -> manifest entry to record once pending hits 0
+    orphans: dict[str, list[str]] = {} # source_file -> outdated chunk ids to delete once pending hits 0
+    failed: set[str] = set()
+    started = time.perf_counter()
+
+    def report(entry: dict[str, Any]) -> None:
+        files_ingested.append(entry)
+        progress({"done": len(files_ingested), "total": len(paths), **entry})
+
+    def report_failed(path: str, source_file: str, error: str) -> None:
+        with store_lock:
+            failed.add(source_file)
+        report({"path": path, "source_file": source_file, "skipped": False, "chunks": 0, "error": error})
+
+    with _ingest_lock:
+        collection = _get_collection()
+        manifest = _load_manifest(collection)
+
+        # Unchanged files are recognised by hash alone, before any parsing
+        todo: dict[str, tuple[dict, str]] = {}
+        for path in paths:
+            meta = _doc_meta(path, {"source_file": path.name})
             try:
-                if path.suffix.lower() == ".pdf":
-                    # PDF: read with PyPDF2 or similar if available; else skip
-                    try:
-                        import pypdf
-                        reader = pypdf.PdfReader(path)
-                        raw = "\n".join(p.extract_text() or "" for p in reader.pages)
-                        # Write to temp txt and ingest as text
-                        import tempfile
-                        with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False, encoding="utf-8") as f:
-                            f.write(raw)
-                            tmp = f.name
-                        n = ingest_document(tmp, metadata={"source_file": path.name})
-                        Path(tmp).unlink(missing_ok=True)
-                    except ImportError:
-                        logger.warning("PDF support requires pypdf; skipping %s", path)
-                        continue
-                else:
-                    n = ingest_document(str(path), metadata={"source_file": path.name})
-                total_chunks += n
-                files_ingested.append({"path": str(path), "chunks": n})
-            except Exception as e:
-                logger.exception("Failed to ingest %s: %s", path, e)
+                file_hash = doc_loader.file_hash(path.read_bytes(), meta, _embedding_model())
+            except OSError as e:
+                logger.error("Failed to read %s: %s", path, e)
+                continue
+            known = manifest["documents"].get(meta["source_file"])
+            if known and known.get("hash") == file_hash:
+                report({"path": str(path), "source_file": meta["source_file"], "skipped": True, "chunks": known.get("chunks", 0)})
+            else:
+                todo[str(path)] = (meta, file_hash)
+
+        def on_batch(payloads: list[tuple], vectors: list[list[float]]) -> None:
+            with store_lock:
+                _store_upsert(
+                    collection,
+                    ids=[p[1] for p in payloads],
+                    embeddings=vectors,
+                    documents=[p[2] for p in payloads],
+                    metadatas=[p[3] for p in payloads],
+                )
+                for p in payloads:
+                    pending[p[0]] -= 1
+                    if pending[p[0]] == 0 and p[0] in awaiting:
+                        _delete_chunks(collection, orphans.pop(p[0], []))
+                        manifest["documents"][p[0]] = awaiting.pop(p[0])
+
+        def on_error(payloads: list[tuple], exc: Exception) -> None:
+            with store_lock:
+                for p in payloads:
+                    failed.add(p[0])
+                    awaiting.pop(p[0], None)
+                    orphans.pop(p[0], None)  # Old chunks stay until the file is re-ingested in full
+
+        def embed_batch(texts: list[str]) -> list[list[float]]:
+            with embedding_backends.caller_retries():  # The pipeline retries with its own backoff
+                return _embed_texts(texts)
+
+        with EmbeddingPipeline(embed_fn=embed_batch, on_batch=on_batch, on_error=on_error) as pipeline:
+            for loaded in _loaded_files([Path(p) for p in todo], workers, INGEST_QUEUE_FILES):
+                meta, file_hash = todo[loaded["path"]]
+                if "error" in loaded:
+                    report_failed(loaded["path"], meta["source_file"], loaded["error"])
+                    continue
+                meta = _doc_meta(Path(loaded["path"]), {"source_file": meta["source_file"]}, loaded["metadata"])
+                source_file = meta["source_file"]
+                try:
+                    plan_start = time.perf_counter()
+                    if not loaded["chunks"]:
+                        logger.warning("No chunks produced for %s", loaded["path"])
+                    plan = _plan_chunks(collection, loaded["chunks"], meta)
+                    entry = {"hash": file_hash, "chunks": len(loaded["chunks"])}
+                    with store_lock:
+                        _apply_plan(collection, plan, delete_orphans=not plan["new"])
+                        if plan["new"]:
+                            pending[source_file] = len(plan["new"])
+                            awaiting[source_file] = entry
+                            orphans[source_file] = plan["orphans"]
+                        else:
+                            manifest["documents"][source_file] = entry
+                    plan_seconds = time.perf_counter() - plan_start
+                    for i in plan["new"]:
+                        pipeline.submit(plan["chunks"][i], (source_file, plan["ids"][i], plan["chunks"][i], plan["metadatas"][i]))
+                except Exception as e:
+                    logger.exception("Failed to ingest %s: %s", loaded["path"], e)
+                    report_failed(loaded["path"], source_file, f"{e.__class__.__name__}: {e}")
+                    continue
+                report({"path": loaded["path"], "source_file": source_file, "skipped": False, **_plan_stats(plan),
+                        "load_seconds": loaded["load_seconds"], "chunk_seconds": loaded["chunk_seconds"],
+                        "plan_seconds": round(plan_seconds, 4)})
+        embedding = pipeline.close()
+        changed = any(not f["skipped"] for f in files_ingested)
+        if changed:
+            _save_manifest(manifest)
+            _get_lexical(collection).save()
+
+    for f in files_ingested:
+        f["failed"] = f["source_file"] in failed
+    if changed:
+        _notify_ingested()
+    ok = [f for f in files_ingested if not f["failed"]]
+    return {
+        "files": len(ok),
+        "chunks": sum(f["chunks"] for f in ok),
+        "skipped": sum(1 for f in files_ingested if f["skipped"]),
+        "embedded": embedding["chunks"],
+        "failed": sorted(failed),
+        "seconds": round(time.perf_counter() - started, 3),
+        "embedding": embedding,
+        "details": files_ingested,
+    }
+
+
+def _feature_arrays(docs: list[str], metas: list[dict]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(domain_class, updated_epoch, token_count) per candidate; derived on the fly for chunks ingested without them."""
+    n = len(metas)
+    domain = np.zeros(n, dtype=np.int8)
+    updated = np.zeros(n, dtype=np.int64)
+    tokens = np.zeros(n, dtype=np.int64)
+    for i, (doc, meta) in enumerate(zip(docs, metas)):
+        f = meta if "token_count" in meta else _chunk_features(doc, meta)
+        domain[i], updated[i], tokens[i] = f["domain_class"], f["updated_epoch"], f["token_count"]
+    return domain, updated, tokens
+
+
+def _boosted_scores(sims: np.ndarray, domain: np.ndarray, updated: np.ndarray, tokens: np.ndarray,
+                    now: Optional[float] = None) -> np.ndarray:
+    """Boosts/penalties over the whole candidate set at once (sims are 0..1 similarities); clipped to 0..1."""
+    cutoff = (time.time() if now is None else now) - RECENT_SECONDS
+    scores = (sims
+              + BOOST_SUPPORT_APPLE * (domain == DOMAIN_CLASSES["support.apple.com"])
+              + BOOST_RECENT_6MO * ((updated > 0) & (updated >= cutoff))
+              - PENALTY_SHORT_CHUNK * (tokens < MIN_TOKENS_FOR_PENALTY))
+    return np.clip(scores, 0.0, 1.0)
+
+
+def _hit(doc: str, meta: dict, score: float) -> dict:
+    """Result dict; score is the already boosted/penalized relevance (see _boosted_scores)."""
+    source_file = (meta or {}).get("source_file", "unknown")
+    has_images = (meta or {}).get("has_images", False)
+    image_urls = (meta or {}).get("image_urls") or []
+    if isinstance(image_urls, str):
+        image_urls = [u.strip() for u in image_urls.splitlines() if u.strip()]
+    return {
+        "content": doc or "",
+        "source_file": source_file,
+        "relevance_score": round(float(score), 4),
+        "has_images": bool(has_images),
+        "image_urls": list(image_urls),
+        "metadata": meta or {},
+    }
+
+
+def _run_with_timeout(fn: Callable, arg: Any, timeout: float) -> Any:
+    """fn(arg) on the query-embedding pool; raises TimeoutError after `timeout` seconds (<= 0: no limit)."""
+    global _query_embed_pool
+    if _query_embed_pool is None:
+        _query_embed_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="aria-query-embed")
+    return _query_embed_pool.submit(fn, arg).result(timeout=timeout if timeout > 0 else None)
+
+
+def _embed_queries_with_timeout(queries: list[str], timeout: float) -> Optional[list[list[float]]]:
+    """
+    Query embeddings (one backend call for all queries), or None if the embedding API fails or takes longer
+    than `timeout` (<= 0: no limit).
+    """
+    try:
+        return _run_with_timeout(_embed_texts, list(queries), timeout)
+    except Exception as e:
+        logger.warning("Query embedding unavailable (%s); answering from BM25 only", e.__class__.__name__)
+        metrics.incr("retrieve_lexical_only")
+        return None
+
 
-    return {"files": len(files_ingested), "chunks": total_chunks, "details": files_ingested}
+def embed_query_with_timeout(query: str, timeout: Optional[float] = None) -> Optional[list[float]]:
+    """
+    embed_query, or None if the embedding API fails or takes longer than `timeout` (default
+    RETRIEVE_EMBED_TIMEOUT; <= 0: no limit).
+    """
+    try:
+        return _run_with_timeout(embed_query, query, RETRIEVE_EMBED_TIMEOUT if timeout is None else timeout)
+    except Exception as e:
+        logger.warning("Query embedding unavailable (%s)", e.__class__.__name__)
+        return None
 
 
 def retrieve(
@@ -201,80 +758,169 @@ def retrieve(
     filter_metadata: dict | None = None,
 ) -> list[dict]:
     """
-    Embed query, search ChromaDB, return ranked results with:
+    Hybrid search: BM25 and vector candidates fused by reciprocal rank fusion. Returns ranked results with:
     - content (str)
     - source_file (str)
-    - relevance_score (float) — base cosine + boosts/penalties
+    - relevance_score (float) — cosine similarity + boosts/penalties (BM25-derived when no vector similarity)
     - has_images (bool)
     - image_urls (list[str])
+    - vector_score / lexical_score / rrf_score (float) — the fusion inputs
     """
-    collection = _get_collection()
-    query_embedding = _embed_texts([query])[0]
-    n_results = min(top_k * 2, collection.count())  # Fetch extra for rerank/score adjustments
-    n_results = max(n_results, 1)
+    return retrieve_many([query], top_k=top_k, filter_metadata=filter_metadata)[0]
 
+
+def retrieve_many(
+    queries: list[str],
+    top_k: int = TOP_K_RAG,
+    filter_metadata: dict | None = None,
+) -> list[list[dict]]:
+    """
+    retrieve() for several queries at once (evaluation runs, query expansion): one embedding call, one
+    collection.query with all query embeddings, one collection.get for lexical-only candidates, and one
+    scoring pass over every candidate. Returns one result list per query, in order.
+    """
+    if not queries:
+        return []
+    collection, count = collection_stats.get()
+    if count == 0:
+        return [[] for _ in queries]  # Nothing ingested: skip the embedding call and both searches
+    lexical = _get_lexical(collection)
+    n_results = min(max(top_k * 2, RETRIEVE_CANDIDATES), count)  # Wide candidate pool for fusion and rerank
+
+    # Metadata pre-filter on chunk metadata keys (e.g. {"category": "battery"}); $and needs 2+ conditions
     where = None
     if filter_metadata:
-        where = {"$and": [{"metadata." + k: v} for k, v in filter_metadata.items()]}
-
-    result = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results,
-        where=where,
-        include=["documents", "metadatas", "distances"],
-    )
-    docs = result["documents"][0] if result["documents"] else []
-    metadatas = result["metadatas"][0] if result["metadatas"] else []
-    distances = result["distances"][0] if result["distances"] else []
+        conditions = [{k: v} for k, v in filter_metadata.items()]
+        where = conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    query_embeddings = _embed_queries_with_timeout(queries, RETRIEVE_EMBED_TIMEOUT)
+    lexical_hits = [lexical.search(q, n_results, where=filter_metadata) for q in queries]
 
     # Chroma cosine distance: 0 = identical, 2 = opposite. Convert to similarity: 1 - (d/2)
+    vector_sims: list[dict[str, float]] = [{} for _ in queries]
+    vector_ids: list[list[str]] = [[] for _ in queries]
+    docs: dict[str, tuple[str, dict]] = {}
+    if query_embeddings is not None:
+        result = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        for qi in range(len(queries)):
+            ids = result["ids"][qi] if result.get("ids") else []
+            vector_ids[qi] = ids
+            for cid, doc, meta, dist in zip(ids, result["documents"][qi], result["metadatas"][qi], result["distances"][qi]):
+                vector_sims[qi][cid] = 1.0 - (dist / 2.0) if dist is not None else 0.0
+                docs[cid] = (doc or "", meta or {})
+        # Lexical-only candidates still get a true vector similarity (stored embeddings, no API call)
+        missing = {cid for qi, hits in enumerate(lexical_hits) for cid, _ in hits if cid not in vector_sims[qi]}
+        got = collection.get(ids=sorted(missing), include=["embeddings"]) if missing else {"ids": []}
+        if len(got["ids"]):
+            stored = np.asarray(got["embeddings"], dtype=np.float32)
+            stored /= np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+            row = {cid: i for i, cid in enumerate(got["ids"])}
+            q = np.asarray(query_embeddings, dtype=np.float32)
+            q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+            cosine = q @ stored.T  # (queries, missing candidates)
+            for qi, hits in enumerate(lexical_hits):
+                for cid, _ in hits:
+                    if cid not in vector_sims[qi] and cid in row:
+                        vector_sims[qi][cid] = (1.0 + float(cosine[qi, row[cid]])) / 2.0
+
+    bm25 = [dict(hits) for hits in lexical_hits]
+    for scores in bm25:
+        for cid in scores:
+            if cid not in docs:
+                stored_doc = lexical.get(cid)
+                if stored_doc:
+                    docs[cid] = stored_doc
+
+    # Boosted relevance for every (query, candidate) in one pass of array ops (features precomputed at ingestion)
+    pairs = [(qi, cid) for qi in range(len(queries)) for cid in docs
+             if cid in vector_sims[qi] or cid in bm25[qi]]
+    texts = [docs[cid][0] for _, cid in pairs]
+    metas = [docs[cid][1] for _, cid in pairs]
+    vector = np.array([vector_sims[qi].get(cid, 0.0) for qi, cid in pairs], dtype=np.float64)
+    lexical_raw = np.array([bm25[qi].get(cid, 0.0) for qi, cid in pairs], dtype=np.float64)
+    base = np.maximum(vector, lexical_raw / (lexical_raw + LEXICAL_SCORE_PIVOT))
+    scores = _boosted_scores(base, *_feature_arrays(texts, metas)) if pairs else np.zeros(0)
+
+    hits: list[dict[str, dict]] = [{} for _ in queries]
+    for i, (qi, cid) in enumerate(pairs):
+        hit = _hit(texts[i], metas[i], scores[i])
+        hit["chunk_id"] = cid
+        hit["vector_score"] = round(vector_sims[qi][cid], 4) if cid in vector_sims[qi] else None
+        hit["lexical_score"] = round(bm25[qi].get(cid, 0.0), 4)
+        hits[qi][cid] = hit
+
+    # Reciprocal rank fusion over the boosted vector ranking and the BM25 ranking, per query
     out = []
-    for i, (doc, meta, dist) in enumerate(zip(docs, metadatas, distances)):
-        sim = 1.0 - (dist / 2.0) if dist is not None else 0.0
-        source_file = (meta or {}).get("source_file", "unknown")
-        domain = _source_domain(source_file)
-        if domain == "support.apple.com":
-            sim += BOOST_SUPPORT_APPLE
-        updated = _parse_updated_date(meta or {})
-        if _is_recent_6mo(updated):
-            sim += BOOST_RECENT_6MO
-        if _approx_tokens(doc or "") < MIN_TOKENS_FOR_PENALTY:
-            sim -= PENALTY_SHORT_CHUNK
-        sim = max(0.0, min(1.0, sim))
-        has_images = (meta or {}).get("has_images", False)
-        image_urls = (meta or {}).get("image_urls") or []
-        if isinstance(image_urls, str):
-            image_urls = [image_urls] if image_urls else []
-        out.append({
-            "content": doc or "",
-            "source_file": source_file,
-            "relevance_score": round(sim, 4),
-            "has_images": bool(has_images),
-            "image_urls": list(image_urls),
-            "metadata": meta or {},
-        })
-    out.sort(key=lambda x: x["relevance_score"], reverse=True)
-    return out[:top_k]
+    for qi in range(len(queries)):
+        rrf: dict[str, float] = defaultdict(float)
+        vector_ranked = sorted(vector_ids[qi], key=lambda c: hits[qi][c]["relevance_score"], reverse=True)
+        for rank, cid in enumerate(vector_ranked):
+            rrf[cid] += 1.0 / (RRF_K + rank + 1)
+        for rank, (cid, _) in enumerate(lexical_hits[qi]):
+            if cid in hits[qi]:
+                rrf[cid] += 1.0 / (RRF_K + rank + 1)
+        ranked = []
+        for cid in sorted(hits[qi], key=lambda c: (rrf[c], hits[qi][c]["relevance_score"]), reverse=True)[:top_k]:
+            hits[qi][cid]["rrf_score"] = round(rrf[cid], 6)
+            ranked.append(hits[qi][cid])
+        out.append(ranked)
+    return out
+
+
+def warm_up_reranker() -> None:
+    """Load the cross-encoder on the reranking worker and score one pair."""
+    reranker.get_service().warm_up()
+
+
+def calibrate_rerank_score(logit: float, calibration: tuple[float, float] = RERANK_CALIBRATION) -> float:
+    """Cross-encoder logit -> 0..1 relevance probability (Platt scaling: sigmoid(a * logit + b))."""
+    a, b = calibration
+    z = a * logit + b
+    return 1.0 / (1.0 + math.exp(-z)) if z >= 0 else math.exp(z) / (1.0 + math.exp(z))
 
 
 def rerank_results(results: list[dict], query: str) -> list[dict]:
-    """Cross-encoder reranking using cross-encoder/ms-marco-MiniLM-L-6-v2."""
-    if not results:
-        return results
+    """
+    Cross-encoder reranking using cross-encoder/ms-marco-MiniLM-L-6-v2, via the shared reranking service
+    (pairs from concurrent turns are scored in one batched forward pass). Adds rerank_logit and the calibrated
+    rerank_score and sorts by it; relevance_score (retrieval score) is left untouched.
+    """
+    return rerank_many([results], [query])[0]
+
+
+def rerank_many(results_per_query: list[list[dict]], queries: list[str]) -> list[list[dict]]:
+    """rerank_results for several queries (e.g. retrieve_many output) with a single scoring call."""
+    pairs = [(q, r["content"]) for results, q in zip(results_per_query, queries) for r in results]
+    if not pairs:
+        return results_per_query
     try:
-        from sentence_transformers import CrossEncoder
-        global _reranker
-        if _reranker is None:
-            _reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-        pairs = [(query, r["content"]) for r in results]
-        scores = _reranker.predict(pairs)
-        for i, r in enumerate(results):
-            r["relevance_score"] = float(scores[i])
-        results.sort(key=lambda x: x["relevance_score"], reverse=True)
-        return results
+        scores = reranker.get_service().score(pairs)
     except Exception as e:
         logger.warning("Reranking failed, keeping original order: %s", e)
-        return results
+        return results_per_query
+    offset = 0
+    for results in results_per_query:
+        for r, score in zip(results, scores[offset:offset + len(results)]):
+            r["rerank_logit"] = round(float(score), 4)
+            r["rerank_score"] = round(calibrate_rerank_score(float(score)), 4)
+        offset += len(results)
+        results.sort(key=lambda x: x["rerank_score"], reverse=True)
+    return results_per_query
+
+
+def gating_scores(results: list[dict]) -> tuple[list[float], float]:
+    """
+    Scores (best first) and the threshold to compare them with for the web-search decision: calibrated
+    rerank_score / RERANK_SCORE_THRESHOLD when reranking ran, else relevance_score / RAG_SCORE_THRESHOLD.
+    """
+    if results and all("rerank_score" in r for r in results):
+        return sorted((r["rerank_score"] for r in results), reverse=True), RERANK_SCORE_THRESHOLD
+    return sorted((r["relevance_score"] for r in results), reverse=True), RAG_SCORE_THRESHOLD
 
 
 if __name__ == "__main__":
@@ -0,0 +1,236 @@
+"""
+Cross-encoder reranking service.
+
+Every chat turn used to run its own CrossEncoder.predict() in its request thread, so N concurrent turns
+paid for N forward passes competing for the same cores. RerankService owns the model on one dedicated
+worker thread: score() enqueues a request's (query, chunk) pairs and blocks; the worker takes the first
+waiting request, gathers whatever else arrives within RERANK_MAX_WAIT_MS (up to RERANK_MAX_BATCH_PAIRS
+pairs) and scores them all in a single forward pass. Under load the per-request cost drops; an idle
+request waits at most the window.
+
+Scorers: sentence-transformers CrossEncoder (RERANK_BACKEND=sentence_transformers), or the same model
+exported to ONNX and run with onnxruntime on CPU (RERANK_BACKEND=onnx; int8-quantized file by default).
+Both return raw logits, one per pair.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    RERANK_BACKEND,
+    RERANK_MAX_BATCH_PAIRS,
+    RERANK_MAX_WAIT_MS,
+    RERANK_MODEL,
+    RERANK_ONNX_FILE,
+    RERANK_ONNX_MODEL_DIR,
+    RERANK_THREADS,
+)
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+Pair = tuple[str, str]
+# ms-marco cross-encoders are trained with 512-token inputs
+MAX_PAIR_TOKENS = 512
+
+
+class SentenceTransformersScorer:
+    def __init__(self, model: str = RERANK_MODEL):
+        from sentence_transformers import CrossEncoder
+        self._model = CrossEncoder(model)
+
+    def predict(self, pairs: list[Pair]) -> list[float]:
+        scores = self._model.predict(pairs, batch_size=max(len(pairs), 1), show_progress_bar=False)
+        return [float(s) for s in np.asarray(scores).reshape(len(pairs), -1)[:, 0]]
+
+
+class OnnxCrossEncoderScorer:
+    """Cross-encoder logits from an ONNX export (fp32 or quantized) with onnxruntime on CPU."""
+
+    def __init__(self, model_dir: str = RERANK_ONNX_MODEL_DIR, model_file: str = RERANK_ONNX_FILE,
+                 threads: int = RERANK_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        if model_dir:
+            tokenizer_path = Path(model_dir) / "tokenizer.json"
+            model_path = Path(model_dir) / model_file
+        else:
+            from huggingface_hub import hf_hub_download
+            tokenizer_path = hf_hub_download(RERANK_MODEL, "tokenizer.json")
+            model_path = hf_hub_download(RERANK_MODEL, f"onnx/{model_file}")
+        self._tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self._tokenizer.enable_truncation(max_length=MAX_PAIR_TOKENS)
+        self._tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")  # Pad to the longest pair in the batch
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        logger.info("ONNX reranker loaded from %s", model_path)
+
+    def predict(self, pairs: list[Pair]) -> list[float]:
+        encoded = self._tokenizer.encode_batch(pairs)
+        feed = {
+            "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encoded], dtype=np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        logits = self._session.run(None, feed)[0]
+        return [float(s) for s in np.asarray(logits).reshape(len(pairs), -1)[:, 0]]
+
+
+_SCORERS: dict[str, Callable[[], Any]] = {"sentence_transformers": SentenceTransformersScorer, "onnx": OnnxCrossEncoderScorer}
+
+
+_STOP = object()  # Queue sentinel: worker exits
+
+
+class _Request:
+    __slots__ = ("pairs", "future", "enqueued")
+
+    def __init__(self, pairs: list[Pair]):
+        self.pairs = pairs
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class RerankService:
+    """
+    score(pairs) from any thread; one worker thread loads the scorer (on first use) and micro-batches.
+    A scorer that fails to load fails every request with that error, and is retried on the next batch.
+    """
+
+    def __init__(
+        self,
+        scorer_factory: Optional[Callable[[], Any]] = None,
+        max_batch_pairs: int = RERANK_MAX_BATCH_PAIRS,
+        max_wait_ms: float = RERANK_MAX_WAIT_MS,
+    ):
+        self._scorer_factory = scorer_factory or _SCORERS[RERANK_BACKEND]
+        self._scorer = None
+        self.max_batch_pairs = max_batch_pairs
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._carry: Any = None  # Request (or _STOP) that did not fit the previous batch
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._pairs = 0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="aria-rerank", daemon=True)
+                    self._thread.start()
+
+    def score(self, pairs: list[Pair], timeout: Optional[float] = None) -> list[float]:
+        """Raw cross-encoder scores for `pairs` (same order). Blocks until its batch has run."""
+        if not pairs:
+            return []
+        self._ensure_worker()
+        request = _Request(list(pairs))
+        self._queue.put(request)
+        return request.future.result(timeout)
+
+    def warm_up(self) -> None:
+        """Load the model on the worker thread and run one pair through it."""
+        self.score([("iphone battery drains fast", "Open Settings > Battery.")])
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _next_batch(self) -> Optional[list[_Request]]:
+        """First waiting request plus whatever joins within the window; None when closed."""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        if first is _STOP:
+            return None
+        batch, n = [first], len(first.pairs)
+        deadline = time.perf_counter() + self.max_wait
+        while n < self.max_batch_pairs:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if nxt is _STOP or n + len(nxt.pairs) > self.max_batch_pairs:
+                self._carry = nxt  # Starts the next batch (or stops the worker after this one)
+                break
+            batch.append(nxt)
+            n += len(nxt.pairs)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            pairs = [p for r in batch for p in r.pairs]
+            start = time.perf_counter()
+            try:
+                if self._scorer is None:
+                    self._scorer = self._scorer_factory()
+                scores = self._scorer.predict(pairs)
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+            metrics.observe("rerank_batch_seconds", elapsed)
+            offset = 0
+            for r in batch:
+                metrics.observe("rerank_queue_seconds", start - r.enqueued)
+                r.future.set_result(scores[offset:offset + len(r.pairs)])
+                offset += len(r.pairs)
+            with self._stats_lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._pairs += len(pairs)
+
+    def stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "pairs": self._pairs,
+                "requests_per_batch": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "loaded": self._scorer is not None,
+            }
+
+
+_service: Optional[RerankService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> RerankService:
+    """Process-wide reranking service for RERANK_BACKEND."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RerankService()
+                metrics.register_gauge("reranker", _service.stats)
+    return _service
+
+
+def shutdown() -> None:
+    """Stop the worker thread (FastAPI lifespan shutdown)."""
+    if _service is not None:
+        _service.close()
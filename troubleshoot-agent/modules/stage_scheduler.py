@@ -0,0 +1,173 @@
+"""
+Dependency-aware stage scheduler for one chat turn.
+
+Each stage is an async callable that receives the results of its dependencies. Stages start as soon
+as their dependencies finish, so independent work (image analysis ∥ retrieval, speculative web search
+∥ rerank) overlaps. Every stage has an optional timeout and a fallback value used on timeout, error,
+or when its `when` predicate says to skip it. Stages can be cancelled (e.g. a speculative web search
+that turned out to be unnecessary). `report()` returns per-stage timings and the critical path.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+StageFn = Callable[[dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: StageFn
+    deps: tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Any = None  # Value (or callable of dep results) used on timeout/error/skip
+    when: Optional[Callable[[dict[str, Any]], bool]] = None  # Evaluated after deps; False → skipped
+
+
+class StageScheduler:
+    """Run a small DAG of async stages with timeouts, cancellation, and critical-path reporting."""
+
+    def __init__(self):
+        self._stages: dict[str, Stage] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._records: dict[str, dict[str, Any]] = {}
+        self._decided: dict[str, asyncio.Event] = {}  # Set once a stage has started or been skipped
+        self._t0: Optional[float] = None
+
+    def add(
+        self,
+        name: str,
+        fn: StageFn,
+        deps: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        fallback: Any = None,
+        when: Optional[Callable[[dict[str, Any]], bool]] = None,
+    ) -> None:
+        """Register a stage. Dependencies must already be registered; if the scheduler is running it starts immediately."""
+        deps = tuple(deps)
+        for d in deps:
+            if d not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {d!r}")
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage {name!r}")
+        self._stages[name] = Stage(name=name, fn=fn, deps=deps, timeout=timeout, fallback=fallback, when=when)
+        self._records[name] = {"status": "pending", "deps": list(deps)}
+        self._decided[name] = asyncio.Event()
+        if self._t0 is not None:
+            self._launch(name)
+
+    def has(self, name: str) -> bool:
+        return name in self._stages
+
+    def start(self) -> None:
+        """Launch every registered stage; each waits on its own dependencies."""
+        if self._t0 is None:
+            self._t0 = time.perf_counter()
+        for name in self._stages:
+            if name not in self._tasks:
+                self._launch(name)
+
+    async def result(self, name: str) -> Any:
+        """Await a stage's result (its fallback if it timed out, failed, or was skipped)."""
+        if name not in self._tasks:
+            self.start()
+        return await self._tasks[name]
+
+    async def wait_started(self, name: str) -> bool:
+        """Wait until the stage's dependencies are done; True if it actually ran (not skipped or cancelled)."""
+        if name not in self._tasks:
+            self.start()
+        await self._decided[name].wait()
+        return self._records[name]["status"] not in ("skipped", "cancelled")
+
+    def done(self, name: str) -> bool:
+        task = self._tasks.get(name)
+        return bool(task and task.done())
+
+    def cancel(self, name: str) -> None:
+        """Cancel a stage that is no longer needed; its dependents are cancelled too."""
+        task = self._tasks.get(name)
+        if task and not task.done():
+            task.cancel()
+            self._records[name]["status"] = "cancelled"
+            self._records[name].setdefault("end", self._now())
+
+    def cancel_all(self) -> None:
+        for name in self._tasks:
+            self.cancel(name)
+
+    def _now(self) -> float:
+        return round(time.perf_counter() - (self._t0 or time.perf_counter()), 4)
+
+    def _launch(self, name: str) -> None:
+        self._tasks[name] = asyncio.create_task(self._run(self._stages[name]), name=f"stage:{name}")
+
+    def _fallback(self, stage: Stage, dep_results: dict[str, Any]) -> Any:
+        return stage.fallback(dep_results) if callable(stage.fallback) else stage.fallback
+
+    async def _run(self, stage: Stage) -> Any:
+        record = self._records[stage.name]
+        try:
+            dep_results = {d: await self._tasks[d] for d in stage.deps}
+        except asyncio.CancelledError:
+            record["status"] = "cancelled"
+            self._decided[stage.name].set()
+            raise
+        if stage.when is not None and not stage.when(dep_results):
+            record["status"] = "skipped"
+            self._decided[stage.name].set()
+            return self._fallback(stage, dep_results)
+
+        record["start"] = self._now()
+        record["status"] = "running"
+        self._decided[stage.name].set()
+        started = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(stage.fn(dep_results), timeout=stage.timeout)
+            record["status"] = "ok"
+        except asyncio.TimeoutError:
+            logger.warning("Stage %s timed out after %.1fs; using fallback", stage.name, stage.timeout)
+            record["status"] = "timeout"
+            value = self._fallback(stage, dep_results)
+        except asyncio.CancelledError:
+            record["status"] = "cancelled"
+            record["end"] = self._now()
+            raise
+        except Exception as e:
+            logger.warning("Stage %s failed: %s; using fallback", stage.name, e)
+            record["status"] = "error"
+            record["error"] = str(e)
+            value = self._fallback(stage, dep_results)
+        record["end"] = self._now()
+        metrics.observe(f"stage_{stage.name}_seconds", time.perf_counter() - started)
+        return value
+
+    def critical_path(self, used: Optional[Iterable[str]] = None) -> list[str]:
+        """
+        Chain of stages that determined the turn's latency: start from the latest-finishing stage among
+        `used` (default: all finished stages) and walk back through the latest-finishing dependency.
+        """
+        finished = {n: r for n, r in self._records.items() if "end" in r and r["status"] != "cancelled"}
+        candidates = [n for n in (used if used is not None else finished) if n in finished]
+        if not candidates:
+            return []
+        path = [max(candidates, key=lambda n: finished[n]["end"])]
+        while True:
+            deps = [d for d in self._stages[path[-1]].deps if d in finished]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda d: finished[d]["end"]))
+        return list(reversed(path))
+
+    def report(self, used: Optional[Iterable[str]] = None) -> dict[str, Any]:
+        """Per-stage status/start/end (seconds since start()) plus the critical path."""
+        return {
+            "stages": {n: dict(r) for n, r in self._records.items()},
+            "critical_path": self.critical_path(used),
+        }
@@ -0,0 +1,581 @@
+"""
+Pluggable vector stores for rag_engine (selected by VECTOR_DB).
+
+Both speak the subset of the Chroma collection API that rag_engine uses: count / get / upsert / update /
+delete / query, with Chroma's argument names and result shapes (query distances are cosine distances,
+1 - cos), so the engine does not care which one it holds.
+
+- "chromadb": a Chroma collection (SQLite + HNSW), the default.
+- "flat":     FlatStore, in-process: unit-normalized float16 vectors in a memory-mapped file, searched
+              with exact dot products (optionally IVF: k-means lists, only the FLAT_IVF_PROBE nearest
+              lists are scanned). Documents and metadata live in SQLite next to it; metadata is also
+              held in memory for `where` filters. No graph to build or hold in memory; an exact scan of
+              tens of thousands of chunks takes milliseconds. FLAT_QUANTIZATION="int8" | "binary" scans
+              compact codes instead (4x / 32x smaller than float32, optionally of a Matryoshka prefix of the
+              dims) and rescores the shortlist exactly from the float16 file.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import (
+    FLAT_IVF_LISTS,
+    FLAT_IVF_PROBE,
+    FLAT_QUANT_DIMS,
+    FLAT_QUANTIZATION,
+    FLAT_RESCORE_FACTOR,
+    FLAT_SCAN_FLOAT32,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows converted to float32 and multiplied per step of a scan (bounds the temporary buffer)
+SCAN_BLOCK_ROWS = 16384
+# IVF is only trained once there are this many rows per list; smaller stores are scanned exactly
+IVF_MIN_ROWS_PER_LIST = 16
+IVF_ITERATIONS = 10
+INT8_BUFFER_BYTES = 1 << 20  # float32 staging block for int8 scans (stays in L2)
+# Shortlist size per requested result for quantized scans (FLAT_RESCORE_FACTOR = 0); binary codes are coarser
+RESCORE_FACTORS = {"int8": 4, "binary": 10}
+
+
+class VectorStore:
+    """Interface (Chroma collection semantics). Implementations must be thread-safe."""
+
+    name = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get(self, ids: Optional[list[str]] = None, where: Optional[dict] = None,
+            include: Iterable[str] = ("metadatas", "documents")) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: Optional[list[str]] = None,
+               metadatas: Optional[list[dict]] = None) -> None:
+        raise NotImplementedError
+
+    def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[list[str]] = None, where: Optional[dict] = None) -> None:
+        raise NotImplementedError
+
+    def query(self, query_embeddings: list[list[float]], n_results: int = 10, where: Optional[dict] = None,
+              include: Iterable[str] = ("metadatas", "documents", "distances")) -> dict[str, Any]:
+        raise NotImplementedError
+
+
+class ChromaStore(VectorStore):
+    """A Chroma collection (cosine space); calls are passed straight through."""
+
+    def __init__(self, client, name: str):
+        self._collection = client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+        self.name = name
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        return self._collection.get(ids=ids, where=where, include=list(include))
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, metadatas):
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self._collection.delete(ids=ids, where=where)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        return self._collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where,
+                                      include=list(include))
+
+
+def matches(meta: dict[str, Any], where: Optional[dict[str, Any]]) -> bool:
+    """Chroma `where` filter on one metadata dict: equality, $eq/$ne/$in/$nin, $and/$or."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            for op, value in cond.items():
+                actual = meta.get(key)
+                ok = {"$eq": lambda: actual == value, "$ne": lambda: actual != value,
+                      "$in": lambda: actual in value, "$nin": lambda: actual not in value}.get(op)
+                if ok is None:
+                    raise ValueError(f"Unsupported where operator {op!r}")
+                if not ok():
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+def _unit_rows(embeddings) -> np.ndarray:
+    v = np.asarray(embeddings, dtype=np.float32)
+    if v.ndim == 1:
+        v = v[None, :]
+    return v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+
+
+def _best(scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+    """Top k of `scores` (best first) as (row numbers, scores); `rows` maps score positions to rows."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return (best if rows is None else rows[best]), scores[best]
+
+
+def _blocks(matrix: np.ndarray, rows: Optional[np.ndarray], n: int,
+            size: int = SCAN_BLOCK_ROWS) -> Iterable[tuple[int, np.ndarray]]:
+    """(offset, block) over the first n rows of `matrix`, or over `rows` of it, `size` rows at a time."""
+    total = n if rows is None else len(rows)
+    for start in range(0, total, size):
+        stop = min(start + size, total)
+        yield start, (matrix[start:stop] if rows is None else matrix[rows[start:stop]])
+
+
+def _truncated(block: np.ndarray, dims: int) -> np.ndarray:
+    """Matryoshka-style prefix of unit vectors: first `dims` components, renormalized (float32)."""
+    out = np.asarray(block[:, :dims], dtype=np.float32)
+    return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12) if dims < block.shape[1] else out
+
+
+class ScanCodes:
+    """
+    What a scan reads for the first `rows` rows: score(q, candidates) returns a similarity per candidate
+    (None = every row). Exact codes give the final dot products; quantized ones only rank a shortlist.
+    """
+
+    exact = True
+    rows = 0
+    nbytes = 0
+
+    def score(self, q: np.ndarray, candidates: Optional[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class Float32Codes(ScanCodes):
+    """
+    The float16 vectors themselves, or (copy) a float32 copy decoded once. NumPy has no fast float16 ->
+    float32 path on most CPUs, so scanning the map directly spends most of its time converting; the copy
+    trades 2x the file size in RAM for that.
+    """
+
+    def __init__(self, vectors: np.ndarray, n: int, copy: bool = True):
+        self.rows = n
+        if copy:
+            self.matrix = np.empty((n, vectors.shape[1]), dtype=np.float32)
+            for start, block in _blocks(vectors, None, n):
+                self.matrix[start:start + len(block)] = block
+            self.nbytes = self.matrix.nbytes
+        else:
+            self.matrix = vectors
+
+    def score(self, q, candidates):
+        out = np.empty(self.rows if candidates is None else len(candidates), dtype=np.float32)
+        for start, block in _blocks(self.matrix, candidates, self.rows):
+            out[start:start + len(block)] = block.astype(np.float32, copy=False) @ q
+        return out
+
+
+class Int8Codes(ScanCodes):
+    """Scalar quantization: per-dimension scale (max |x| / 127) over the first `dims` components; 1 byte each."""
+
+    exact = False
+
+    def __init__(self, vectors: np.ndarray, n: int, dims: int):
+        self.rows, self.dims = n, dims
+        absmax = np.zeros(dims, dtype=np.float32)
+        for _, block in _blocks(vectors, None, n):
+            absmax = np.maximum(absmax, np.abs(_truncated(block, dims)).max(axis=0))
+        self.scale = np.maximum(absmax, 1e-12) / 127.0
+        self.codes = np.empty((n, dims), dtype=np.int8)
+        for start, block in _blocks(vectors, None, n):
+            self.codes[start:start + len(block)] = np.clip(np.rint(_truncated(block, dims) / self.scale), -127, 127)
+        self.nbytes = self.codes.nbytes
+        # NumPy has no int8 dot product: blocks are widened into a cache-sized float32 buffer per thread,
+        # which keeps the scan about as fast as the float32 copy it replaces (at a quarter of the memory).
+        self._block_rows = max(64, INT8_BUFFER_BYTES // (4 * dims))
+        self._buffers = threading.local()
+
+    def score(self, q, candidates):
+        w = q[:self.dims] * self.scale  # codes @ (scale * q) == dequantized vectors @ q
+        buffer = getattr(self._buffers, "block", None)
+        if buffer is None:
+            buffer = self._buffers.block = np.empty((self._block_rows, self.dims), dtype=np.float32)
+        out = np.empty(self.rows if candidates is None else len(candidates), dtype=np.float32)
+        for start, block in _blocks(self.codes, candidates, self.rows, self._block_rows):
+            widened = buffer[:len(block)]
+            np.copyto(widened, block)
+            np.dot(widened, w, out=out[start:start + len(block)])
+        return out
+
+
+_popcount = getattr(np, "bitwise_count", None)  # NumPy >= 2.0
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class BinaryCodes(ScanCodes):
+    """Sign bits of the first `dims` components, packed 64 to a word; similarity = -Hamming distance."""
+
+    exact = False
+
+    def __init__(self, vectors: np.ndarray, n: int, dims: int):
+        self.rows, self.dims = n, dims
+        self.words = (dims + 63) // 64
+        self.codes = np.zeros((n, self.words * 8), dtype=np.uint8)
+        for start, block in _blocks(vectors, None, n):
+            bits = np.packbits(np.asarray(block[:, :dims]) > 0, axis=1)
+            self.codes[start:start + len(block), :bits.shape[1]] = bits
+        self.codes = self.codes.view(np.uint64)
+        self.nbytes = self.codes.nbytes
+
+    def score(self, q, candidates):
+        qbits = np.zeros(self.words * 8, dtype=np.uint8)
+        packed = np.packbits(q[:self.dims] > 0)
+        qbits[:len(packed)] = packed
+        qwords = qbits.view(np.uint64)
+        out = np.empty(self.rows if candidates is None else len(candidates), dtype=np.float32)
+        for start, block in _blocks(self.codes, candidates, self.rows):
+            diff = block ^ qwords
+            if _popcount is not None:
+                distance = _popcount(diff).sum(axis=1)
+            else:
+                distance = _POPCOUNT_TABLE[diff.view(np.uint8)].sum(axis=1)
+            out[start:start + len(block)] = -distance.astype(np.float32)
+        return out
+
+
+QUANTIZERS = {"int8": Int8Codes, "binary": BinaryCodes}
+
+
+class FlatStore(VectorStore):
+    """
+    Vectors in `path`/vectors.f16 (row-major float16, capacity doubled as it fills), chunk id / row / document /
+    metadata in `path`/chunks.sqlite3. Deletes move the last row into the hole, so rows stay dense.
+    A generation counter in SQLite lets other processes' writes (knowledge_base/ingest.py) be picked up:
+    count() reloads when it changed.
+    """
+
+    def __init__(self, path: str, ivf_lists: int = FLAT_IVF_LISTS, ivf_probe: int = FLAT_IVF_PROBE,
+                 scan_float32: bool = FLAT_SCAN_FLOAT32, quantization: str = FLAT_QUANTIZATION,
+                 quant_dims: int = FLAT_QUANT_DIMS, rescore_factor: int = FLAT_RESCORE_FACTOR):
+        if quantization != "none" and quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown FLAT_QUANTIZATION {quantization!r}; expected none, {', '.join(QUANTIZERS)}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.name = self.path.name
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = ivf_probe
+        self.scan_float32 = scan_float32
+        self.quantization = quantization
+        self.quant_dims = quant_dims
+        self.rescore_factor = rescore_factor
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path / "chunks.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, row INTEGER NOT NULL, document TEXT, metadata TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._load()
+
+    # ——— Loading and persistence ———
+
+    def _meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _load(self) -> None:
+        with self._lock:
+            self._generation = self._meta("generation", "0")
+            dim = self._meta("dim")
+            self.dim = int(dim) if dim else 0
+            rows = self._db.execute("SELECT id, row, metadata FROM chunks ORDER BY row").fetchall()
+            self._ids = [r[0] for r in rows]
+            self._rows = {cid: i for i, cid in enumerate(self._ids)}
+            self._metas = [json.loads(r[2]) if r[2] else {} for r in rows]
+            if any(r[1] != i for i, r in enumerate(rows)):
+                raise RuntimeError(f"Flat store {self.path} has gaps in its row numbers")
+            self._vectors = None
+            self._capacity = 0
+            if self.dim:
+                path = self.path / "vectors.f16"
+                self._map(max(len(self._ids), path.stat().st_size // (2 * self.dim) if path.exists() else 0))
+            self._mask_cache: dict[str, np.ndarray] = {}
+            self._codes: Optional[ScanCodes] = None
+            self._ivf = None
+
+    def _map(self, capacity: int) -> None:
+        """(Re)map the vector file with room for `capacity` rows; growing extends the file in place."""
+        path = self.path / "vectors.f16"
+        size = capacity * self.dim * 2
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(path, dtype=np.float16, mode="r+", shape=(capacity, self.dim)) if capacity else None
+        self._capacity = capacity
+
+    def _commit(self) -> None:
+        self._generation = str(int(self._generation) + 1)
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (self._generation,))
+        self._db.commit()
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._mask_cache = {}
+        self._codes = None
+
+    def refresh(self) -> bool:
+        """Reload if another process wrote to the store; True if it did."""
+        with self._lock:
+            if self._meta("generation", "0") == self._generation:
+                return False
+            self._load()
+            return True
+
+    # ——— Collection API ———
+
+    def count(self) -> int:
+        self.refresh()
+        return len(self._ids)
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[cid] for cid in ids if cid in self._rows]
+            else:
+                rows = list(range(len(self._ids)))
+            if where:
+                rows = [r for r in rows if matches(self._metas[r], where)]
+            out: dict[str, Any] = {"ids": [self._ids[r] for r in rows]}
+            if "metadatas" in include:
+                out["metadatas"] = [dict(self._metas[r]) for r in rows]
+            if "embeddings" in include:
+                out["embeddings"] = (np.asarray(self._vectors[rows], dtype=np.float32) if rows
+                                     else np.zeros((0, self.dim), dtype=np.float32))
+            if "documents" in include:
+                out["documents"] = self._documents(out["ids"])
+        return out
+
+    def _documents(self, ids: list[str]) -> list[str]:
+        docs: dict[str, str] = {}
+        for start in range(0, len(ids), 500):  # SQLite bound-parameter limit
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                docs.update(self._db.execute(f"SELECT id, document FROM chunks WHERE id IN ({placeholders})", batch).fetchall())
+        return [docs.get(cid) or "" for cid in ids]
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        if not ids:
+            return
+        vectors = _unit_rows(embeddings)
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dim})")
+            rows = []
+            for cid, meta in zip(ids, metadatas):
+                row = self._rows.get(cid)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(cid)
+                    self._metas.append({})
+                    self._rows[cid] = row
+                self._metas[row] = dict(meta or {})
+                rows.append(row)
+            if len(self._ids) > self._capacity:
+                self._map(max(1024, 2 * self._capacity, len(self._ids)))
+            self._vectors[rows] = vectors.astype(np.float16)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                [(cid, row, doc or "", json.dumps(meta or {})) for cid, row, doc, meta in zip(ids, rows, documents, metadatas)],
+            )
+            self._commit()
+            if self._ivf is not None:
+                self._ivf_assign(rows)
+
+    def update(self, ids, metadatas):
+        with self._lock:
+            pairs = [(self._rows[cid], meta) for cid, meta in zip(ids, metadatas) if cid in self._rows]
+            for row, meta in pairs:
+                self._metas[row] = {**self._metas[row], **(meta or {})}
+            self._db.executemany("UPDATE chunks SET metadata = ? WHERE id = ?",
+                                 [(json.dumps(self._metas[row]), self._ids[row]) for row, _ in pairs])
+            self._commit()
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            doomed = self.get(ids=ids, where=where, include=())["ids"] if (ids is not None or where) else []
+            for row in sorted((self._rows[cid] for cid in doomed), reverse=True):
+                last = len(self._ids) - 1
+                cid = self._ids[row]
+                self._db.execute("DELETE FROM chunks WHERE id = ?", (cid,))
+                del self._rows[cid]
+                if row != last:  # Move the last row into the hole
+                    moved = self._ids[last]
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row], self._metas[row] = moved, self._metas[last]
+                    self._rows[moved] = row
+                    self._db.execute("UPDATE chunks SET row = ? WHERE id = ?", (row, moved))
+                    if self._ivf is not None:
+                        self._ivf["assign"][row] = self._ivf["assign"][last]
+                self._ids.pop()
+                self._metas.pop()
+            if doomed:
+                self._commit()
+                if self._ivf is not None:
+                    self._ivf["lists"] = None
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        q = _unit_rows(query_embeddings)
+        with self._lock:  # Snapshot; the scan itself runs unlocked (NumPy releases the GIL)
+            n = len(self._ids)
+            vectors = self._vectors
+            codes = self._scan_codes(n)
+            ids, metas = list(self._ids), list(self._metas)
+            allowed = self._mask(where, n) if where else None
+            ivf = self._ivf_index(n) if allowed is None else None
+        out: dict[str, Any] = {"ids": [], "distances": [], "metadatas": []}
+        for qi in range(len(q)):
+            if not n or (allowed is not None and not allowed.any()):
+                rows, sims = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            else:
+                candidates = np.flatnonzero(allowed) if allowed is not None else self._ivf_candidates(ivf, q[qi], n_results)
+                rows, sims = self._top(codes, vectors, q[qi], candidates, n_results)
+            out["ids"].append([ids[r] for r in rows])
+            out["distances"].append([float(1.0 - s) for s in sims])
+            out["metadatas"].append([dict(metas[r]) for r in rows])
+        if "documents" in include:
+            out["documents"] = [self._documents(row_ids) for row_ids in out["ids"]]
+        for key in ("distances", "metadatas"):
+            if key not in include:
+                del out[key]
+        return out
+
+    # ——— Scanning ———
+
+    def _scan_codes(self, n: int) -> Optional["ScanCodes"]:
+        """Searchable form of the first n rows (see ScanCodes), rebuilt after each write."""
+        if self._vectors is None:
+            return None
+        if self._codes is None or self._codes.rows != n:
+            if self.quantization == "none":
+                self._codes = Float32Codes(self._vectors, n, copy=self.scan_float32)
+            else:
+                self._codes = QUANTIZERS[self.quantization](self._vectors, n, self.quant_dims or self.dim)
+        return self._codes
+
+    def _mask(self, where: dict, n: int) -> np.ndarray:
+        """Rows passing `where` (cached per filter until the next write)."""
+        key = json.dumps(where, sort_keys=True)
+        mask = self._mask_cache.get(key)
+        if mask is None or len(mask) != n:
+            mask = np.fromiter((matches(m, where) for m in self._metas[:n]), dtype=bool, count=n)
+            self._mask_cache[key] = mask
+        return mask
+
+    def _top(self, codes: "ScanCodes", vectors: np.ndarray, q: np.ndarray, candidates: Optional[np.ndarray],
+             k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Best k rows among `candidates` (None = all rows), best first, with exact similarities. Quantized codes
+        only pick a shortlist of k * rescore_factor rows, which is rescored from the float16 vectors.
+        """
+        shortlist = k if codes.exact else k * (self.rescore_factor or RESCORE_FACTORS[self.quantization])
+        rows, sims = _best(codes.score(q, candidates), shortlist, candidates)
+        if not codes.exact and len(rows):
+            rows = np.sort(rows)  # Sequential reads from the memory map
+            rows, sims = _best(np.asarray(vectors[rows], dtype=np.float32) @ q, k, rows)
+        return rows, sims
+
+    def _ivf_index(self, n: int) -> Optional[tuple[np.ndarray, list[np.ndarray]]]:
+        """(centroids, row lists), (re)trained when the store reaches the size for IVF or doubles since training."""
+        if not self.ivf_lists or n < self.ivf_lists * IVF_MIN_ROWS_PER_LIST:
+            return None
+        if self._ivf is None or n > 2 * self._ivf["trained_rows"]:
+            self._ivf_train(n)
+        if self._ivf["lists"] is None:
+            order = np.argsort(self._ivf["assign"][:n], kind="stable")
+            bounds = np.searchsorted(self._ivf["assign"][:n][order], np.arange(self.ivf_lists + 1))
+            self._ivf["lists"] = [order[bounds[i]:bounds[i + 1]] for i in range(self.ivf_lists)]
+        return self._ivf["centroids"], self._ivf["lists"]
+
+    def _ivf_train(self, n: int) -> None:
+        """Spherical k-means on a sample of rows, then assign every row to its nearest centroid."""
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, self.ivf_lists * 256), replace=False))
+        data = np.asarray(self._vectors[sample], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=self.ivf_lists, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            nearest = np.argmax(data @ centroids.T, axis=1)
+            for c in range(self.ivf_lists):
+                members = data[nearest == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _unit_rows(centroids)
+        self._ivf = {"centroids": centroids, "assign": np.zeros(max(n, self._capacity), dtype=np.int32),
+                     "lists": None, "trained_rows": n}
+        self._ivf_assign(range(n))
+        logger.info("Flat store %s: trained %d IVF lists on %d rows", self.name, self.ivf_lists, n)
+
+    def _ivf_assign(self, rows: Iterable[int]) -> None:
+        rows = np.fromiter(rows, dtype=np.int64)
+        if len(self._ivf["assign"]) < self._capacity:
+            self._ivf["assign"] = np.concatenate([self._ivf["assign"], np.zeros(self._capacity - len(self._ivf["assign"]), dtype=np.int32)])
+        for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+            block = rows[start:start + SCAN_BLOCK_ROWS]
+            self._ivf["assign"][block] = np.argmax(np.asarray(self._vectors[block], dtype=np.float32) @ self._ivf["centroids"].T, axis=1)
+        self._ivf["lists"] = None
+
+    def _ivf_candidates(self, ivf: Optional[tuple], q: np.ndarray, k: int) -> Optional[np.ndarray]:
+        """Rows of the ivf_probe lists nearest to q (None = exact scan); more lists if those hold fewer than k rows."""
+        if ivf is None:
+            return None
+        centroids, lists = ivf
+        order = np.argsort(-(centroids @ q))
+        probe = self.ivf_probe
+        while probe < len(order) and sum(len(lists[c]) for c in order[:probe]) < k:
+            probe += 1
+        return np.sort(np.concatenate([lists[c] for c in order[:probe]]))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"rows": len(self._ids), "dim": self.dim, "capacity": self._capacity,
+                    "vector_bytes": self._capacity * self.dim * 2,
+                    "quantization": self.quantization,
+                    "scan_bytes": self._codes.nbytes if self._codes is not None else 0,
+                    "ivf_lists": self.ivf_lists if self._ivf is not None else 0}
+
+
+_flat_stores: dict[str, FlatStore] = {}
+_flat_lock = threading.Lock()
+
+
+def get_flat_store(path: str) -> FlatStore:
+    """One FlatStore per directory per process (it holds the memory map and in-memory metadata)."""
+    path = os.path.abspath(path)
+    with _flat_lock:
+        if path not in _flat_stores:
+            _flat_stores[path] = FlatStore(path)
+        return _flat_stores[path]
@@ -16,6 +16,7 @@ from config import (
     STT_FALLBACK_DEEPGRAM,
     STT_OPENAI_MODEL,
 )
+from modules import clients
 
 logger = logging.getLogger(__name__)
 
@@ -58,8 +59,7 @@ def transcribe_audio(audio_bytes: bytes, format: str = "webm") -> dict[str, Any]
     # Try OpenAI Whisper first
     if OPENAI_API_KEY:
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
+            client = clients.get_openai()
             with tempfile.NamedTemporaryFile(suffix="." + format, delete=False) as f:
                 f.write(audio_bytes)
                 path = f.name
@@ -101,8 +101,7 @@ def transcribe_audio(audio_bytes: bytes, format: str = "webm") -> dict[str, Any]
 def _transcribe_deepgram(audio_bytes: bytes) -> dict[str, Any]:
     """Fallback: Deepgram Nova-2."""
     try:
-        import httpx
-        resp = httpx.post(
+        resp = clients.get_http().post(
             "https://api.deepgram.com/v1/listen?model=nova-2&smart_format=true",
             headers={"Authorization": f"Token {DEEPGRAM_API_KEY}"},
             content=audio_bytes,
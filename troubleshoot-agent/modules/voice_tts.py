@@ -1,11 +1,17 @@
 """
 Text-to-speech: OpenAI TTS (tts-1-hd, voice: nova). Optional ElevenLabs fallback.
 Pre-processes text through audio_adapter.adapt_for_voice before synthesis.
+Synthesized audio is kept in a content-addressed disk cache (modules/audio_cache.py): repeated phrases cost no API call.
+SentencePipeline synthesizes streaming LLM output sentence by sentence, in parallel, emitting segments in order.
 """
+import asyncio
+import base64
 import io
 import logging
+import re
+import time
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable, Optional
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -15,11 +21,19 @@ from config import (
     TTS_FALLBACK_ELEVENLABS,
     TTS_OPENAI_MODEL,
     TTS_OPENAI_VOICE,
+    TTS_PIPELINE_CONCURRENCY,
+    TTS_PIPELINE_FIRST_MIN_CHARS,
+    TTS_PIPELINE_MIN_CHARS,
     TTS_SPEED,
 )
+from modules import audio_cache, clients, metrics
+from modules.executor import run_blocking
 
 logger = logging.getLogger(__name__)
 
+ELEVENLABS_VOICE_ID = "21m00Tcm4TlvDq8ikWAM"
+ELEVENLABS_MODEL = "eleven_monolingual_v1"
+
 
 def _adapt_for_voice(text: str) -> str:
     """Delegate to audio_adapter to avoid circular import at module load."""
@@ -30,43 +44,67 @@ def _adapt_for_voice(text: str) -> str:
 def synthesize(text: str, voice: str = TTS_OPENAI_VOICE, speed: float = TTS_SPEED) -> bytes:
     """
     Convert text to MP3 audio bytes. Text is pre-processed via audio_adapter.adapt_for_voice.
-    Returns: MP3 audio bytes.
+    Returns: MP3 audio bytes (served from the audio cache when this exact text/voice/speed/model was seen before).
     """
     text = _adapt_for_voice(text)
     if not text.strip():
         return b""
     if OPENAI_API_KEY:
-        try:
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            resp = client.audio.speech.create(
-                model=TTS_OPENAI_MODEL,
-                voice=voice,
-                input=text,
-                speed=speed,
-            )
-            return resp.content
-        except Exception as e:
-            logger.warning("OpenAI TTS failed: %s", e)
-            if TTS_FALLBACK_ELEVENLABS and ELEVENLABS_API_KEY:
-                return _synthesize_elevenlabs(text)
-            return b""
+        audio = _cached(audio_cache.audio_key(text, voice, speed, TTS_OPENAI_MODEL),
+                        lambda: _synthesize_openai(text, voice, speed))
+        if audio:
+            return audio
+        if TTS_FALLBACK_ELEVENLABS and ELEVENLABS_API_KEY:
+            return _synthesize_elevenlabs_cached(text)
+        return b""
     if TTS_FALLBACK_ELEVENLABS and ELEVENLABS_API_KEY:
-        return _synthesize_elevenlabs(text)
+        return _synthesize_elevenlabs_cached(text)
     return b""
 
 
+def _cached(key: str, synthesize_fn: Callable[[], bytes]) -> bytes:
+    """Serve key from the audio cache, or synthesize and store it (failures are never cached)."""
+    cache = audio_cache.get_cache()
+    if cache is not None:
+        audio = cache.get(key)
+        if audio is not None:
+            return audio
+    audio = synthesize_fn()
+    if audio and cache is not None:
+        cache.put(key, audio)
+    return audio
+
+
+def _synthesize_openai(text: str, voice: str, speed: float) -> bytes:
+    try:
+        client = clients.get_openai()
+        resp = client.audio.speech.create(
+            model=TTS_OPENAI_MODEL,
+            voice=voice,
+            input=text,
+            speed=speed,
+        )
+        return resp.content
+    except Exception as e:
+        logger.warning("OpenAI TTS failed: %s", e)
+        return b""
+
+
+def _synthesize_elevenlabs_cached(text: str) -> bytes:
+    key = audio_cache.audio_key(text, ELEVENLABS_VOICE_ID, 1.0, ELEVENLABS_MODEL, provider="elevenlabs")
+    return _cached(key, lambda: _synthesize_elevenlabs(text))
+
+
 def _synthesize_elevenlabs(text: str) -> bytes:
     """Fallback: ElevenLabs TTS."""
     try:
-        import httpx
-        resp = httpx.post(
-            "https://api.elevenlabs.io/v1/text-to-speech/21m00Tcm4TlvDq8ikWAM",
+        resp = clients.get_http().post(
+            f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}",
             headers={
                 "xi-api-key": ELEVENLABS_API_KEY,
                 "Content-Type": "application/json",
             },
-            json={"text": text, "model_id": "eleven_monolingual_v1"},
+            json={"text": text, "model_id": ELEVENLABS_MODEL},
             timeout=30.0,
         )
         resp.raise_for_status()
@@ -76,27 +114,135 @@ def _synthesize_elevenlabs(text: str) -> bytes:
         return b""
 
 
-async def stream_synthesize(text: str) -> AsyncGenerator[bytes, None]:
-    """Streaming TTS for long responses — yield MP3 chunks as they're generated."""
-    # OpenAI TTS API doesn't support true streaming; we yield full response in one chunk
-    # For real streaming you'd use a provider that supports it (e.g. ElevenLabs streaming)
-    text = _adapt_for_voice(text)
-    if not text.strip():
-        return
-    if OPENAI_API_KEY:
+# Sentence end (., !, ? optionally followed by a closing quote/bracket) + whitespace, or a blank line
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]?\s+|\n\s*\n")
+
+
+class SentenceSplitter:
+    """
+    Incrementally split streamed text into sentences. Fragments shorter than min_chars are held
+    and merged with the next sentence. The very first one only needs first_min_chars, so first audio starts
+    ASAP without a list marker like "1." going to TTS on its own.
+    """
+
+    def __init__(self, min_chars: int = TTS_PIPELINE_MIN_CHARS, first_min_chars: int = TTS_PIPELINE_FIRST_MIN_CHARS):
+        self.min_chars = min_chars
+        self.first_min_chars = min(first_min_chars, min_chars)
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, delta: str) -> list[str]:
+        """Add a text delta; return any sentences that are now complete."""
+        self._buffer += delta or ""
+        out = []
+        search_from = 0
+        while True:
+            m = _SENTENCE_BOUNDARY.search(self._buffer, search_from)
+            if not m:
+                break
+            candidate = self._buffer[:m.end()].strip()
+            if len(candidate) < (self.min_chars if self._emitted else self.first_min_chars):
+                search_from = m.end()
+                continue
+            out.append(candidate)
+            self._emitted += 1
+            self._buffer = self._buffer[m.end():]
+            search_from = 0
+        return [s for s in out if s]
+
+    def flush(self) -> list[str]:
+        """Return whatever text is left once the stream has ended."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+class SentencePipeline:
+    """
+    Sentence-pipelined TTS: feed() streaming LLM deltas; each complete sentence is adapted for voice and
+    synthesized on the blocking executor (up to `max_concurrency` at once). Finished segments are handed to
+    `on_segment` strictly in sentence order as {"index", "text", "audio_base64"} dicts.
+    `first_audio_seconds` is the latency from pipeline creation to the first emitted segment.
+    """
+
+    def __init__(
+        self,
+        on_segment: Callable[[dict], None],
+        max_concurrency: int = TTS_PIPELINE_CONCURRENCY,
+        min_chars: int = TTS_PIPELINE_MIN_CHARS,
+    ):
+        self._on_segment = on_segment
+        self._splitter = SentenceSplitter(min_chars=min_chars)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: list[asyncio.Task] = []
+        self._results: dict[int, Optional[dict]] = {}
+        self._next_index = 0
+        self._started = time.perf_counter()
+        self.first_audio_seconds: Optional[float] = None
+
+    def feed(self, delta: str) -> None:
+        for sentence in self._splitter.feed(delta):
+            self._submit(sentence)
+
+    def close(self) -> None:
+        """Signal end of text; the trailing fragment is submitted."""
+        for sentence in self._splitter.flush():
+            self._submit(sentence)
+
+    async def drain(self) -> None:
+        """Wait until every submitted sentence has been synthesized and emitted."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    def _submit(self, sentence: str) -> None:
+        index = len(self._tasks)
+        self._tasks.append(asyncio.create_task(self._synthesize(index, sentence)))
+
+    async def _synthesize(self, index: int, sentence: str) -> None:
+        segment = None
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            resp = client.audio.speech.create(
-                model=TTS_OPENAI_MODEL,
-                voice=TTS_OPENAI_VOICE,
-                input=text,
-                speed=TTS_SPEED,
-            )
-            yield resp.content
+            async with self._semaphore:
+                audio = await run_blocking(synthesize, sentence)
+            if audio:
+                segment = {"index": index, "text": sentence, "audio_base64": base64.standard_b64encode(audio).decode("ascii")}
         except Exception as e:
-            logger.warning("OpenAI TTS stream failed: %s", e)
-    return
+            logger.warning("Sentence TTS failed (segment %d): %s", index, e)
+        self._results[index] = segment
+        self._emit_ready()
+
+    def _emit_ready(self) -> None:
+        """Emit contiguous finished segments so audio always plays in sentence order."""
+        while self._next_index in self._results:
+            segment = self._results.pop(self._next_index)
+            self._next_index += 1
+            if segment is None:
+                continue
+            if self.first_audio_seconds is None:
+                self.first_audio_seconds = time.perf_counter() - self._started
+                metrics.observe("tts_first_audio_seconds", self.first_audio_seconds)
+            self._on_segment(segment)
+
+
+async def stream_synthesize(text: str) -> AsyncGenerator[bytes, None]:
+    """Streaming TTS for long responses — yield MP3 segments per sentence, in order, as soon as each is ready."""
+    queue: asyncio.Queue = asyncio.Queue()
+    pipeline = SentencePipeline(on_segment=queue.put_nowait)
+    pipeline.feed(text)
+    pipeline.close()
+    drained = asyncio.create_task(pipeline.drain())
+    drained.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            segment = await queue.get()
+            if segment is None:
+                break
+            yield base64.standard_b64decode(segment["audio_base64"])
+    finally:
+        pipeline.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+"""
+Warm start: everything the first chat turn would otherwise build lazily, done once at startup.
+
+Components run in order — API client pools, the Chroma collection + BM25 index, the embedding backend,
+a dummy query through hybrid retrieval (Chroma loads its HNSW index on the first query), and the
+cross-encoder. Each records its status and seconds; a failed component is logged and reported but does not
+block readiness, because every stage already degrades (BM25-only retrieval, unranked results). main.lifespan
+runs this in the background and GET /api/ready returns 503 until it has finished.
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import OPENAI_API_KEY, WARMUP_QUERY
+from modules import clients, embedding_backends, metrics, rag_engine
+
+logger = logging.getLogger(__name__)
+
+
+class Skip(Exception):
+    """Raised by a component that does not apply in this configuration (e.g. no API key)."""
+
+
+def _embedding() -> None:
+    if embedding_backends.get_backend().name == "openai" and not OPENAI_API_KEY:
+        raise Skip("OPENAI_API_KEY not set")
+    rag_engine.warm_up_embeddings()
+
+
+def _retrieve() -> None:
+    rag_engine.retrieve(WARMUP_QUERY, top_k=1)
+
+
+def _reranker() -> None:
+    rag_engine.warm_up_reranker()
+
+
+def default_components() -> list[tuple[str, Callable[[], Any]]]:
+    return [
+        ("clients", clients.startup),
+        ("vector_store", rag_engine.warm_up_store),
+        ("embedding", _embedding),
+        ("retrieve", _retrieve),
+        ("reranker", _reranker),
+    ]
+
+
+class Warmup:
+    """Runs components once and keeps per-component status for the readiness endpoint and /api/metrics."""
+
+    def __init__(self, components: Optional[list[tuple[str, Callable[[], Any]]]] = None):
+        self._components = components if components is not None else default_components()
+        self._lock = threading.Lock()
+        self._status: dict[str, dict[str, Any]] = {name: {"status": "pending"} for name, _ in self._components}
+        self._done = threading.Event()
+        self.seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def run(self) -> dict[str, Any]:
+        """Warm every component (blocking); returns snapshot()."""
+        with self._lock:
+            self._status = {name: {"status": "pending"} for name, _ in self._components}
+            self._done.clear()
+        start = time.perf_counter()
+        for name, fn in self._components:
+            t0 = time.perf_counter()
+            try:
+                fn()
+                entry = {"status": "ok"}
+            except Skip as e:
+                entry = {"status": "skipped", "reason": str(e)}
+            except Exception as e:
+                logger.warning("Warm-up of %s failed: %s", name, e)
+                entry = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            entry["seconds"] = round(time.perf_counter() - t0, 4)
+            if entry["status"] == "ok":
+                metrics.observe(f"warmup_{name}_seconds", entry["seconds"])
+            with self._lock:
+                self._status[name] = entry
+        self.seconds = round(time.perf_counter() - start, 4)
+        self._done.set()
+        logger.info("Warm-up finished in %.2fs: %s", self.seconds,
+                    ", ".join(f"{n}={s['status']} {s['seconds']:.2f}s" for n, s in self._status.items()))
+        return self.snapshot()
+
+    def mark_ready(self) -> None:
+        """Readiness without warming (WARMUP_ON_STARTUP=0): components load lazily as before."""
+        self._done.set()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            components = {name: dict(entry) for name, entry in self._status.items()}
+        return {
+            "ready": self.ready,
+            "degraded": any(c["status"] == "failed" for c in components.values()),
+            "seconds": self.seconds,
+            "components": components,
+        }
+
+
+warmup = Warmup()
+metrics.register_gauge("warmup", warmup.snapshot)
@@ -3,6 +3,9 @@ Web search via Tavily API (RAG/agent-oriented, clean parsed results).
 Ranking by domain priority, recency, and content length.
 """
 import logging
+import re
+import threading
+from collections import defaultdict
 from datetime import datetime, timedelta
 from typing import Any
 from urllib.parse import urlparse
@@ -10,7 +13,8 @@ from urllib.parse import urlparse
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from config import TAVILY_API_KEY, TOP_K_WEB, WEB_SEARCH_PRIORITY_DOMAINS
+from config import RAG_SCORE_THRESHOLD, TAVILY_API_KEY, TOP_K_WEB, WEB_SEARCH_PRIORITY_DOMAINS
+from modules import clients
 
 logger = logging.getLogger(__name__)
 
@@ -60,8 +64,7 @@ def search(query: str, top_k: int = TOP_K_WEB) -> list[dict]:
         logger.warning("TAVILY_API_KEY not set; skipping web search")
         return []
     try:
-        from tavily import TavilyClient
-        client = TavilyClient(api_key=TAVILY_API_KEY)
+        client = clients.get_tavily()
         response = client.search(
             query=query,
             max_results=max(top_k, 5),
@@ -119,6 +122,63 @@ def is_web_search_needed(rag_scores: list[float], threshold: float = 0.85) -> bo
     return float(rag_scores[0]) < threshold
 
 
+# Query features the curated knowledge base rarely covers: specific models/versions, error codes, "latest" news
+_SPECIFIC_QUERY = re.compile(
+    r"\b(?:ios\s*\d+(?:\.\d+)*|iphone\s*\d+|error\s*(?:code\s*)?-?\d+|\d{4,}|latest|newest|new update|beta|recall)\b",
+    re.IGNORECASE,
+)
+
+
+class WebNeedPredictor:
+    """
+    Predict, before retrieval finishes, how likely a turn is to need web context. Combines:
+    - per-category history: how often turns in this issue category ended up needing the web
+      (low RAG score or a "no knowledge" answer), with a Beta(1, 1) prior;
+    - per-category RAG score distribution: running mean of the top vector score;
+    - query features: "general" category, specific model/version/error-code terms.
+    When vector scores for the current turn are known, a top score below threshold dominates.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: dict[str, int] = defaultdict(int)
+        self._needed: dict[str, int] = defaultdict(int)
+        self._score_sum: dict[str, float] = defaultdict(float)
+
+    def predict(self, query: str, category: str, vector_scores: list[float] | None = None) -> float:
+        with self._lock:
+            turns = self._turns[category]
+            needed_rate = (self._needed[category] + 1) / (turns + 2)
+            mean_top = self._score_sum[category] / turns if turns else None
+        p = 0.5 * needed_rate
+        if mean_top is not None and mean_top < RAG_SCORE_THRESHOLD:
+            p += 0.15
+        if category == "general":
+            p += 0.25
+        if _SPECIFIC_QUERY.search(query or ""):
+            p += 0.3
+        if vector_scores is not None and is_web_search_needed(vector_scores, threshold=RAG_SCORE_THRESHOLD):
+            p = max(p, 0.9)
+        return round(max(0.0, min(1.0, p)), 4)
+
+    def record(self, category: str, top_score: float, needed_web: bool) -> None:
+        """Feed back the outcome of a turn (top RAG score, whether web context turned out to be needed)."""
+        with self._lock:
+            self._turns[category] += 1
+            self._score_sum[category] += float(top_score)
+            if needed_web:
+                self._needed[category] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._turns.clear()
+            self._needed.clear()
+            self._score_sum.clear()
+
+
+predictor = WebNeedPredictor()
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     if TAVILY_API_KEY:
@@ -129,3 +189,4 @@ if __name__ == "__main__":
         print("Set TAVILY_API_KEY to run web search test")
     print("is_web_search_needed([0.8]):", is_web_search_needed([0.8]))
     print("is_web_search_needed([0.6]):", is_web_search_needed([0.6]))
+    print("predict('iOS 18 error 4013', 'general'):", predictor.predict("iOS 18 error 4013", "general"))
@@ -0,0 +1,90 @@
+"""
+Per-session retrieval working set: within one troubleshooting session the relevant chunks rarely change, so a
+turn whose query stays close to the query that last hit the vector store reuses those chunks instead of
+querying the store again. Reused chunks carry no rerank scores: the rerank stage scores them against the new
+query (a few dozen cross-encoder pairs), so the web-search gate never sees another turn's scores.
+
+The set lives on ConversationContext.working_set and is rebuilt when the query drifts below
+WORKING_SET_MIN_SIMILARITY, the issue category changes, it has served WORKING_SET_MAX_TURNS turns, or the
+knowledge base is re-ingested (drop()). Query embeddings are bounded by RETRIEVE_EMBED_TIMEOUT; a slow or
+failing embedding API counts as drift, so retrieve() answers from BM25 as it would without a set.
+"""
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import WORKING_SET_ENABLED, WORKING_SET_MAX_TURNS, WORKING_SET_MIN_SIMILARITY
+from modules import metrics, rag_engine
+from modules.context_manager import ConversationContext
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetrievalWorkingSet:
+    topic: np.ndarray       # Unit embedding of the query that built the set
+    category: str           # Category pre-filter it was retrieved with
+    results: list[dict]     # Reranked candidates (scores for the query that built the set; dropped on reuse)
+    embeddings: np.ndarray  # Unit chunk embeddings, one row per result
+    turns: int = 0          # Turns served from the set since it was built
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def lookup(ctx: ConversationContext, query: str, category: str) -> Optional[list[dict]]:
+    """
+    The session's working set for `query` (copies without rerank scores, marked "reused", ordered by chunk
+    similarity to the query), or None if the turn has to retrieve: no set yet, another category, too many
+    turns served, the query drifted off the topic, or it could not be embedded in time.
+    """
+    ws = ctx.working_set
+    if not WORKING_SET_ENABLED or ws is None:
+        return None
+    if ws.category != category or ws.turns >= WORKING_SET_MAX_TURNS:
+        metrics.incr("working_set_expired")
+        return None
+    embedding = rag_engine.embed_query_with_timeout(query)  # Cached; retrieve() reuses it if the topic drifted
+    q = _unit(embedding) if embedding is not None else None
+    if q is None or q.shape != ws.topic.shape or float(q @ ws.topic) < WORKING_SET_MIN_SIMILARITY:
+        metrics.incr("working_set_drift")
+        return None
+    ws.turns += 1
+    metrics.incr("working_set_hit")
+    order = np.argsort(-(ws.embeddings @ q), kind="stable") if ws.embeddings.shape[1] == q.shape[0] else range(len(ws.results))
+    stale = ("rerank_score", "rerank_logit")
+    return [{**{k: v for k, v in ws.results[i].items() if k not in stale}, "reused": True} for i in order]
+
+
+def remember(ctx: ConversationContext, query: str, category: str, results: list[dict]) -> None:
+    """Make freshly retrieved and reranked results the session's working set (needs retrieve's chunk ids)."""
+    if not WORKING_SET_ENABLED:
+        return
+    ids = [r.get("chunk_id") for r in results]
+    if not results or None in ids or any("rerank_score" not in r for r in results):  # Next turn retries reranking
+        ctx.working_set = None
+        return
+    try:
+        embedding = rag_engine.embed_query_with_timeout(query)
+        if embedding is None:
+            raise TimeoutError("query embedding unavailable")
+        topic = _unit(embedding)
+        embeddings = rag_engine.chunk_embeddings(ids)
+    except Exception as e:
+        logger.warning("Working set not updated: %s", e)
+        ctx.working_set = None
+        return
+    ctx.working_set = RetrievalWorkingSet(topic=topic, category=category, results=[dict(r) for r in results], embeddings=embeddings)
+
+
+def drop(sessions) -> None:
+    """Forget every session's working set (ingestion changed the knowledge base)."""
+    for ctx in sessions:
+        ctx.working_set = None
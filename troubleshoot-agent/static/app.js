@@ -90,6 +90,92 @@ function appendAriaMessage(text, sources = [], audioBase64 = null) {
   conversation.scrollTop = conversation.scrollHeight;
 }
 
+// ARIA message that fills in while the answer streams; returns setters for text, sources, and audio.
+function appendStreamingAriaMessage() {
+  const div = document.createElement('div');
+  div.className = 'message aria';
+  div.innerHTML = '<span class="message-avatar">◈</span><div class="message-text markdown-body"></div>';
+  const textEl = div.querySelector('.message-text');
+  let attached = false;
+  function attach() {
+    if (attached || !conversation) return;
+    removeTyping();
+    conversation.appendChild(div);
+    attached = true;
+  }
+  return {
+    setText(text) {
+      attach();
+      textEl.innerHTML = renderMarkdown(text);
+      conversation.scrollTop = conversation.scrollHeight;
+    },
+    setSources(sources) {
+      if (!sources || !sources.length) return;
+      attach();
+      const wrap = document.createElement('div');
+      wrap.className = 'message-sources';
+      sources.forEach(s => {
+        const a = document.createElement('a');
+        a.className = 'source-pill';
+        a.href = String(s).startsWith('http') ? s : '#';
+        a.target = '_blank';
+        a.rel = 'noopener';
+        a.textContent = String(s);
+        wrap.appendChild(a);
+      });
+      div.appendChild(wrap);
+    },
+    setAudio(audioBase64, srcUrl = null) {
+      if (!audioBase64 && !srcUrl) return;
+      attach();
+      const wrap = document.createElement('div');
+      wrap.className = 'audio-player-wrap';
+      const audio = document.createElement('audio');
+      audio.controls = true;
+      audio.src = srcUrl || `data:audio/mpeg;base64,${audioBase64}`;
+      wrap.appendChild(audio);
+      div.appendChild(wrap);
+      conversation.scrollTop = conversation.scrollHeight;
+    },
+  };
+}
+
+// Plays per-sentence MP3 segments back to back in arrival order (server already orders them).
+function createSegmentPlayer() {
+  const queue = [];
+  const segments = [];
+  let current = null;
+  let stopped = false;
+  function playNext() {
+    if (stopped || current || !queue.length) return;
+    current = new Audio(`data:audio/mpeg;base64,${queue.shift()}`);
+    current.onended = current.onerror = () => { current = null; playNext(); };
+    current.play().catch(() => { current = null; playNext(); });
+  }
+  return {
+    push(audioBase64) {
+      if (!audioBase64) return;
+      segments.push(audioBase64);
+      queue.push(audioBase64);
+      playNext();
+    },
+    stop() {
+      stopped = true;
+      queue.length = 0;
+      segments.length = 0;
+      if (current) current.pause();
+      current = null;
+      stopped = false;
+    },
+    // Whole answer as one MP3 (frame-concatenated) for the replay control
+    toBlobUrl() {
+      if (!segments.length) return null;
+      const parts = segments.map(b64 => Uint8Array.from(atob(b64), c => c.charCodeAt(0)));
+      return URL.createObjectURL(new Blob(parts, { type: 'audio/mpeg' }));
+    },
+  };
+}
+
 function appendTyping() {
   if (!conversation) return;
   const div = document.createElement('div');
@@ -130,6 +216,43 @@ async function apiChat(message, imageBase64 = null) {
   return res.json();
 }
 
+// Streaming chat (Server-Sent Events over POST). Calls handlers[event](data) as frames arrive;
+// resolves with the final `done` payload.
+async function apiChatStream(message, imageBase64 = null, handlers = {}) {
+  const res = await fetch(`${API_BASE}/api/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+    body: JSON.stringify({ session_id: sessionId, message, image_base64: imageBase64 }),
+  });
+  if (!res.ok || !res.body) throw new Error(await res.text());
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let done = null;
+  for (;;) {
+    const { value, done: finished } = await reader.read();
+    if (value) buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      let data = '';
+      frame.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      const payload = data ? JSON.parse(data) : {};
+      if (event === 'error') throw new Error(payload.detail || 'Stream error');
+      if (event === 'done') done = payload;
+      if (handlers[event]) handlers[event](payload);
+    }
+    if (finished) break;
+  }
+  if (!done) throw new Error('Stream ended before completion');
+  return done;
+}
+
 async function apiUploadDocument(file) {
   const form = new FormData();
   form.append('file', file);
@@ -166,10 +289,27 @@ async function sendMessage(text, imageBase64 = null) {
   setVoiceStatus('Thinking...');
 
   try {
-    const data = await apiChat(msg, imageBase64 || currentImageBase64 || undefined);
+    const bubble = appendStreamingAriaMessage();
+    const player = createSegmentPlayer();
+    let streamed = '';
+    if (processStepsList) processStepsList.innerHTML = '';
+    const data = await apiChatStream(msg, imageBase64 || currentImageBase64 || undefined, {
+      step: appendProcessStep,
+      token: (d) => {
+        if (!streamed) setVoiceStatus('');
+        streamed += d.text || '';
+        bubble.setText(streamed);
+      },
+      reset: () => { streamed = ''; bubble.setText(''); player.stop(); },
+      audio_segment: (d) => player.push(d.audio_base64),
+      sources: (d) => bubble.setSources(d.sources || []),
+      audio: (d) => bubble.setAudio(d.audio_base64),
+    });
+    const replayUrl = player.toBlobUrl();
+    if (replayUrl) bubble.setAudio(null, replayUrl);
     removeTyping();
     setVoiceStatus('');
-    appendAriaMessage(data.text || '', data.sources || [], data.audio_base64 || null);
+    if (!streamed) bubble.setText(data.text || '');
     updateContext(data);
     currentImageBase64 = null;
   } catch (e) {
@@ -180,16 +320,19 @@ async function sendMessage(text, imageBase64 = null) {
   }
 }
 
+function appendProcessStep(step) {
+  if (!processStepsList || !step) return;
+  const li = document.createElement('li');
+  li.className = 'process-step process-step-' + (step.phase || 'observe');
+  const phaseLabel = (step.phase === 'think' ? 'Think' : step.phase === 'act' ? 'Act' : 'Observe') + ': ';
+  li.textContent = phaseLabel + (step.text || '');
+  processStepsList.appendChild(li);
+}
+
 function updateContext(data) {
   if (processStepsList && data.steps && Array.isArray(data.steps)) {
     processStepsList.innerHTML = '';
-    data.steps.forEach(function(step) {
-      const li = document.createElement('li');
-      li.className = 'process-step process-step-' + (step.phase || 'observe');
-      const phaseLabel = (step.phase === 'think' ? 'Think' : step.phase === 'act' ? 'Act' : 'Observe') + ': ';
-      li.textContent = phaseLabel + (step.text || '');
-      processStepsList.appendChild(li);
-    });
+    data.steps.forEach(appendProcessStep);
   }
   if (sourcesList && data.sources && data.sources.length) {
     sourcesList.innerHTML = data.sources.map(s => `<a href="${s.startsWith('http') ? s : '#'}" target="_blank" rel="noopener">${escapeHtml(s)}</a>`).join('');
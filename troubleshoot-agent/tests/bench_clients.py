@@ -0,0 +1,105 @@
+"""
+Microbenchmark: per-call latency with a fresh client per request (old behaviour) vs the pooled registry.
+
+By default it targets a local stub HTTP server, which isolates client construction + TCP connect cost.
+Point --url at a real HTTPS endpoint (e.g. https://api.openai.com/v1/models — a 401 is fine) to include
+the TLS handshake that the pool removes from the per-request path.
+
+Run from project root: python tests/bench_clients.py [--calls 50] [--url https://api.openai.com/v1/models]
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from modules import clients
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/ping"
+
+
+def _time_calls(fn, calls: int) -> list[float]:
+    out = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - start) * 1000.0)
+    return out
+
+
+def _row(label: str, ms: list[float]) -> str:
+    ordered = sorted(ms)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"{label:<28} {statistics.mean(ms):>9.2f} {statistics.median(ms):>9.2f} {p95:>9.2f}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--url", default="", help="Endpoint to GET (default: local stub server)")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = _start_stub()
+
+    def fresh():
+        with httpx.Client(timeout=30.0) as c:
+            c.get(url)
+
+    pooled_client = clients.get_http()
+
+    def pooled():
+        pooled_client.get(url)
+
+    if not clients.OPENAI_API_KEY:
+        clients.OPENAI_API_KEY = "sk-bench"  # construction only; no request is sent
+
+    def fresh_sdk():
+        from openai import OpenAI
+        OpenAI(api_key=clients.OPENAI_API_KEY)
+
+    def pooled_sdk():
+        clients.get_openai()
+
+    pooled()  # open the keep-alive connection once
+    print(f"Target: {url}  (http2={clients.HTTP2_AVAILABLE})")
+    print(f"{'':<28} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    print(_row("fresh httpx.Client per call", _time_calls(fresh, args.calls)))
+    print(_row("pooled registry client", _time_calls(pooled, args.calls)))
+    print(_row("fresh OpenAI() per call", _time_calls(fresh_sdk, args.calls)))
+    print(_row("registry get_openai()", _time_calls(pooled_sdk, args.calls)))
+    if server:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Concurrency benchmark for POST /api/chat.
+
+Replaces every SDK-backed stage with a blocking `time.sleep` of realistic latency (no API keys
+needed) and fires batches of concurrent chats at the ASGI app. If a stage blocked the event loop,
+p95 would grow linearly with the number of in-flight requests; with the bounded executor it stays
+roughly flat until BLOCKING_POOL_WORKERS is saturated.
+
+Run from project root: python tests/bench_concurrency.py [--levels 1,8,32] [--rounds 3]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+import main
+from modules import image_handler, llm_agent, rag_engine, voice_tts, web_search
+
+# Simulated per-stage latency (seconds), roughly matching production p50s
+STAGE_LATENCY = {
+    "retrieve": 0.08,
+    "rerank": 0.04,
+    "web": 0.30,
+    "llm": 0.50,
+    "tts": 0.25,
+}
+
+
+def _install_fakes() -> None:
+    def retrieve(query, top_k=5, filter_metadata=None):
+        time.sleep(STAGE_LATENCY["retrieve"])
+        return [{"content": "Check Settings > Battery.", "source_file": "battery_drain_basics.md", "relevance_score": 0.9}]
+
+    def rerank_results(results, query):
+        time.sleep(STAGE_LATENCY["rerank"])
+        return results
+
+    def search(query, top_k=3):
+        time.sleep(STAGE_LATENCY["web"])
+        return []
+
+    def run(**kwargs):
+        time.sleep(STAGE_LATENCY["llm"])
+        return {"text": "Open Settings, then Battery.", "sources": ["battery_drain_basics.md"], "step_number": 1, "has_next_step": False}
+
+    def synthesize(text, **kwargs):
+        time.sleep(STAGE_LATENCY["tts"])
+        return b"ID3"
+
+    rag_engine.retrieve = retrieve
+    rag_engine.rerank_results = rerank_results
+    web_search.search = search
+    llm_agent.run = run
+    voice_tts.synthesize = synthesize
+    image_handler.analyze_image = lambda image_bytes, user_context="": {}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+async def _one_chat(client: httpx.AsyncClient, i: int) -> float:
+    start = time.perf_counter()
+    resp = await client.post("/api/chat", json={"session_id": f"bench-{i}", "message": "My iPhone battery drains fast"})
+    resp.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def _run_level(concurrency: int, rounds: int) -> list[float]:
+    transport = httpx.ASGITransport(app=main.app)
+    latencies: list[float] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for r in range(rounds):
+            batch = await asyncio.gather(*(_one_chat(client, r * concurrency + i) for i in range(concurrency)))
+            latencies.extend(batch)
+    return latencies
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,8,16,32", help="Comma-separated in-flight request counts")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    _install_fakes()
+    serial = sum(STAGE_LATENCY[k] for k in ("retrieve", "rerank", "llm", "tts"))
+    print(f"Serial stage latency per chat: {serial:.2f}s")
+    print(f"{'in-flight':>9} {'p50 (s)':>8} {'p95 (s)':>8} {'p95/serial':>10}")
+    for level in (int(x) for x in args.levels.split(",") if x.strip()):
+        lat = asyncio.run(_run_level(level, args.rounds))
+        p50 = statistics.median(lat)
+        p95 = _percentile(lat, 95)
+        print(f"{level:>9} {p50:>8.3f} {p95:>8.3f} {p95 / serial:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
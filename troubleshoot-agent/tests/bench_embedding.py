@@ -0,0 +1,130 @@
+"""
+Throughput benchmark: bulk-embedding a synthetic corpus one request per document, serially (old
+ingest_directory behaviour) vs the EmbeddingPipeline (token-bounded batches across files, concurrent,
+rate-limited, streamed into an in-memory Chroma collection).
+
+Targets a local stub of POST /v1/embeddings with a fixed per-request latency plus a small per-input cost,
+so the numbers show round-trip-bound vs throughput-bound ingestion without spending API credits.
+
+Run from project root: python tests/bench_embedding.py [--docs 300] [--chunks-per-doc 8] [--latency-ms 80]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chromadb
+from chromadb.config import Settings
+
+from config import EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_MODEL
+from modules import clients
+from modules.embedding_pipeline import EmbeddingPipeline, RateLimiter
+
+DIMS = 64
+
+
+def _make_handler(latency_s: float, per_input_s: float):
+    class _StubEmbeddings(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = req["input"] if isinstance(req["input"], list) else [req["input"]]
+            time.sleep(latency_s + per_input_s * len(inputs))
+            data = [{"object": "embedding", "index": i, "embedding": [float(len(t) % 7)] * DIMS} for i, t in enumerate(inputs)]
+            body = json.dumps({"object": "list", "data": data, "model": req["model"],
+                               "usage": {"prompt_tokens": 0, "total_tokens": 0}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return _StubEmbeddings
+
+
+def _corpus(docs: int, chunks_per_doc: int) -> list[list[str]]:
+    sentence = "To fix this, open Settings, tap General, then restart your iPhone and check again. "
+    return [[f"Article {d} chunk {c}. " + sentence * 6 for c in range(chunks_per_doc)] for d in range(docs)]
+
+
+def _embed(texts: list[str]) -> list[list[float]]:
+    out = clients.get_openai().embeddings.create(input=texts, model=EMBEDDING_MODEL)
+    return [d.embedding for d in out.data]
+
+
+def _collection(name: str):
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+
+def run_serial(corpus: list[list[str]]) -> float:
+    collection = _collection("bench_serial")
+    start = time.perf_counter()
+    for d, chunks in enumerate(corpus):
+        vectors = _embed(chunks)
+        collection.upsert(ids=[f"d{d}_{c}" for c in range(len(chunks))], embeddings=vectors, documents=chunks)
+    return time.perf_counter() - start
+
+
+def run_pipeline(corpus: list[list[str]], concurrency: int, batch_tokens: int, rpm: int, tpm: int) -> tuple[float, dict]:
+    collection = _collection("bench_pipeline")
+    lock = threading.Lock()
+
+    def store(payloads, vectors):
+        with lock:
+            collection.upsert(ids=[p[0] for p in payloads], embeddings=vectors, documents=[p[1] for p in payloads])
+
+    start = time.perf_counter()
+    pipeline = EmbeddingPipeline(_embed, on_batch=store, max_batch_tokens=batch_tokens, concurrency=concurrency,
+                                 limiter=RateLimiter(rpm, tpm))
+    for d, chunks in enumerate(corpus):
+        for c, text in enumerate(chunks):
+            pipeline.submit(text, (f"d{d}_{c}", text))
+    stats = pipeline.close()
+    return time.perf_counter() - start, stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--chunks-per-doc", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Stub per-request latency")
+    parser.add_argument("--per-input-ms", type=float, default=0.2, help="Stub extra latency per input")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=EMBEDDING_BATCH_MAX_TOKENS)
+    parser.add_argument("--rpm", type=int, default=3000)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(args.latency_ms / 1000.0, args.per_input_ms / 1000.0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    clients.OPENAI_API_KEY = "sk-bench"
+
+    corpus = _corpus(args.docs, args.chunks_per_doc)
+    total = sum(len(c) for c in corpus)
+    _embed(["warm up"])  # open the pooled connection
+
+    serial_s = run_serial(corpus)
+    pipeline_s, stats = run_pipeline(corpus, args.concurrency, args.batch_tokens, args.rpm, args.tpm)
+    print(f"Corpus: {args.docs} docs, {total} chunks; stub latency {args.latency_ms:.0f} ms/request")
+    print(f"{'':<34} {'seconds':>9} {'chunks/s':>10} {'requests':>9}")
+    print(f"{'serial, one request per document':<34} {serial_s:>9.2f} {total / serial_s:>10.1f} {args.docs:>9}")
+    print(f"{'EmbeddingPipeline':<34} {pipeline_s:>9.2f} {total / pipeline_s:>10.1f} {stats['batches']:>9}")
+    print(f"Speed-up: {serial_s / pipeline_s:.1f}x  (retries={stats['retries']}, rate-limited {stats['rate_limited_seconds']}s)")
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
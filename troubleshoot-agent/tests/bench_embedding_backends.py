@@ -0,0 +1,110 @@
+"""
+Embedding backend benchmark: retrieval quality (recall@k over tests/data/eval_queries.json) and latency
+(query embedding p50/p95, bulk chunk throughput) for each backend on knowledge_base/docs.
+
+Each backend embeds the chunked corpus into its own in-memory Chroma collection; a query counts its top-k
+distinct source files. Backends that cannot load (no OPENAI_API_KEY, model not downloadable) are reported
+as unavailable. Point EMBEDDING_LOCAL_MODEL_DIR at a quantized export to compare it with the fp32 model.
+
+Run from project root: python tests/bench_embedding_backends.py [--backends openai,local] [--k 1,3,5]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chromadb
+from chromadb.config import Settings
+
+from modules import doc_loader
+from modules.embedding_backends import create_backend
+
+ROOT = Path(__file__).resolve().parent.parent
+DOCS = ROOT / "knowledge_base" / "docs"
+QUERIES = Path(__file__).resolve().parent / "data" / "eval_queries.json"
+
+
+def _corpus() -> tuple[list[str], list[str]]:
+    chunks, sources = [], []
+    for pattern in doc_loader.SUPPORTED_PATTERNS:
+        for path in sorted(DOCS.glob(pattern)):
+            for chunk in doc_loader.load_and_chunk(str(path))["chunks"]:
+                chunks.append(chunk)
+                sources.append(path.name)
+    return chunks, sources
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run_backend(name: str, chunks: list[str], sources: list[str], queries: list[dict], ks: list[int]) -> dict:
+    backend = create_backend(name)
+    try:
+        warm_s = backend.warm_up()
+    except Exception as e:
+        return {"backend": name, "error": f"{type(e).__name__}: {e}"}
+
+    start = time.perf_counter()
+    vectors = backend.embed(chunks)
+    ingest_s = time.perf_counter() - start
+    client = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False))
+    collection = client.get_or_create_collection(name=f"bench_{name}", metadata={"hnsw:space": "cosine"})
+    collection.upsert(ids=[str(i) for i in range(len(chunks))], embeddings=vectors, documents=chunks,
+                      metadatas=[{"source_file": s} for s in sources])
+
+    latencies, hits = [], {k: [] for k in ks}
+    for q in queries:
+        start = time.perf_counter()
+        qvec = backend.embed([q["query"]])[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        res = collection.query(query_embeddings=[qvec], n_results=min(len(chunks), max(ks) * 4), include=["metadatas"])
+        ranked: list[str] = []
+        for meta in res["metadatas"][0]:
+            if meta["source_file"] not in ranked:
+                ranked.append(meta["source_file"])
+        relevant = set(q["relevant"])
+        for k in ks:
+            hits[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+    return {
+        "backend": name,
+        "model": backend.model,
+        "dims": len(vectors[0]) if vectors else 0,
+        "warm_up_s": warm_s,
+        "chunks_per_s": len(chunks) / ingest_s if ingest_s else 0.0,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": _percentile(latencies, 95),
+        "recall": {k: statistics.mean(v) for k, v in hits.items()},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="openai,local")
+    parser.add_argument("--k", default="1,3,5", help="Comma-separated cut-offs for recall@k")
+    args = parser.parse_args()
+    ks = [int(k) for k in args.k.split(",")]
+
+    chunks, sources = _corpus()
+    # Queries labeled with no relevant doc (answers need the web) have no recall to measure
+    queries = [q for q in json.loads(QUERIES.read_text(encoding="utf-8")) if q["relevant"]]
+    print(f"Corpus: {len(set(sources))} docs, {len(chunks)} chunks; {len(queries)} labeled queries")
+    header = f"{'backend':<8} {'model':<28} {'dims':>5} {'warm s':>7} {'chunks/s':>9} {'p50 ms':>7} {'p95 ms':>7}"
+    print(header + "".join(f" {'R@' + str(k):>6}" for k in ks))
+    for name in args.backends.split(","):
+        r = run_backend(name.strip(), chunks, sources, queries, ks)
+        if "error" in r:
+            print(f"{r['backend']:<8} unavailable: {r['error']}")
+            continue
+        print(f"{r['backend']:<8} {r['model']:<28} {r['dims']:>5} {r['warm_up_s']:>7.2f} {r['chunks_per_s']:>9.1f} "
+              f"{r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f}" + "".join(f" {r['recall'][k]:>6.2f}" for k in ks))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
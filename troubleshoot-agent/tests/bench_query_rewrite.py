@@ -0,0 +1,76 @@
+"""
+Fallback rate on scripted multi-turn conversations (tests/data/conversations.json), retrieving each user
+turn as-is vs through query_rewriter.rewrite(). Per turn: retrieve + rerank against the ingested store,
+then the web-search gate (gating_scores); "fallback" = the gate sends the turn to web search, "KB hit" = a
+relevant doc made the top TOP_K_RAG. Follow-up turns are reported separately.
+
+Run from project root after knowledge_base/ingest.py: python tests/bench_query_rewrite.py [--backend rules|llm]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import RERANK_CANDIDATES, TOP_K_RAG
+from modules import query_rewriter, rag_engine, web_search
+from modules.context_manager import ConversationContext
+
+DEFAULT_CONVERSATIONS = Path(__file__).resolve().parent / "data" / "conversations.json"
+
+
+def _gate(queries: list[str], relevant: list[set]) -> list[tuple[bool, bool]]:
+    """(fallback, KB hit) per query; one batched retrieval and rerank for the whole list."""
+    retrieved = rag_engine.retrieve_many(queries, top_k=RERANK_CANDIDATES)
+    reranked = rag_engine.rerank_many(retrieved, queries)
+    out = []
+    for results, rel in zip(reranked, relevant):
+        results = results[:TOP_K_RAG]
+        scores, threshold = rag_engine.gating_scores(results)
+        out.append((web_search.is_web_search_needed(scores, threshold=threshold),
+                    any(r["source_file"] in rel for r in results)))
+    return out
+
+
+def _rate(flags: list[bool]) -> str:
+    return f"{sum(flags) / len(flags):>6.0%}" if flags else "     -"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", default=str(DEFAULT_CONVERSATIONS))
+    parser.add_argument("--backend", default="rules", choices=["rules", "llm"])
+    args = parser.parse_args()
+
+    conversations = json.loads(Path(args.conversations).read_text(encoding="utf-8"))
+    raw, rewritten, relevant, follow_up, rewrite_ms = [], [], [], [], []
+    for i, conv in enumerate(conversations):
+        ctx = ConversationContext(f"bench-{i}")
+        for message in conv["turns"]:
+            ctx.add_turn("user", message)
+            start = time.perf_counter()
+            query = query_rewriter.rewrite(ctx, message, backend=args.backend)
+            rewrite_ms.append((time.perf_counter() - start) * 1000.0)
+            raw.append(message)
+            rewritten.append(query)
+            relevant.append(set(conv["relevant"]))
+            follow_up.append(query != message)
+            ctx.add_turn("assistant", "(answer)")
+            ctx.current_issue = ctx.detect_issue_category()
+
+    before = _gate(raw, relevant)
+    after = _gate(rewritten, relevant)
+    print(f"{len(conversations)} conversations, {len(raw)} turns, {sum(follow_up)} rewritten "
+          f"(rewrite mean {statistics.mean(rewrite_ms):.2f} ms, backend {args.backend})")
+    print(f"{'':<22} {'fallback':>8} {'KB hit':>8}")
+    for label, turns in (("all turns", range(len(raw))), ("follow-ups", [i for i, f in enumerate(follow_up) if f])):
+        for name, res in (("raw", before), ("rewritten", after)):
+            print(f"{label + ', ' + name:<22} {_rate([res[i][0] for i in turns]):>8} {_rate([res[i][1] for i in turns]):>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
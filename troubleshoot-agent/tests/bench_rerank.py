@@ -0,0 +1,111 @@
+"""
+Reranking under load: every turn calling the cross-encoder itself (old rerank_results) vs RerankService
+micro-batching pairs from concurrent turns into one forward pass.
+
+By default the scorer is simulated: a forward pass costs a fixed overhead plus a per-pair cost, and only
+one pass runs at a time (a CPU model already uses every core, so concurrent passes just queue). With
+--onnx-dir the real ONNX cross-encoder in that directory is used instead.
+
+Run from project root: python tests/bench_rerank.py [--concurrency 1,4,16] [--pairs 10] [--onnx-dir DIR]
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import RERANK_MAX_BATCH_PAIRS, RERANK_MAX_WAIT_MS
+from modules.reranker import OnnxCrossEncoderScorer, RerankService
+
+
+class SimulatedScorer:
+    def __init__(self, overhead_ms: float, per_pair_ms: float):
+        self.overhead = overhead_ms / 1000.0
+        self.per_pair = per_pair_ms / 1000.0
+        self._cpu = threading.Lock()
+        self.passes = 0
+
+    def predict(self, pairs):
+        with self._cpu:
+            self.passes += 1
+            time.sleep(self.overhead + self.per_pair * len(pairs))
+        return [0.0] * len(pairs)
+
+
+def _pairs(n: int, i: int) -> list[tuple[str, str]]:
+    chunk = "Open Settings > Battery to see which apps use the most power, then turn on Low Power Mode. " * 4
+    return [(f"why does my iphone battery drain so fast {i}", chunk) for _ in range(n)]
+
+
+def _load(score, concurrency: int, rounds: int, pairs: int) -> list[float]:
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def user(u: int) -> None:
+        for r in range(rounds):
+            start = time.perf_counter()
+            score(_pairs(pairs, u * rounds + r))
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def _row(label: str, latencies: list[float], seconds: float, passes: int) -> str:
+    p95 = sorted(latencies)[int(0.95 * (len(latencies) - 1))]
+    return (f"{label:<22} {statistics.median(latencies):>8.1f} {p95:>8.1f} {len(latencies) / seconds:>8.1f} {passes:>7}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--rounds", type=int, default=10, help="Rerank calls per simulated user")
+    parser.add_argument("--pairs", type=int, default=10, help="Pairs per call (TOP_K_RAG-ish candidates)")
+    parser.add_argument("--overhead-ms", type=float, default=15.0, help="Simulated fixed cost per forward pass")
+    parser.add_argument("--per-pair-ms", type=float, default=1.0, help="Simulated cost per pair")
+    parser.add_argument("--onnx-dir", default="", help="Use the real ONNX cross-encoder in this directory")
+    parser.add_argument("--onnx-file", default="model.onnx")
+    parser.add_argument("--max-wait-ms", type=float, default=RERANK_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    def make_scorer():
+        if args.onnx_dir:
+            return OnnxCrossEncoderScorer(model_dir=args.onnx_dir, model_file=args.onnx_file)
+        return SimulatedScorer(args.overhead_ms, args.per_pair_ms)
+
+    print(f"{args.pairs} pairs per call, {args.rounds} calls per user, window {args.max_wait_ms} ms")
+    print(f"{'':<22} {'p50 ms':>8} {'p95 ms':>8} {'calls/s':>8} {'passes':>7}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        direct = make_scorer()
+        passes = [0]
+        cpu = threading.Lock()
+
+        def direct_score(pairs):
+            with cpu:  # Same single compute resource as the service gets
+                passes[0] += 1
+                return direct.predict(pairs)
+        start = time.perf_counter()
+        latencies = _load(direct_score, concurrency, args.rounds, args.pairs)
+        print(_row(f"direct x{concurrency}", latencies, time.perf_counter() - start, passes[0]))
+
+        scorer = make_scorer()
+        service = RerankService(scorer_factory=lambda: scorer, max_batch_pairs=max(RERANK_MAX_BATCH_PAIRS, args.pairs),
+                                max_wait_ms=args.max_wait_ms)
+        service.warm_up()
+        start = time.perf_counter()
+        latencies = _load(service.score, concurrency, args.rounds, args.pairs)
+        stats = service.stats()
+        print(_row(f"RerankService x{concurrency}", latencies, time.perf_counter() - start, stats["batches"] - 1))
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Batch retrieval: a loop of retrieve() calls vs one retrieve_many() for N queries (eval sets, threshold
+tuning, multi-query rewrites). The fake embedder sleeps --embed-ms per call to stand in for the API round
+trip that retrieve_many pays once instead of N times.
+
+Run from project root: python tests/bench_retrieve_many.py [--chunks 20000] [--queries 1,4,16,64] [--embed-ms 80]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import rag_engine
+from bench_retrieve_overhead import DIMS, WORDS, _build
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", default="1,4,16,64")
+    parser.add_argument("--embed-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+
+    def fake_embed(texts):
+        time.sleep(args.embed_ms / 1000.0)
+        return rng.standard_normal((len(texts), DIMS)).tolist()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _build(tmp, args.chunks)
+        rag_engine._embed_texts = fake_embed
+        rag_engine.retrieve("battery drains after update", top_k=5)  # Load HNSW index and BM25 before timing
+        print(f"Collection: {args.chunks} chunks, {DIMS} dims; embed round trip {args.embed_ms:.0f} ms")
+        print(f"{'queries':>7} {'loop ms':>9} {'batch ms':>9} {'speed-up':>9}")
+        for n in [int(q) for q in args.queries.split(",")]:
+            queries = [" ".join(rng.choice(WORDS, 4)) for _ in range(n)]
+            start = time.perf_counter()
+            for q in queries:
+                rag_engine.retrieve(q, top_k=5)
+            loop_ms = (time.perf_counter() - start) * 1000.0
+            start = time.perf_counter()
+            rag_engine.retrieve_many(queries, top_k=5)
+            batch_ms = (time.perf_counter() - start) * 1000.0
+            print(f"{n:>7} {loop_ms:>9.1f} {batch_ms:>9.1f} {loop_ms / batch_ms:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Per-query latency saved by CollectionStats: retrieve() with the collection handle and count looked up on
+every call (get_or_create_collection + count, the old behaviour) vs served from the cache.
+
+Builds a throwaway persistent Chroma store of --chunks random vectors; query embeddings are random too
+(no API calls), so the numbers isolate the store round trips.
+
+Run from project root: python tests/bench_retrieve_overhead.py [--chunks 20000] [--queries 300]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chromadb
+from chromadb.config import Settings
+
+from modules import rag_engine
+from modules.lexical_index import LexicalIndex
+
+DIMS = 384
+WORDS = "battery wifi screen storage bluetooth crash overheat settings restart update restore backup".split()
+
+
+def _build(path: str, chunks: int) -> None:
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    rag_engine._chroma_client = client
+    rag_engine._lexical = LexicalIndex(path=None)
+    collection = rag_engine._get_collection()
+    rng = np.random.default_rng(0)
+    for start in range(0, chunks, 2000):
+        n = min(2000, chunks - start)
+        ids = [f"doc{i // 10}.md#{i}" for i in range(start, start + n)]
+        docs = [" ".join(rng.choice(WORDS, 12)) for _ in range(n)]
+        metas = [{"source_file": f"doc{i // 10}.md", "category": str(rng.choice(WORDS))} for i in range(start, start + n)]
+        rag_engine._store_upsert(collection, ids, rng.standard_normal((n, DIMS)).astype(np.float32).tolist(), docs, metas)
+
+
+def _time(fn, n: int) -> list[float]:
+    out = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - start) * 1000.0)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    rag_engine._embed_texts = lambda texts: rng.standard_normal((len(texts), DIMS)).tolist()
+    with tempfile.TemporaryDirectory() as tmp:
+        _build(tmp, args.chunks)
+        stats = rag_engine.collection_stats
+
+        def lookup_uncached():
+            collection = rag_engine._get_collection()
+            collection.count()
+
+        def retrieve_uncached():
+            stats.invalidate()
+            rag_engine.retrieve("battery drains after update", top_k=5)
+
+        def retrieve_cached():
+            rag_engine.retrieve("battery drains after update", top_k=5)
+
+        retrieve_cached()  # Load HNSW index and BM25 before timing
+        rows = [
+            ("handle + count, per call", _time(lookup_uncached, args.queries)),
+            ("handle + count, cached", _time(stats.get, args.queries)),
+            ("retrieve, uncached", _time(retrieve_uncached, args.queries)),
+            ("retrieve, cached", _time(retrieve_cached, args.queries)),
+        ]
+        print(f"Collection: {args.chunks} chunks, {DIMS} dims; {args.queries} queries")
+        print(f"{'':<26} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, ms in rows:
+            p95 = sorted(ms)[int(0.95 * (len(ms) - 1))]
+            print(f"{label:<26} {statistics.mean(ms):>8.3f} {statistics.median(ms):>8.3f} {p95:>8.3f}")
+        saved = statistics.mean(rows[2][1]) - statistics.mean(rows[3][1])
+        print(f"Saved per query: {saved:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
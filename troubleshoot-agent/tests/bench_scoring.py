@@ -0,0 +1,82 @@
+"""
+Post-retrieval scoring cost per query vs candidate count: the old per-hit loop (domain lookup, date parsing
+with a datetime import per hit, token estimate) vs features precomputed at ingestion and applied with NumPy.
+
+Run from project root: python tests/bench_scoring.py [--candidates 10,50,200,1000] [--repeat 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import rag_engine
+
+
+def _legacy_recent(updated_str):
+    if not updated_str:
+        return False
+    try:
+        from datetime import datetime, timedelta
+        return datetime.strptime(updated_str[:10], "%Y-%m-%d") >= datetime.utcnow() - timedelta(days=180)
+    except Exception:
+        return False
+
+
+def legacy_scores(sims: list[float], texts: list[str], metas: list[dict]) -> list[float]:
+    out = []
+    for sim, doc, meta in zip(sims, texts, metas):
+        if rag_engine._source_domain(meta.get("source_file", "")) == "support.apple.com":
+            sim += rag_engine.BOOST_SUPPORT_APPLE
+        if _legacy_recent(rag_engine._parse_updated_date(meta)):
+            sim += rag_engine.BOOST_RECENT_6MO
+        if rag_engine._approx_tokens(doc) < rag_engine.MIN_TOKENS_FOR_PENALTY:
+            sim -= rag_engine.PENALTY_SHORT_CHUNK
+        out.append(max(0.0, min(1.0, sim)))
+    return out
+
+
+def vectorized_scores(sims: np.ndarray, texts: list[str], metas: list[dict]) -> np.ndarray:
+    return rag_engine._boosted_scores(sims, *rag_engine._feature_arrays(texts, metas))
+
+
+def _candidates(n: int) -> tuple[list[float], list[str], list[dict]]:
+    rng = np.random.default_rng(0)
+    texts = ["Open Settings > Battery and check which apps use power. " * int(rng.integers(1, 12)) for _ in range(n)]
+    metas = []
+    for i in range(n):
+        meta = {"source_file": "https://support.apple.com/en-us/1" if i % 3 == 0 else f"doc{i}.md",
+                "updated": f"20{int(rng.integers(18, 26))}-0{int(rng.integers(1, 9))}-15"}
+        meta.update(rag_engine._chunk_features(texts[i], meta))
+        metas.append(meta)
+    return rng.random(n).tolist(), texts, metas
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--candidates", default="10,50,200,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'loop ms':>9} {'numpy ms':>9} {'speed-up':>9}")
+    for n in [int(c) for c in args.candidates.split(",")]:
+        sims, texts, metas = _candidates(n)
+        arr = np.asarray(sims)
+        assert np.allclose(legacy_scores(sims, texts, metas), vectorized_scores(arr, texts, metas))
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy_scores(sims, texts, metas)
+        loop_ms = (time.perf_counter() - start) * 1000.0 / args.repeat
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            vectorized_scores(arr, texts, metas)
+        numpy_ms = (time.perf_counter() - start) * 1000.0 / args.repeat
+        print(f"{n:>10} {loop_ms:>9.3f} {numpy_ms:>9.3f} {loop_ms / numpy_ms:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
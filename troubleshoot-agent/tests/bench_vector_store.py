@@ -0,0 +1,123 @@
+"""
+Vector store backends on the same synthetic corpus: Chroma (SQLite + HNSW) vs FlatStore (mmap float16,
+exact scan of a float32 copy; flat-f16 scans the float16 map directly) vs FlatStore with IVF lists vs
+FlatStore scanning int8 / binary codes (flat-bin-512: binary codes of the first 512 dims) and rescoring the
+shortlist. Reports build time, single-thread QPS, p50/p99 query latency, resident memory of the querying
+process, the in-memory scan structure ("scan MB") and recall@k against an exact float32 search.
+
+Vectors are clustered Gaussians (a stand-in for real embeddings; no API calls). Their dims are all equally
+informative, so truncation recall here is a floor: Matryoshka-trained models (text-embedding-3) front-load it. Each backend is built,
+then queried from a fresh child process so RSS covers only that store.
+
+Run from project root: python tests/bench_vector_store.py [--chunks 20000] [--dims 1536] [--queries 500] [--k 50]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+BACKENDS = {
+    "chromadb": {},
+    "flat": {"ivf_lists": 0},
+    "flat-f16": {"ivf_lists": 0, "scan_float32": False},
+    "flat+ivf": {"ivf_lists": 128, "ivf_probe": 8},
+    "flat-int8": {"ivf_lists": 0, "quantization": "int8"},
+    "flat-bin": {"ivf_lists": 0, "quantization": "binary"},
+    "flat-bin-512": {"ivf_lists": 0, "quantization": "binary", "quant_dims": 512},
+}
+
+
+def _corpus(chunks: int, dims: int, queries: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(8, chunks // 200), dims)).astype(np.float32)
+    data = centers[rng.integers(0, len(centers), chunks)] + 0.5 * rng.standard_normal((chunks, dims)).astype(np.float32)
+    qs = centers[rng.integers(0, len(centers), queries)] + 0.5 * rng.standard_normal((queries, dims)).astype(np.float32)
+    return data, qs
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _open(backend: str, path: str):
+    from modules import vector_store
+    if backend == "chromadb":
+        import chromadb
+        from chromadb.config import Settings
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        return vector_store.ChromaStore(client, "bench")
+    return vector_store.FlatStore(path, **BACKENDS[backend])
+
+
+def child(args) -> int:
+    """Build (--build) or query the store in this process; prints one JSON line."""
+    data, qs = _corpus(args.chunks, args.dims, args.queries)
+    base_rss = _rss_mb()
+    store = _open(args.child, args.path)
+    if args.build:
+        start = time.perf_counter()
+        for i in range(0, len(data), 2000):
+            ids = [f"doc{j // 20}.md#{j}" for j in range(i, min(i + 2000, len(data)))]
+            store.upsert(ids, data[i:i + len(ids)].tolist(), [f"chunk {j}" for j in range(i, i + len(ids))],
+                         [{"source_file": f"doc{j // 20}.md"} for j in range(i, i + len(ids))])
+        print(json.dumps({"build_s": time.perf_counter() - start}))
+        return 0
+    store.query(query_embeddings=[qs[0].tolist()], n_results=args.k, include=["distances"])  # Load/train before timing
+    ms, found = [], []
+    start = time.perf_counter()
+    for q in qs:
+        t = time.perf_counter()
+        res = store.query(query_embeddings=[q.tolist()], n_results=args.k, include=["documents", "metadatas", "distances"])
+        ms.append((time.perf_counter() - t) * 1000.0)
+        found.append([int(cid.split("#")[1]) for cid in res["ids"][0]])
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"qps": len(qs) / elapsed, "p50": float(np.percentile(ms, 50)), "p99": float(np.percentile(ms, 99)),
+                      "rss_mb": _rss_mb() - base_rss, "found": found,
+                      "scan_mb": store.stats()["scan_bytes"] / 2**20 if hasattr(store, "stats") else float("nan")}))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=50, help="Results per query (retrieve asks for RETRIEVE_CANDIDATES)")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--build", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    data, qs = _corpus(args.chunks, args.dims, args.queries)
+    unit = data / np.linalg.norm(data, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(unit @ (q / np.linalg.norm(q))))[:args.k].tolist()) for q in qs]
+    common = [sys.executable, __file__, "--chunks", str(args.chunks), "--dims", str(args.dims),
+              "--queries", str(args.queries), "--k", str(args.k)]
+    print(f"{args.chunks} chunks x {args.dims} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<13} {'build s':>8} {'QPS':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'scan MB':>8} {'recall':>7}")
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            run = lambda *extra: json.loads(subprocess.run(common + ["--child", backend, "--path", tmp, *extra],
+                                                           check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1])
+            build = run("--build")
+            res = run()
+        recall = np.mean([len(set(f) & t) / args.k for f, t in zip(res["found"], truth)])
+        print(f"{backend:<13} {build['build_s']:>8.1f} {res['qps']:>8.0f} {res['p50']:>8.2f} {res['p99']:>8.2f} "
+              f"{res['rss_mb']:>8.0f} {res['scan_mb']:>8.1f} {recall:>7.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,7 +8,6 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from config import RAG_SCORE_THRESHOLD
 from modules import context_manager, llm_agent, rag_engine, web_search
 
 
@@ -16,9 +15,9 @@ def run_turn(ctx: context_manager.ConversationContext, user_msg: str) -> str:
     """One conversation turn: RAG → web (if needed) → LLM; return ARIA response text."""
     rag_results = rag_engine.retrieve(user_msg, top_k=5)
     rag_results = rag_engine.rerank_results(rag_results, user_msg)
-    rag_scores = [r["relevance_score"] for r in rag_results]
+    rag_scores, threshold = rag_engine.gating_scores(rag_results)
     web_results = []
-    if web_search.is_web_search_needed(rag_scores, threshold=RAG_SCORE_THRESHOLD):
+    if web_search.is_web_search_needed(rag_scores, threshold=threshold):
         web_results = web_search.search(user_msg, top_k=3)
     history = ctx.get_history()
     out = llm_agent.run(
@@ -0,0 +1,35 @@
+"""Tests for the semantic answer cache."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.answer_cache import AnswerCache, doc_set_key
+
+
+def test_near_duplicate_question_with_same_docs_hits():
+    cache = AnswerCache(max_distance=0.05)
+    cache.store([1.0, 0.0, 0.0], "k", "Open Settings.", ["battery.md"], "QUJD")
+    hit = cache.lookup([0.99, 0.05, 0.0], "k")
+    assert hit is not None and hit.text == "Open Settings." and hit.audio_base64 == "QUJD"
+    assert cache.lookup([0.0, 1.0, 0.0], "k") is None  # different question
+    assert cache.lookup([1.0, 0.0, 0.0], "other-docs") is None  # same question, different retrieval
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_ttl_eviction_and_invalidate():
+    cache = AnswerCache(max_entries=1, ttl_seconds=0)
+    cache.store([1.0, 0.0], "k", "a", [], "")
+    cache.store([0.0, 1.0], "k", "b", [], "")
+    assert cache.stats()["entries"] == 1
+    cache.ttl_seconds = 60
+    assert cache.lookup([0.0, 1.0], "k").text == "b"
+    cache.invalidate()
+    assert cache.lookup([0.0, 1.0], "k") is None
+
+
+def test_doc_set_key_ignores_order():
+    a = {"content": "x", "source_file": "a.md", "metadata": {"chunk_index": 0}}
+    b = {"content": "y", "source_file": "b.md", "metadata": {"chunk_index": 3}}
+    assert doc_set_key([a, b]) == doc_set_key([b, a])
+    assert doc_set_key([a]) != doc_set_key([b])
@@ -0,0 +1,38 @@
+"""Tests for the content-addressed TTS audio cache."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.audio_cache import AudioCache, audio_key
+
+
+def test_key_covers_text_voice_speed_and_model():
+    base = audio_key("Hello", "nova", 0.95, "tts-1-hd")
+    assert base == audio_key("Hello", "nova", 0.95, "tts-1-hd")
+    assert len({base, audio_key("Hello!", "nova", 0.95, "tts-1-hd"), audio_key("Hello", "alloy", 0.95, "tts-1-hd"),
+                audio_key("Hello", "nova", 1.0, "tts-1-hd"), audio_key("Hello", "nova", 0.95, "tts-1")}) == 5
+
+
+def test_roundtrip_and_persistence(tmp_path):
+    cache = AudioCache(directory=str(tmp_path), max_bytes=1000)
+    assert cache.get("a" * 64) is None
+    cache.put("a" * 64, b"ID3-audio")
+    assert cache.get("a" * 64) == b"ID3-audio"
+    reopened = AudioCache(directory=str(tmp_path), max_bytes=1000)
+    assert reopened.get("a" * 64) == b"ID3-audio"
+    assert reopened.stats()["bytes"] == len(b"ID3-audio")
+
+
+def test_size_bound_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(directory=str(tmp_path), max_bytes=250)
+    for name in "abc":
+        cache.put(name * 64, name.encode() * 100)
+    # 300 bytes > 250: "a" evicted
+    assert cache.get("a" * 64) is None
+    cache.get("b" * 64)  # "b" becomes most recently used
+    cache.put("d" * 64, b"d" * 100)
+    assert cache.get("c" * 64) is None
+    assert cache.get("b" * 64) == b"b" * 100
+    assert cache.stats()["evictions"] == 2
+    assert len(list(tmp_path.glob("*/*.mp3"))) == 2
@@ -0,0 +1,124 @@
+"""Tests for pluggable embedding backends and per-backend stores."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import embedding_backends, rag_engine
+from modules.embedding_backends import EmbeddingBackend, LocalOnnxBackend
+
+
+class _Encoding:
+    def __init__(self, ids):
+        self.ids = ids
+        self.attention_mask = [1 if i else 0 for i in ids]
+
+
+class _Tokenizer:
+    """Word -> id 1..n; pads each batch to its longest text with id 0 (like tokenizers' dynamic padding)."""
+
+    def encode_batch(self, texts):
+        rows = [[len(w) for w in t.split()] for t in texts]
+        width = max(len(r) for r in rows)
+        return [_Encoding(r + [0] * (width - len(r))) for r in rows]
+
+
+class _Session:
+    def __init__(self):
+        self.batches = []
+
+    def run(self, _, feed):
+        self.batches.append(feed["input_ids"].shape)
+        ids = feed["input_ids"].astype(np.float32)
+        # Token vector = [id, 1]; padding tokens get a huge value that pooling must ignore
+        hidden = np.stack([ids, np.ones_like(ids)], axis=-1)
+        hidden[feed["attention_mask"] == 0] = 1000.0
+        return [hidden]
+
+
+def test_local_backend_batches_and_mean_pools_over_attention_mask():
+    backend = LocalOnnxBackend(model_dir="/models/minilm-int8", batch_size=2)
+    backend._tokenizer, backend._session = _Tokenizer(), _Session()
+    vectors = backend.embed(["abc", "abc defgh", "x"])
+    assert backend.model == "local:minilm-int8"
+    assert backend._session.batches == [(2, 2), (1, 1)]
+    # "abc defgh": mean of [3, 1] and [5, 1] = [4, 1], normalized; the pad in "abc" is ignored
+    assert np.allclose(vectors[1], np.array([4.0, 1.0]) / np.hypot(4.0, 1.0))
+    assert np.allclose(vectors[0], np.array([3.0, 1.0]) / np.hypot(3.0, 1.0))
+    assert all(abs(np.linalg.norm(v) - 1.0) < 1e-6 for v in vectors)
+
+
+def test_local_backend_fetches_the_default_model_from_the_hub(monkeypatch):
+    import huggingface_hub
+    fetched = []
+    monkeypatch.setattr(huggingface_hub, "hf_hub_download", lambda repo, name: fetched.append((repo, name)) or f"/hub/{name}")
+    model_path, tokenizer_path = LocalOnnxBackend(model_dir="")._model_files()
+    assert fetched == [("sentence-transformers/all-MiniLM-L6-v2", "onnx/model.onnx"),
+                       ("sentence-transformers/all-MiniLM-L6-v2", "tokenizer.json")]
+    assert (model_path, tokenizer_path) == (Path("/hub/onnx/model.onnx"), Path("/hub/tokenizer.json"))
+    assert LocalOnnxBackend(model_dir="/models/m")._model_files() == (Path("/models/m/model.onnx"), Path("/models/m/tokenizer.json"))
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="EMBEDDING_BACKEND"):
+        embedding_backends.create_backend("word2vec")
+
+
+def test_openai_backend_leaves_retries_to_callers_that_retry(monkeypatch):
+    from types import SimpleNamespace
+    requested = []
+
+    def get_openai(max_retries=None):
+        requested.append(max_retries)
+        return SimpleNamespace(embeddings=SimpleNamespace(
+            create=lambda input, model: SimpleNamespace(data=[SimpleNamespace(embedding=[1.0]) for _ in input])))
+    monkeypatch.setattr(embedding_backends.clients, "get_openai", get_openai)
+    backend = embedding_backends.OpenAIBackend()
+    backend.embed(["query"])
+    with embedding_backends.caller_retries():  # EmbeddingPipeline batches during ingestion
+        backend.embed(["chunk"])
+    backend.embed(["query"])
+    assert requested == [None, 0, None]
+
+
+class _FakeLocal(EmbeddingBackend):
+    name = "local"
+    model = "local:fake-mini"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float("wifi" in t), float("battery" in t), 1.0] for t in texts]
+
+
+def test_non_default_backend_gets_its_own_stores(monkeypatch, tmp_path):
+    import chromadb
+    from chromadb.config import Settings
+    from modules.embedding_cache import EmbeddingCache
+    backend = _FakeLocal()
+    monkeypatch.setattr(embedding_backends, "_backend", backend)
+    monkeypatch.setattr(rag_engine.embedding_cache, "get_cache", lambda: cache)
+    cache = EmbeddingCache(persist_path=None)
+    monkeypatch.setattr(rag_engine, "_chroma_client",
+                        chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False)))
+    monkeypatch.setattr(rag_engine, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(rag_engine, "LEXICAL_INDEX_PATH", str(tmp_path / "bm25.json"))
+    monkeypatch.setattr(rag_engine, "_lexical", None)
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "wifi.md").write_text("Forget the wifi network and join it again.", encoding="utf-8")
+    (docs / "battery.md").write_text("Battery drains fast: turn on Low Power Mode.", encoding="utf-8")
+    result = rag_engine.ingest_directory(str(docs), workers=1)
+    assert result["embedded"] == 2 and len(backend.calls) == 1
+
+    assert rag_engine._get_collection().name == "troubleshoot_docs_local_fake_mini"
+    assert (tmp_path / "manifest_local_fake_mini.json").exists() and (tmp_path / "bm25_local_fake_mini.json").exists()
+    assert rag_engine.retrieve("my wifi keeps dropping", top_k=1)[0]["source_file"] == "wifi.md"
+
+    assert rag_engine.warm_up_embeddings() >= 0 and backend.calls[-1] == ["warm up"]
@@ -0,0 +1,77 @@
+"""Tests for the bulk embedding pipeline (batching, concurrency, retry/backoff)."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.embedding_pipeline import EmbeddingPipeline, RateLimiter, batch_by_tokens
+
+
+class _Status(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_batch_by_tokens_respects_budgets():
+    texts = ["x" * 400] * 5  # 100 tokens each
+    assert list(batch_by_tokens(texts, max_tokens=250, max_inputs=10)) == [[0, 1], [2, 3], [4]]
+    assert list(batch_by_tokens(texts, max_tokens=10_000, max_inputs=3)) == [[0, 1, 2], [3, 4]]
+    assert list(batch_by_tokens(["x" * 4000], max_tokens=10)) == [[0]]  # oversized input still sent alone
+
+
+def test_pipeline_packs_across_files_and_runs_batches_concurrently():
+    active, peak, stored = [0], [0], []
+    lock = threading.Lock()
+
+    def embed(texts):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return [[float(len(t))] for t in texts]
+
+    pipeline = EmbeddingPipeline(embed, on_batch=lambda p, v: stored.extend(zip(p, v)),
+                                 max_batch_tokens=50, concurrency=4, limiter=RateLimiter(0, 0))
+    for f in range(4):
+        for c in range(5):
+            pipeline.submit("y" * 40, (f"doc{f}", c))  # 10 tokens each -> 5 per batch
+    stats = pipeline.close()
+    assert stats["chunks"] == 20 and stats["batches"] == 4
+    assert peak[0] > 1
+    assert sorted(p for p, _ in stored) == [(f"doc{f}", c) for f in range(4) for c in range(5)]
+
+
+def test_pipeline_retries_rate_limits_and_reports_permanent_failures():
+    attempts = []
+
+    def embed(texts):
+        attempts.append(texts[0])
+        if texts[0] == "flaky" and attempts.count("flaky") < 3:
+            raise _Status(429)
+        if texts[0] == "bad":
+            raise _Status(400)
+        return [[1.0] for _ in texts]
+
+    stored, failed = [], []
+    pipeline = EmbeddingPipeline(embed, on_batch=lambda p, v: stored.extend(p), on_error=lambda p, e: failed.extend(p),
+                                 max_batch_inputs=1, backoff_seconds=0.01, limiter=RateLimiter(0, 0))
+    pipeline.submit("flaky", "a")
+    pipeline.submit("bad", "b")
+    stats = pipeline.close()
+    assert stored == ["a"] and failed == ["b"]
+    assert stats["retries"] == 2 and stats["failed_batches"] == 1
+    assert attempts.count("bad") == 1  # 4xx is not retried
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=0)  # 10/s, bucket of 600
+    limiter._requests = 0.0
+    start = time.perf_counter()
+    for _ in range(3):
+        limiter.acquire(1)
+    assert time.perf_counter() - start >= 0.25
@@ -0,0 +1,43 @@
+"""Tests for the BM25 lexical index."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.lexical_index import LexicalIndex, tokenize
+
+DOCS = {
+    "restore#1": ("If iTunes shows Error 4013 while restoring, try another cable and update your Mac.", {"category": "general"}),
+    "faceid#1": ("Face ID not working? Make sure nothing covers the TrueDepth camera.", {"category": "screen"}),
+    "battery#1": ("Battery drains fast: check Settings > Battery and turn on Low Power Mode.", {"category": "battery"}),
+}
+
+
+def _index(path=None) -> LexicalIndex:
+    index = LexicalIndex(path=path)
+    index.upsert(list(DOCS), [d for d, _ in DOCS.values()], [m for _, m in DOCS.values()])
+    return index
+
+
+def test_tokenize_keeps_numbers_and_drops_stopwords():
+    assert tokenize("The iPhone shows Error 4013!") == ["iphone", "shows", "error", "4013"]
+
+
+def test_exact_terms_rank_first_and_filter_applies():
+    index = _index()
+    assert index.search("error 4013", top_k=3)[0][0] == "restore#1"
+    assert index.search("face id", top_k=3)[0][0] == "faceid#1"
+    assert index.search("error 4013", top_k=3, where={"category": "battery"}) == []
+    assert index.search("zzz unknown", top_k=3) == []
+
+
+def test_delete_update_and_persistence(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    index = _index(path)
+    index.delete(["restore#1"])
+    index.update_metadata(["battery#1"], [{"category": "power"}])
+    index.save()
+    reloaded = LexicalIndex(path=path)
+    assert reloaded.load() and len(reloaded) == 2
+    assert reloaded.search("4013", top_k=3) == []
+    assert reloaded.get("battery#1")[1] == {"category": "power"}
@@ -0,0 +1,310 @@
+"""Tests for the FastAPI chat orchestration (SDK stages replaced with fakes)."""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main
+from modules import answer_cache, llm_agent, metrics, rag_engine, voice_tts, warmup, web_search
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """Blocking fakes for every SDK-backed stage; each sleeps like a slow network call."""
+    monkeypatch.setattr(rag_engine, "retrieve", lambda query, top_k=5, filter_metadata=None: (
+        time.sleep(0.05) or [{"content": "Check Settings > Battery.", "source_file": "battery.md", "relevance_score": 0.9}]
+    ))
+    monkeypatch.setattr(rag_engine, "rerank_results", lambda results, query: results)
+    monkeypatch.setattr(web_search, "search", lambda query, top_k=3: [])
+    monkeypatch.setattr(llm_agent, "run", lambda **kw: (
+        time.sleep(0.2) or {"text": "Open Settings, then Battery.", "sources": ["battery.md"], "step_number": 1, "has_next_step": False}
+    ))
+    monkeypatch.setattr(voice_tts, "synthesize", lambda text, **kw: b"ID3")
+    monkeypatch.setattr(rag_engine, "embed_query", lambda query: [1.0, 0.0, 0.0] if "battery" in query.lower() else [0.0, 1.0, 0.0])
+
+    async def stream_run(**kw):
+        for delta in ("Open Settings, ", "then Battery."):
+            yield delta
+    monkeypatch.setattr(llm_agent, "stream_run", stream_run)
+    monkeypatch.setattr(warmup, "warmup", warmup.Warmup(components=[]))
+    web_search.predictor.reset()
+    metrics.reset()
+    answer_cache.answer_cache.invalidate()
+    main.sessions.clear()
+    yield
+    main.sessions.clear()
+    answer_cache.answer_cache.invalidate()
+
+
+async def _post_chats(n: int) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/api/chat", json={"session_id": f"s{i}", "message": "battery drains fast"}) for i in range(n)
+        ))
+
+
+def test_chat_returns_text_audio_and_steps(fake_stages):
+    resp = asyncio.run(_post_chats(1))[0]
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["text"] == "Open Settings, then Battery."
+    assert data["audio_base64"]
+    assert data["sources"] == ["battery.md"]
+    assert any(s["phase"] == "think" for s in data["steps"])
+    assert data["stages"]["critical_path"] == ["rewrite", "retrieve", "rerank"]
+    assert data["stages"]["stages"]["web_speculative"]["status"] == "skipped"
+
+
+def test_predicted_web_need_searches_speculatively(fake_stages, monkeypatch):
+    """A query the KB is unlikely to cover gets web context in the first LLM call (no retry)."""
+    monkeypatch.setattr(web_search, "search", lambda query, top_k=3: [{"title": "Apple", "url": "https://support.apple.com/x", "content": "Fix"}])
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/chat", json={"session_id": "spec", "message": "iPhone shows error 4013 on iOS 18"})
+    data = asyncio.run(post()).json()
+    assert data["web_need"] >= 0.7
+    assert data["stages"]["stages"]["web_speculative"]["deps"] == ["rewrite"]  # Not waiting for retrieval
+    counters = metrics.snapshot()["counters"]
+    assert counters["web_speculative_used"] == 1
+    assert counters["web_proactive_answered"] == 1
+    assert "web_retry" not in counters
+
+
+def test_concurrent_chats_do_not_serialize(fake_stages):
+    """Eight chats of ~0.25s each must overlap instead of taking ~2s end to end."""
+    start = time.perf_counter()
+    responses = asyncio.run(_post_chats(8))
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < 1.0
+
+
+def test_repeated_first_turn_is_served_from_answer_cache(fake_stages, monkeypatch):
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post(session_id: str, message: str):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/api/chat", json={"session_id": session_id, "message": message})).json()
+
+    first = asyncio.run(post("a", "Battery drains fast"))
+    assert first["answer_cache"] == "miss"
+    calls = []
+    real_run = llm_agent.run
+    monkeypatch.setattr(llm_agent, "run", lambda **kw: calls.append(kw) or real_run(**kw))
+    second = asyncio.run(post("b", "battery drains fast!"))
+    assert calls == []
+    assert second["answer_cache"] == "hit"
+    assert (second["text"], second["sources"], second["audio_base64"]) == (first["text"], first["sources"], first["audio_base64"])
+    # Follow-up turns are never cached
+    assert asyncio.run(post("b", "battery drains fast"))["answer_cache"] == "skip"
+
+
+def test_cache_hit_counts_its_speculative_search_as_wasted(fake_stages, monkeypatch):
+    monkeypatch.setattr(rag_engine, "retrieve", lambda query, top_k=5, filter_metadata=None: [
+        {"content": "Check Settings > Battery.", "source_file": "battery.md", "relevance_score": 0.3}])  # Weak: speculate
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post(session_id: str):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/api/chat", json={"session_id": session_id, "message": "battery drains fast"})).json()
+    assert asyncio.run(post("a"))["answer_cache"] == "miss"
+    assert asyncio.run(post("b"))["answer_cache"] == "hit"
+    counters = metrics.snapshot()["counters"]
+    assert counters["web_speculative_started"] == 2
+    assert counters["web_speculative_used"] == 1 and counters["web_speculative_wasted"] == 1
+
+
+def test_ingestion_invalidates_answer_cache():
+    answer_cache.answer_cache.store([1.0, 0.0], "docs", "cached", [], "")
+    rag_engine._notify_ingested()
+    assert answer_cache.answer_cache.stats()["entries"] == 0
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_emits_steps_then_tokens_then_sources(fake_stages):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as client:
+        resp = client.post("/api/chat/stream", json={"session_id": "stream", "message": "battery drains fast"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(resp.text)
+    names = [e for e, _ in events]
+    assert names[0] == "step"
+    assert names.index("token") < names.index("sources") < names.index("done")
+    tokens = "".join(d["text"] for e, d in events if e == "token")
+    done = events[-1][1]
+    assert tokens == done["text"] == "Open Settings, then Battery."
+    assert done["sources"] == ["battery.md"]
+    segments = [d for e, d in events if e == "audio_segment"]
+    assert [s["index"] for s in segments] == list(range(len(segments))) and segments
+    assert "first_audio_seconds" in done["timings"]
+
+
+def test_stream_broken_off_midway_is_reset_and_answered_in_one_call(fake_stages, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def stream_run(**kw):
+        yield "Open Settings, then "
+        raise llm_agent.StreamInterrupted("connection reset")
+    monkeypatch.setattr(llm_agent, "stream_run", stream_run)
+    with TestClient(main.app) as client:
+        resp = client.post("/api/chat/stream", json={"session_id": "broken", "message": "battery drains fast"})
+    events = _parse_sse(resp.text)
+    names = [e for e, _ in events]
+    assert names.index("token") < names.index("reset") < len(names) - 1 - names[::-1].index("token")
+    after_reset = "".join(d["text"] for e, d in events[names.index("reset"):] if e == "token")
+    assert after_reset == events[-1][1]["text"] == "Open Settings, then Battery."  # run()'s answer, not the fragment
+    assert metrics.snapshot()["counters"]["llm_stream_interrupted"] == 1
+
+
+def test_retrieval_is_prefiltered_by_query_category(fake_stages, monkeypatch):
+    filters = []
+
+    def retrieve(query, top_k=5, filter_metadata=None):
+        filters.append(filter_metadata)
+        return [] if filter_metadata else [{"content": "General tips.", "source_file": "general.md", "relevance_score": 0.9}]
+    monkeypatch.setattr(rag_engine, "retrieve", retrieve)
+    data = asyncio.run(_post_chats(1))[0].json()
+    # "battery drains fast" -> category filter first, then the unfiltered fallback when it finds nothing
+    assert filters == [{"category": {"$in": ["battery", "general"]}}, None]
+    assert data["sources"] == ["battery.md"]
+
+
+def test_category_follows_topic_switch_and_weak_matches_merge_unfiltered(fake_stages, monkeypatch):
+    filters = []
+
+    def retrieve(query, top_k=5, filter_metadata=None):
+        filters.append(filter_metadata)
+        if filter_metadata:
+            return [{"content": "Forget the network.", "source_file": "wifi.md", "relevance_score": 0.3, "chunk_id": "w#1"}]
+        return [{"content": "Reset network settings.", "source_file": "upload.pdf", "relevance_score": 0.8, "chunk_id": "u#1"},
+                {"content": "Forget the network.", "source_file": "wifi.md", "relevance_score": 0.3, "chunk_id": "w#1"}]
+    monkeypatch.setattr(rag_engine, "retrieve", retrieve)
+    sources = []
+    monkeypatch.setattr(llm_agent, "run", lambda **kw: sources.append([r["source_file"] for r in kw["rag_context"]]) or {
+        "text": "Try this.", "sources": [], "step_number": 1, "has_next_step": False})
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post(messages):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.post("/api/chat", json={"session_id": "sw", "message": m})).json() for m in messages]
+    asyncio.run(post(["My battery drains fast", "Now my wifi keeps dropping"]))
+    # The second turn filters on the issue it names, not the session's first one
+    assert filters[-2:] == [{"category": {"$in": ["wifi", "general"]}}, None]
+    assert sources[-1] == ["upload.pdf", "wifi.md"]  # Weak filtered match: merged with the unfiltered search
+    assert metrics.snapshot()["counters"]["retrieve_category_fallback"] == 2
+
+
+def test_readiness_gated_on_warm_up_with_per_component_times(fake_stages, monkeypatch):
+    import threading
+    from fastapi.testclient import TestClient
+    release = threading.Event()
+    calls = []
+
+    def fail():
+        raise RuntimeError("sentence_transformers not installed")
+    state = warmup.Warmup(components=[
+        ("vector_store", lambda: calls.append("vector_store") or release.wait(5)),
+        ("embedding", lambda: (_ for _ in ()).throw(warmup.Skip("OPENAI_API_KEY not set"))),
+        ("retrieve", lambda: calls.append(rag_engine.retrieve("warm up", top_k=1))),
+        ("reranker", fail),
+    ])
+    monkeypatch.setattr(warmup, "warmup", state)
+    with TestClient(main.app) as client:
+        pending = client.get("/api/ready")
+        assert pending.status_code == 503 and pending.json()["components"]["vector_store"]["status"] == "pending"
+        release.set()
+        for _ in range(100):
+            if state.ready:
+                break
+            time.sleep(0.02)
+        resp = client.get("/api/ready")
+    assert resp.status_code == 200
+    body = resp.json()
+    comps = body["components"]
+    assert list(comps) == ["vector_store", "embedding", "retrieve", "reranker"]
+    assert comps["vector_store"]["status"] == "ok" and comps["vector_store"]["seconds"] >= 0
+    assert comps["embedding"] == {"status": "skipped", "reason": "OPENAI_API_KEY not set", "seconds": comps["embedding"]["seconds"]}
+    assert comps["reranker"]["status"] == "failed" and body["degraded"]
+    assert calls[0] == "vector_store" and calls[1][0]["source_file"] == "battery.md"
+
+
+def test_web_search_gated_on_calibrated_rerank_score(fake_stages, monkeypatch):
+    searches = []
+    monkeypatch.setattr(web_search, "search", lambda query, top_k=3: searches.append(query) or [])
+    # High cosine score but the reranker says the chunk does not answer the question → web search
+    monkeypatch.setattr(rag_engine, "rerank_results", lambda results, query: [
+        {**r, "rerank_logit": -4.0, "rerank_score": rag_engine.calibrate_rerank_score(-4.0)} for r in results])
+    asyncio.run(_post_chats(1))
+    assert searches
+    # Low cosine score (0.3 < RAG_SCORE_THRESHOLD) but a confident reranker → web results not used; the
+    # speculative search launched from the vector score alone is cancelled
+    metrics.reset()
+    main.sessions.clear()
+    answer_cache.answer_cache.invalidate()
+    monkeypatch.setattr(rag_engine, "retrieve", lambda query, top_k=5, filter_metadata=None: [
+        {"content": "Check Settings > Battery.", "source_file": "battery.md", "relevance_score": 0.3}])
+    monkeypatch.setattr(rag_engine, "rerank_results", lambda results, query: [
+        {**r, "rerank_logit": 5.0, "rerank_score": rag_engine.calibrate_rerank_score(5.0)} for r in results])
+    monkeypatch.setattr(web_search.predictor, "predict", lambda *a, **kw: 0.0)
+    resp = asyncio.run(_post_chats(1))[0].json()
+    assert resp["sources"] == ["battery.md"] and "web" not in resp["stages"]["critical_path"]
+    assert metrics.snapshot()["counters"].get("web_speculative_used", 0) == 0
+
+
+def test_follow_up_turn_retrieves_and_searches_with_the_session_issue(fake_stages, monkeypatch):
+    queries, searches = [], []
+    monkeypatch.setattr(rag_engine, "retrieve", lambda query, top_k=5, filter_metadata=None: queries.append(query) or [
+        {"content": "Check Settings > Battery.", "source_file": "battery.md", "relevance_score": 0.3}])
+    monkeypatch.setattr(web_search, "search", lambda query, top_k=3: searches.append(query) or [])
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post(messages):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.post("/api/chat", json={"session_id": "f", "message": m})).json() for m in messages]
+    first, follow_up = asyncio.run(post(["My iPhone battery drains fast", "I tried that fix, what next?"]))
+    assert first["retrieval_query"] == "My iPhone battery drains fast"
+    assert follow_up["retrieval_query"] == "My iPhone battery drains fast I tried that fix, what next?"
+    assert queries[-1] == follow_up["retrieval_query"] and searches[-1] == follow_up["retrieval_query"]
+    assert metrics.snapshot()["counters"]["query_rewritten"] == 1
+
+
+def test_on_topic_turns_reuse_the_session_working_set(fake_stages, monkeypatch):
+    import numpy as np
+    retrieved, reranked = [], []
+    monkeypatch.setattr(rag_engine, "retrieve", lambda query, top_k=5, filter_metadata=None: retrieved.append(query) or [
+        {"content": "Check Settings > Battery.", "source_file": "battery.md", "relevance_score": 0.9, "chunk_id": "battery.md#1"}])
+    monkeypatch.setattr(rag_engine, "rerank_results", lambda results, query: reranked.append(
+        (query, any("rerank_score" in r for r in results))) or [
+        {**r, "rerank_logit": 3.0, "rerank_score": rag_engine.calibrate_rerank_score(3.0)} for r in results])
+    monkeypatch.setattr(rag_engine, "chunk_embeddings", lambda ids: np.ones((len(ids), 3), dtype=np.float32))
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def post(messages):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.post("/api/chat", json={"session_id": "ws", "message": m})).json() for m in messages]
+    out = asyncio.run(post(["My battery drains fast", "The battery still drains fast", "Battery is draining overnight too"]))
+    assert len(retrieved) == 1 and all(r["sources"] == ["battery.md"] for r in out)
+    # Reused chunks are reranked for each turn's own query, never gated on the first turn's scores
+    assert reranked == [("My battery drains fast", False), ("The battery still drains fast", False),
+                        ("Battery is draining overnight too", False)]
+    assert metrics.snapshot()["counters"]["working_set_hit"] == 2
+    rag_engine._notify_ingested()  # New docs: the next turn retrieves again
+    asyncio.run(post(["Battery drains fast still"]))
+    assert len(retrieved) == 2
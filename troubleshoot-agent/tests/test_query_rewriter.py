@@ -0,0 +1,67 @@
+"""Tests for conversation-aware query rewriting."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import metrics, query_rewriter
+from modules.context_manager import ConversationContext
+
+
+def _session(*turns: str) -> ConversationContext:
+    ctx = ConversationContext("s")
+    for i, text in enumerate(turns):
+        ctx.add_turn("user" if i % 2 == 0 else "assistant", text)
+    ctx.current_issue = ctx.detect_issue_category()
+    return ctx
+
+
+def test_follow_up_detection():
+    for message in ("That didn't work", "what next?", "It shows 87%", "Yeah, Instagram is using 34%", "ok done"):
+        assert query_rewriter.is_follow_up(message), message
+    for message in ("My battery drains fast", "How do I forget a Wi-Fi network", "Face ID stopped recognizing me after I dropped my phone"):
+        assert not query_rewriter.is_follow_up(message), message
+
+
+def test_follow_ups_fold_in_the_turn_that_described_the_issue():
+    ctx = _session("My iPhone battery is draining really fast", "Check Settings > Battery.", "It shows 87%",
+                   "Which apps use the most?")
+    ctx.add_turn("user", "that didn't work")
+    assert query_rewriter.rewrite(ctx, "that didn't work") == "My iPhone battery is draining really fast that didn't work"
+    # The anchor is the turn that opened the issue, not a later turn that happens to mention it
+    ctx = _session("My iPhone won't connect to my home Wi-Fi", "Restart the router.", "I already restarted the router",
+                   "Forget the network and join it again.")
+    assert query_rewriter.rewrite(ctx, "that didn't work either") == "My iPhone won't connect to my home Wi-Fi that didn't work either"
+    # A session that switches topic rewrites against the issue raised last
+    ctx = _session("My iPhone battery drains fast", "Check Settings > Battery.", "my wifi keeps dropping",
+                   "Forget the network and join it again.")
+    assert ctx.detect_issue_category() == "wifi"
+    assert query_rewriter.rewrite(ctx, "that didn't work") == "my wifi keeps dropping that didn't work"
+    # A message that names its own issue, and the first turn of a session, are used as they are
+    assert query_rewriter.rewrite(ctx, "Now my Wi-Fi keeps dropping") == "Now my Wi-Fi keeps dropping"
+    assert query_rewriter.rewrite(ConversationContext("new"), "what next?") == "what next?"
+    # Issue known but never named by the user (e.g. from an image): canned query for the category
+    ctx = _session("Here is a picture", "Your screen shows the display settings.")
+    assert query_rewriter.rewrite(ctx, "what now?") == "iPhone screen display problems what now?"
+    assert query_rewriter.rewrite(_session("hi", "Hello!"), "what now?", backend="off") == "what now?"
+
+
+def test_rewrite_is_memoized_per_turn_and_model_failures_fall_back_to_rules(monkeypatch):
+    calls = []
+
+    def broken(history, message):
+        calls.append(message)
+        raise ConnectionError("model unavailable")
+    monkeypatch.setattr(query_rewriter, "llm_rewrite", broken)
+    monkeypatch.setattr(query_rewriter, "ANTHROPIC_API_KEY", "test")
+    metrics.reset()
+    ctx = _session("AirPods won't pair", "Put them in the case and hold the button.")
+    ctx.add_turn("user", "still nothing")
+    first = query_rewriter.rewrite(ctx, "still nothing", backend="llm")
+    assert first == "AirPods won't pair still nothing"
+    assert query_rewriter.rewrite(ctx, "still nothing", backend="llm") == first and calls == ["still nothing"]
+    assert metrics.snapshot()["counters"]["query_rewrite_cached"] == 1
+    ctx.add_turn("assistant", "Try resetting them.")
+    ctx.add_turn("user", "still nothing")
+    query_rewriter.rewrite(ctx, "still nothing", backend="llm")
+    assert len(calls) == 2 and len(ctx.query_rewrites) == 1  # New turn, new rewrite; older turns dropped
@@ -9,6 +9,7 @@ import pytest
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from modules import rag_engine
+from modules.lexical_index import LexicalIndex
 
 
 @pytest.fixture
@@ -45,3 +46,286 @@ def test_rerank_results():
     out = rag_engine.rerank_results(results, "battery drain")
     assert len(out) == 2
     assert "relevance_score" in out[0]
+
+
+def test_embedding_cache_lru_ttl_and_persistence(tmp_path):
+    from modules.embedding_cache import EmbeddingCache
+    db = str(tmp_path / "emb.sqlite3")
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=3600, persist_path=db)
+    cache.put_many(["Battery draining fast", "wifi drops"], "m", [[1.0, 0.0], [0.0, 1.0]])
+    # Normalized key: case/whitespace variants hit
+    assert cache.get_many(["  battery   DRAINING fast"], "m") == [[1.0, 0.0]]
+    assert cache.get_many(["battery draining fast"], "other-model") == [None]
+    cache.put_many(["storage full"], "m", [[0.5, 0.5]])  # evicts LRU ("wifi drops") from memory
+    assert len(cache._entries) == 2
+    # ...but it is still on disk, and a new process sees everything
+    reopened = EmbeddingCache(max_entries=2, ttl_seconds=3600, persist_path=db)
+    assert reopened.get_many(["wifi drops"], "m") == [[0.0, 1.0]]
+    expired = EmbeddingCache(max_entries=2, ttl_seconds=1e-9, persist_path=db)
+    assert expired.get_many(["storage full"], "m") == [None]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_embedding_cache_file_is_pruned_and_capped(tmp_path):
+    import sqlite3
+    from modules.embedding_cache import EmbeddingCache
+    db = str(tmp_path / "emb.sqlite3")
+    rows = lambda: sqlite3.connect(db).execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    cache = EmbeddingCache(ttl_seconds=3600, persist_path=db, max_rows=5, prune_every=4)
+    cache.put_many([f"chunk {i}" for i in range(3)], "m", [[float(i)] for i in range(3)])
+    assert rows() == 3
+    cache.put_many([f"chunk {i}" for i in range(3, 8)], "m", [[float(i)] for i in range(3, 8)])
+    assert rows() == 5  # Capped: the oldest rows go first
+    assert EmbeddingCache(persist_path=db).get_many(["chunk 7"], "m") == [[7.0]]
+    EmbeddingCache(ttl_seconds=1e-9, persist_path=db)  # Expired rows are deleted on open
+    assert rows() == 0
+
+
+def test_embed_texts_only_calls_api_for_misses(monkeypatch):
+    from modules.embedding_cache import EmbeddingCache
+    monkeypatch.setattr(rag_engine.embedding_cache, "get_cache", lambda: cache)
+    cache = EmbeddingCache(persist_path=None)
+    calls = []
+
+    class FakeEmbeddings:
+        def create(self, input, model):
+            calls.append(list(input))
+            return type("R", (), {"data": [type("D", (), {"embedding": [float(len(t))]}) for t in input]})
+
+    monkeypatch.setattr(rag_engine.embedding_backends, "_backend", rag_engine.embedding_backends.OpenAIBackend())
+    monkeypatch.setattr(rag_engine.embedding_backends.clients, "get_openai", lambda: type("C", (), {"embeddings": FakeEmbeddings()})())
+    assert rag_engine._embed_texts(["abc", "de"]) == [[3.0], [2.0]]
+    assert rag_engine._embed_texts(["ABC", "fghi"]) == [[3.0], [4.0]]
+    assert calls == [["abc", "de"], ["fghi"]]
+
+
+@pytest.fixture
+def local_store(monkeypatch, tmp_path):
+    """Fresh Chroma store + manifest in tmp_path; embeddings faked and counted."""
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+    monkeypatch.setattr(rag_engine, "_chroma_client", client)
+    monkeypatch.setattr(rag_engine, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(rag_engine, "_lexical", LexicalIndex(path=str(tmp_path / "bm25.json")))
+    embedded = []
+    monkeypatch.setattr(rag_engine, "_embed_texts", lambda texts: embedded.extend(texts) or [[float(len(t)), 1.0] for t in texts])
+    return {"embedded": embedded, "collection": rag_engine._get_collection}
+
+
+def test_reingest_is_incremental_and_idempotent(local_store, tmp_path):
+    doc = tmp_path / "battery.md"
+    paragraphs = [f"Step {i}. " + ("Open Settings and check Battery Health. " * 10) + f"Paragraph {i}." for i in range(4)]
+    doc.write_text("---\ncategory: battery\n---\n" + "\n\n".join(paragraphs), encoding="utf-8")
+    n = rag_engine.ingest_document(str(doc))
+    assert n >= 4 and len(local_store["embedded"]) == n
+    collection = local_store["collection"]()
+    assert collection.count() == n
+
+    # Unchanged file: no chunking, no embedding, same chunk count
+    local_store["embedded"].clear()
+    assert rag_engine.ingest_document(str(doc)) == n
+    result = rag_engine.ingest_directory(str(tmp_path))
+    assert result["skipped"] == 1 and result["embedded"] == 0
+    assert local_store["embedded"] == []
+
+    # Edit one paragraph and drop another: only the edited chunk is embedded, the dropped one is deleted
+    paragraphs[1] = paragraphs[1].replace("Paragraph 1.", "Paragraph one, revised.")
+    doc.write_text("---\ncategory: battery\n---\n" + "\n\n".join(paragraphs[:3]), encoding="utf-8")
+    m = rag_engine.ingest_document(str(doc))
+    assert len(local_store["embedded"]) == 1 and "revised" in local_store["embedded"][0]
+    assert collection.count() == m == n - 1
+    indexes = sorted(meta["chunk_index"] for meta in collection.get(include=["metadatas"])["metadatas"])
+    assert indexes == list(range(m))
+
+
+def test_failed_embedding_keeps_the_previous_version_of_a_document(local_store, tmp_path, monkeypatch):
+    doc = tmp_path / "battery.md"
+    paragraphs = [f"Step {i}. " + ("Open Settings and check Battery Health. " * 10) + f"Paragraph {i}." for i in range(4)]
+    doc.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    n = rag_engine.ingest_directory(str(tmp_path))["chunks"]
+    collection = local_store["collection"]()
+    before = sorted(collection.get()["ids"])
+
+    def down(texts):
+        raise ValueError("embedding request rejected")
+    monkeypatch.setattr(rag_engine, "_embed_texts", down)
+    paragraphs[1] = paragraphs[1].replace("Paragraph 1.", "Paragraph one, revised.")
+    doc.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    assert rag_engine.ingest_directory(str(tmp_path))["failed"] == ["battery.md"]
+    assert sorted(collection.get()["ids"]) == before  # The outdated chunk is only deleted once its replacement is stored
+
+    monkeypatch.setattr(rag_engine, "_embed_texts", lambda texts: [[float(len(t)), 1.0] for t in texts])
+    result = rag_engine.ingest_directory(str(tmp_path))
+    assert result["failed"] == [] and collection.count() == result["chunks"] == n
+    assert sorted(collection.get()["ids"]) != before
+
+
+def test_ingest_directory_parallel_loaders_report_per_file_progress(local_store, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("wifi", "storage", "screen"):
+        (docs / f"{name}.md").write_text(f"# {name}\n\n" + f"Restart your iPhone to fix {name}. " * 40, encoding="utf-8")
+    events = []
+    result = rag_engine.ingest_directory(str(docs), workers=2, progress=events.append)
+    assert result["files"] == 3 and result["embedded"] == result["chunks"] > 0
+    assert [e["done"] for e in events] == [1, 2, 3] and all(e["total"] == 3 for e in events)
+    assert all({"load_seconds", "chunk_seconds", "plan_seconds"} <= e.keys() for e in events)
+    assert local_store["collection"]().count() == result["chunks"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unreadable_file_is_reported_failed_without_stopping_the_run(local_store, tmp_path, workers):
+    pytest.importorskip("pypdf")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "bad.pdf").write_bytes(b"%PDF-1.4 not really a pdf")
+    (docs / "wifi.md").write_text("Forget the network and join it again. " * 20, encoding="utf-8")
+    events = []
+    result = rag_engine.ingest_directory(str(docs), workers=workers, progress=events.append)
+    assert result["failed"] == ["bad.pdf"] and result["files"] == 1
+    bad = next(f for f in result["details"] if f["source_file"] == "bad.pdf")
+    assert bad["failed"] and bad["error"] and bad["path"].endswith("bad.pdf")
+    assert len(events) == 2
+    # The good file was recorded in the manifest: the next run skips it and retries only the bad one
+    assert rag_engine.ingest_directory(str(docs), workers=workers)["skipped"] == 1
+
+
+def test_bm25_index_follows_writes_from_another_process(local_store, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "restore.md").write_text("If the restore stops with Error 4013, use another cable.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+    monkeypatch.setattr(rag_engine, "_embed_texts", lambda texts: (_ for _ in ()).throw(ConnectionError("down")))
+    assert rag_engine.retrieve("error 4013", top_k=2)[0]["source_file"] == "restore.md"
+
+    # knowledge_base/ingest.py in another process: replaces the chunk and saves its own copy of the index
+    collection = local_store["collection"]()
+    old_ids = collection.get()["ids"]
+    other = LexicalIndex(path=str(tmp_path / "bm25.json"))
+    other.load()
+    collection.delete(ids=old_ids)
+    other.delete(old_ids)
+    collection.upsert(ids=["restore.md#new"], embeddings=[[1.0, 1.0]], documents=["Error 4013: update macOS first."],
+                      metadatas=[{"source_file": "restore.md"}])
+    other.upsert(["restore.md#new"], ["Error 4013: update macOS first."], [{"source_file": "restore.md"}])
+    other.save()
+
+    rag_engine.collection_stats.invalidate()  # What COLLECTION_STATS_TTL does in the server
+    hits = rag_engine.retrieve("error 4013", top_k=2)
+    assert [h["chunk_id"] for h in hits] == ["restore.md#new"] and "macOS" in hits[0]["content"]
+
+
+def test_frontmatter_becomes_chunk_metadata_and_category_prefilter(local_store, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "battery.md").write_text(
+        "---\ntitle: Battery\ncategory: Battery\nupdated: 2024-01-15\nhas_images: true\n"
+        "image_urls:\n  - https://support.apple.com/a.png\n  - https://support.apple.com/b.png\n---\n"
+        "Open Settings > Battery to see which apps use the most power.", encoding="utf-8")
+    (docs / "wifi.md").write_text("---\ncategory: wifi\n---\nForget the network and join it again.", encoding="utf-8")
+    (docs / "upload.md").write_text("Keep the battery between 20 and 80 percent.", encoding="utf-8")  # No frontmatter
+    rag_engine.ingest_directory(str(docs), workers=1)
+
+    meta = local_store["collection"]().get(where={"source_file": "battery.md"}, include=["metadatas"])["metadatas"][0]
+    assert meta["category"] == "battery" and meta["updated"] == "2024-01-15" and meta["has_images"] is True
+    assert "title" in meta and "category:" not in local_store["embedded"][0]
+
+    results = rag_engine.retrieve("battery", top_k=5, filter_metadata={"category": "battery"})
+    assert [r["source_file"] for r in results] == ["battery.md"]
+    assert results[0]["has_images"] and results[0]["image_urls"] == ["https://support.apple.com/a.png", "https://support.apple.com/b.png"]
+    assert rag_engine.retrieve("battery", top_k=5, filter_metadata={"category": "wifi", "source_file": "wifi.md"})[0]["source_file"] == "wifi.md"
+    # Uncategorized documents are filed under "general", which the session pre-filter always lets through
+    either = rag_engine.retrieve("battery", top_k=5, filter_metadata={"category": {"$in": ["battery", "general"]}})
+    assert sorted(r["source_file"] for r in either) == ["battery.md", "upload.md"]
+
+
+def test_hybrid_retrieve_fuses_exact_terms_and_survives_embedding_outage(local_store, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "restore.md").write_text("If the restore stops with Error 4013, use another cable.", encoding="utf-8")
+    (docs / "battery.md").write_text("Battery drains fast: check Settings and Low Power Mode.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+
+    # Dense search alone prefers the battery chunk; BM25 pulls the exact "4013" match to the top
+    monkeypatch.setattr(rag_engine, "_embed_texts", lambda texts: [[1.0, 0.0] if "4013" in t else [55.0, 1.0] for t in texts])
+    hybrid = rag_engine.retrieve("error 4013", top_k=2)
+    assert hybrid[0]["source_file"] == "restore.md"
+    assert hybrid[0]["lexical_score"] > 0 and hybrid[0]["vector_score"] is not None
+
+    def down(texts):
+        raise ConnectionError("embedding API down")
+    monkeypatch.setattr(rag_engine, "_embed_texts", down)
+    lexical_only = rag_engine.retrieve("error 4013", top_k=2)
+    assert [r["source_file"] for r in lexical_only] == ["restore.md"]
+    assert lexical_only[0]["vector_score"] is None and 0 < lexical_only[0]["relevance_score"] < 1
+
+
+def test_retrieve_reuses_collection_handle_and_count_until_ingestion(local_store, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "wifi.md").write_text("Forget the Wi-Fi network and join it again.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+    opened = []
+    real = rag_engine._get_collection
+    monkeypatch.setattr(rag_engine, "_get_collection", lambda: opened.append(1) or real())
+    for _ in range(3):
+        assert rag_engine.retrieve("wifi network", top_k=2)[0]["source_file"] == "wifi.md"
+    assert len(opened) <= 1
+
+    (docs / "screen.md").write_text("If the screen flickers, turn off Auto-Brightness.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+    before = len(opened)
+    assert rag_engine.retrieve("screen flickers", top_k=2)[0]["source_file"] == "screen.md"
+    assert len(opened) == before + 1 and rag_engine.collection_stats.stats()["count"] == 2
+
+
+def test_scoring_features_stored_at_ingestion_and_applied_as_arrays(local_store, tmp_path):
+    import time
+    import numpy as np
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "short.md").write_text("---\nupdated: 2001-01-01\n---\nRestart the phone.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+    meta = local_store["collection"]().get(include=["metadatas"])["metadatas"][0]
+    assert meta["domain_class"] == 0 and meta["token_count"] == len("Restart the phone.") // 4
+    assert meta["updated_epoch"] == 978307200
+
+    now = time.time()
+    metas = [
+        {"source_file": "https://support.apple.com/en-us/102", "updated": time.strftime("%Y-%m-%d", time.gmtime(now - 86400))},
+        {"source_file": "notes.md", "updated": "2001-01-01"},
+        meta,
+    ]
+    texts = ["x" * 400, "tiny", "Restart the phone."]
+    domain, updated, tokens = rag_engine._feature_arrays(texts, metas)
+    scores = rag_engine._boosted_scores(np.array([0.5, 0.5, 0.02]), domain, updated, tokens, now=now)
+    assert np.allclose(scores, [0.5 + rag_engine.BOOST_SUPPORT_APPLE + rag_engine.BOOST_RECENT_6MO,
+                                0.5 - rag_engine.PENALTY_SHORT_CHUNK, 0.0])
+
+
+def test_retrieve_many_embeds_and_queries_once_and_matches_single_queries(local_store, tmp_path, monkeypatch):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "restore.md").write_text("If the restore stops with Error 4013, use another cable.", encoding="utf-8")
+    (docs / "battery.md").write_text("Battery drains fast: check Settings and Low Power Mode.", encoding="utf-8")
+    (docs / "wifi.md").write_text("Forget the Wi-Fi network and join it again.", encoding="utf-8")
+    rag_engine.ingest_directory(str(docs), workers=1)
+    queries = ["error 4013", "battery drains fast", "wifi network"]
+    single = [rag_engine.retrieve(q, top_k=2) for q in queries]
+
+    local_store["embedded"].clear()
+    collection = rag_engine.collection_stats.get()[0]
+    calls = []
+    real_query = collection.query
+    monkeypatch.setattr(collection, "query", lambda **kw: calls.append(len(kw["query_embeddings"])) or real_query(**kw))
+    batched = rag_engine.retrieve_many(queries, top_k=2)
+    assert local_store["embedded"] == queries and calls == [3]
+    assert batched == single
+    assert rag_engine.retrieve_many([]) == []
+
+    # Hits carry their chunk id; stored embeddings come back unit-normalized, zeros for unknown ids
+    ids = [r["chunk_id"] for r in batched[1]] + ["gone.md#0"]
+    stored = rag_engine.chunk_embeddings(ids)
+    assert stored.shape == (len(ids), 2) and not stored[-1].any()
+    assert abs(float(stored[0] @ stored[0]) - 1.0) < 1e-5
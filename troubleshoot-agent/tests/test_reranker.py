@@ -0,0 +1,91 @@
+"""Tests for the micro-batching reranking service."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import rag_engine, reranker
+from modules.reranker import RerankService
+
+
+class FakeScorer:
+    """Score = length of the chunk; records the size of every forward pass."""
+
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+
+    def predict(self, pairs):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [float(len(doc)) for _, doc in pairs]
+
+
+def _concurrent(service, requests):
+    out = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def call(i):
+        barrier.wait()
+        out[i] = service.score(requests[i])
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_concurrent_requests_share_forward_passes_and_get_their_own_scores():
+    scorer = FakeScorer(delay=0.02)
+    service = RerankService(scorer_factory=lambda: scorer, max_batch_pairs=64, max_wait_ms=50)
+    requests = [[("q", "x" * (i + 1)), ("q", "y" * (i + 10))] for i in range(8)]
+    out = _concurrent(service, requests)
+    assert out == [[float(i + 1), float(i + 10)] for i in range(8)]
+    assert sum(scorer.batches) == 16 and len(scorer.batches) < 8
+    assert service.stats()["requests_per_batch"] > 1
+    service.close()
+
+
+def test_batch_cap_and_latency_window():
+    scorer = FakeScorer()
+    service = RerankService(scorer_factory=lambda: scorer, max_batch_pairs=4, max_wait_ms=30)
+    _concurrent(service, [[("q", "a")] * 3 for _ in range(3)])
+    assert all(n <= 4 for n in scorer.batches) and sum(scorer.batches) == 9
+    # A lone request waits for the window, not more
+    start = time.perf_counter()
+    assert service.score([("q", "abc")]) == [3.0]
+    assert time.perf_counter() - start < 0.5
+    service.close()
+
+
+def test_scorer_errors_reach_every_caller_and_rerank_keeps_order(monkeypatch):
+    def broken():
+        raise ImportError("No module named 'sentence_transformers'")
+    service = RerankService(scorer_factory=broken, max_wait_ms=1)
+    with pytest.raises(ImportError):
+        service.score([("q", "d")])
+    monkeypatch.setattr(reranker, "_service", service)
+    results = [{"content": "b", "relevance_score": 0.4}, {"content": "a", "relevance_score": 0.6}]
+    assert rag_engine.rerank_results([dict(r) for r in results], "q") == results
+    service.close()
+
+
+def test_rerank_scores_are_calibrated_and_kept_apart_from_retrieval_scores(monkeypatch):
+    service = RerankService(scorer_factory=lambda: FakeScorer(), max_wait_ms=1)
+    monkeypatch.setattr(reranker, "_service", service)
+    results = [{"content": "ab", "relevance_score": 0.9}, {"content": "abcd", "relevance_score": 0.4}]
+    out = rag_engine.rerank_results([dict(r) for r in results], "q")
+    assert [r["relevance_score"] for r in out] == [0.4, 0.9]  # re-sorted, retrieval scores untouched
+    assert [r["rerank_logit"] for r in out] == [4.0, 2.0]
+    assert 0.98 < out[0]["rerank_score"] < 1.0 and out[0]["rerank_score"] > out[1]["rerank_score"]
+    assert rag_engine.calibrate_rerank_score(0.0) == 0.5
+    assert rag_engine.calibrate_rerank_score(-800.0) == 0.0  # no overflow on extreme logits
+    assert rag_engine.calibrate_rerank_score(1.0, (2.0, -2.0)) == 0.5
+    assert rag_engine.gating_scores(out) == ([out[0]["rerank_score"], out[1]["rerank_score"]], rag_engine.RERANK_SCORE_THRESHOLD)
+    assert rag_engine.gating_scores(results) == ([0.9, 0.4], rag_engine.RAG_SCORE_THRESHOLD)
+    service.close()
@@ -0,0 +1,55 @@
+"""Tests for the chat-turn stage scheduler."""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.stage_scheduler import StageScheduler
+
+
+def _sleeper(seconds: float, value):
+    async def fn(deps):
+        await asyncio.sleep(seconds)
+        return value
+    return fn
+
+
+def test_independent_stages_overlap_and_critical_path():
+    async def scenario():
+        s = StageScheduler()
+        s.add("image", _sleeper(0.15, "img"))
+        s.add("retrieve", _sleeper(0.05, [1, 2]))
+        s.add("rerank", lambda d: _sleeper(0.05, list(reversed(d["retrieve"])))(d), deps=("retrieve",))
+        s.start()
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        assert await s.result("rerank") == [2, 1]
+        assert await s.result("image") == "img"
+        return loop.time() - t0, s.report()
+    elapsed, report = asyncio.run(scenario())
+    assert elapsed < 0.25  # image ∥ (retrieve → rerank), not 0.25s serial
+    assert report["critical_path"] == ["image"]
+    assert report["stages"]["rerank"]["status"] == "ok"
+
+
+def test_timeout_uses_fallback_and_skip_and_cancel():
+    async def scenario():
+        s = StageScheduler()
+        s.add("retrieve", _sleeper(0.0, [0.2]))
+        s.add("rerank", _sleeper(1.0, None), deps=("retrieve",), timeout=0.05, fallback=lambda d: d["retrieve"])
+        s.add("web", _sleeper(1.0, ["web"]), deps=("retrieve",), when=lambda d: d["retrieve"][0] < 0.5)
+        s.add("never", _sleeper(0.0, "x"), deps=("retrieve",), when=lambda d: False, fallback="skipped")
+        s.start()
+        assert await s.result("rerank") == [0.2]
+        assert await s.wait_started("web") is True
+        assert await s.wait_started("never") is False
+        assert await s.result("never") == "skipped"
+        s.cancel("web")
+        await asyncio.sleep(0)
+        return s.report(used=["retrieve", "rerank"])
+    report = asyncio.run(scenario())
+    assert report["stages"]["rerank"]["status"] == "timeout"
+    assert report["stages"]["web"]["status"] == "cancelled"
+    assert report["stages"]["never"]["status"] == "skipped"
+    assert report["critical_path"] == ["retrieve", "rerank"]
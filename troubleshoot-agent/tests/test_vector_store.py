@@ -0,0 +1,123 @@
+"""Tests for the pluggable vector stores (Chroma and the in-process mmap flat store)."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import rag_engine, vector_store
+from modules.lexical_index import LexicalIndex
+from modules.vector_store import FlatStore
+
+
+def _data(n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    ids = [f"doc{i % 7}.md#{i}" for i in range(n)]
+    metas = [{"source_file": f"doc{i % 7}.md", "category": "battery" if i % 2 else "wifi", "chunk_index": i} for i in range(n)]
+    return ids, vectors, [f"chunk {i}" for i in range(n)], metas
+
+
+@pytest.fixture
+def stores(tmp_path):
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+    return vector_store.ChromaStore(client, "parity"), FlatStore(str(tmp_path / "flat"))
+
+
+def test_flat_store_matches_chroma_results(stores):
+    ids, vectors, docs, metas = _data()
+    for store in stores:
+        store.upsert(ids, vectors.tolist(), docs, metas)
+        store.update(ids[:3], [{"category": "storage"}] * 3)
+        store.delete(ids=ids[10:20])
+    chroma, flat = stores
+    assert chroma.count() == flat.count() == 190
+    assert flat.get(ids=[ids[0]], include=["metadatas"])["metadatas"][0]["source_file"] == "doc0.md"  # update merges
+
+    queries = np.random.default_rng(1).standard_normal((3, 16)).tolist()
+    for where in (None, {"category": "battery"}, {"$and": [{"category": "wifi"}, {"source_file": "doc2.md"}]}):
+        a = chroma.query(query_embeddings=queries, n_results=5, where=where, include=["documents", "metadatas", "distances"])
+        b = flat.query(query_embeddings=queries, n_results=5, where=where, include=["documents", "metadatas", "distances"])
+        assert b["ids"] == a["ids"]
+        assert np.allclose(b["distances"], a["distances"], atol=2e-3)  # float16 storage
+        assert b["documents"] == a["documents"] and b["metadatas"] == a["metadatas"]
+    got = flat.get(where={"category": "storage"}, include=["embeddings", "documents"])
+    assert sorted(got["ids"]) == sorted(ids[:3]) and got["embeddings"].shape == (3, 16)
+
+
+def test_flat_store_persists_grows_and_sees_other_writers(tmp_path):
+    ids, vectors, docs, metas = _data(n=1500)
+    store = FlatStore(str(tmp_path / "flat"))
+    store.upsert(ids, vectors.tolist(), docs, metas)
+    assert store.stats()["capacity"] >= 1500
+    reader = FlatStore(str(tmp_path / "flat"))  # Another process's view of the same directory
+    assert reader.count() == 1500
+    store.delete(ids=ids[:500])
+    store.upsert(["new.md#0"], [vectors[0].tolist()], ["new chunk"], [{"source_file": "new.md"}])
+    assert reader.count() == 1001  # Picked up via the generation counter
+    hit = reader.query(query_embeddings=[vectors[0].tolist()], n_results=1, include=["documents"])
+    assert hit["ids"] == [["new.md#0"]] and hit["documents"] == [["new chunk"]]
+
+
+def test_ivf_lists_keep_recall_and_follow_writes(tmp_path):
+    rng = np.random.default_rng(2)
+    centers = rng.standard_normal((16, 32))
+    vectors = (centers[rng.integers(0, 16, 4000)] + 0.3 * rng.standard_normal((4000, 32))).astype(np.float32)
+    ids = [f"c#{i}" for i in range(4000)]
+    exact = FlatStore(str(tmp_path / "exact"))
+    ivf = FlatStore(str(tmp_path / "ivf"), ivf_lists=16, ivf_probe=3)
+    for store in (exact, ivf):
+        store.upsert(ids, vectors.tolist())
+    queries = (centers[rng.integers(0, 16, 50)] + 0.3 * rng.standard_normal((50, 32))).tolist()
+    truth = exact.query(query_embeddings=queries, n_results=10, include=[])["ids"]
+    approx = ivf.query(query_embeddings=queries, n_results=10, include=[])["ids"]
+    recall = np.mean([len(set(a) & set(t)) / 10 for a, t in zip(approx, truth)])
+    assert recall >= 0.9 and ivf.stats()["ivf_lists"] == 16
+    ivf.delete(ids=ids[:100])
+    ivf.upsert(["late#0"], [queries[0]])
+    assert ivf.query(query_embeddings=[queries[0]], n_results=1, include=[])["ids"] == [["late#0"]]
+
+
+def test_rag_engine_on_flat_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(rag_engine, "VECTOR_DB", "flat")
+    monkeypatch.setattr(rag_engine, "FLAT_STORE_DIR", str(tmp_path / "flat"))
+    monkeypatch.setattr(rag_engine, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(rag_engine, "_lexical", LexicalIndex(path=str(tmp_path / "bm25.json")))
+    monkeypatch.setattr(rag_engine, "_embed_texts", lambda texts: [[float(len(t)), 1.0] for t in texts])
+    rag_engine.collection_stats.invalidate()
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "battery.md").write_text("---\ncategory: battery\n---\nOpen Settings > Battery to see app usage.", encoding="utf-8")
+    (docs / "wifi.md").write_text("---\ncategory: wifi\n---\nForget the network and join it again.", encoding="utf-8")
+    assert rag_engine.ingest_directory(str(docs), workers=1)["chunks"] == 2
+    assert isinstance(rag_engine._get_collection(), FlatStore)
+    results = rag_engine.retrieve("network", top_k=2, filter_metadata={"category": "wifi"})
+    assert [r["source_file"] for r in results] == ["wifi.md"] and results[0]["vector_score"] is not None
+    assert rag_engine.ingest_directory(str(docs), workers=1)["skipped"] == 2
+    rag_engine.collection_stats.invalidate()
+
+
+@pytest.mark.parametrize("quantization, quant_dims, min_recall, ratio", [("int8", 0, 0.95, 4), ("binary", 0, 0.85, 32), ("binary", 64, 0.7, 64)])
+def test_quantized_scan_rescores_shortlist_exactly(tmp_path, quantization, quant_dims, min_recall, ratio):
+    rng = np.random.default_rng(3)
+    centers = rng.standard_normal((32, 128))
+    vectors = (centers[rng.integers(0, 32, 3000)] + 0.6 * rng.standard_normal((3000, 128))).astype(np.float32)
+    ids = [f"c#{i}" for i in range(3000)]
+    exact = FlatStore(str(tmp_path / "exact"))
+    quant = FlatStore(str(tmp_path / "quant"), quantization=quantization, quant_dims=quant_dims)
+    for store in (exact, quant):
+        store.upsert(ids, vectors.tolist())
+    queries = (centers[rng.integers(0, 32, 40)] + 0.6 * rng.standard_normal((40, 128))).tolist()
+    truth = exact.query(query_embeddings=queries, n_results=10, include=["distances"])
+    approx = quant.query(query_embeddings=queries, n_results=10, include=["distances"])
+    recall = np.mean([len(set(a) & set(t)) / 10 for a, t in zip(approx["ids"], truth["ids"])])
+    assert recall >= min_recall
+    assert approx["ids"][0][0] == truth["ids"][0][0]
+    assert np.allclose(approx["distances"][0][0], truth["distances"][0][0], atol=1e-4)  # Rescored, not approximate
+    assert quant.stats()["scan_bytes"] * ratio == exact.stats()["scan_bytes"]
+    with pytest.raises(ValueError):
+        FlatStore(str(tmp_path / "bad"), quantization="pq")
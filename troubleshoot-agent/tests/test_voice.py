@@ -25,3 +25,54 @@ def test_synthesize_returns_bytes():
     # May be empty if no API key
     out = voice_tts.synthesize("Hello")
     assert isinstance(out, bytes)
+
+
+def test_sentence_splitter_streams_sentences():
+    splitter = voice_tts.SentenceSplitter(min_chars=25)
+    out = []
+    for delta in ["Open Sett", "ings. Then tap Bat", "tery. Ok. Now turn on Low Power Mode.", " Done"]:
+        out.extend(splitter.feed(delta))
+    out.extend(splitter.flush())
+    # First sentence is emitted immediately; short "Ok." is merged into the next sentence
+    assert out == ["Open Settings.", "Then tap Battery. Ok. Now turn on Low Power Mode.", "Done"]
+
+
+def test_sentence_splitter_holds_back_a_leading_list_marker():
+    splitter = voice_tts.SentenceSplitter(min_chars=25)
+    out = []
+    for delta in ["1. ", "Open Settings. ", "2. Tap Battery and turn on Low Power Mode."]:
+        out.extend(splitter.feed(delta))
+    out.extend(splitter.flush())
+    assert out == ["1. Open Settings.", "2. Tap Battery and turn on Low Power Mode."]
+
+
+def test_stream_synthesize_yields_segments_in_order(monkeypatch):
+    import asyncio
+    import time
+
+    def fake_synthesize(text, **kw):
+        time.sleep(0.05 if text.startswith("First") else 0.0)  # first sentence finishes last
+        return text.encode()
+    monkeypatch.setattr(voice_tts, "synthesize", fake_synthesize)
+
+    async def collect():
+        return [chunk async for chunk in voice_tts.stream_synthesize(
+            "First, open the Settings app on your iPhone. Second, scroll down and tap Battery to see usage. "
+            "Third, turn on Low Power Mode from that screen."
+        )]
+    chunks = asyncio.run(collect())
+    assert [c.decode().split()[0] for c in chunks] == ["First,", "Second,", "Third,"]
+
+
+def test_synthesize_serves_repeated_text_from_audio_cache(monkeypatch, tmp_path):
+    from modules import audio_cache
+    cache = audio_cache.AudioCache(directory=str(tmp_path))
+    calls = []
+    monkeypatch.setattr(audio_cache, "get_cache", lambda: cache)
+    monkeypatch.setattr(voice_tts, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(voice_tts, "_synthesize_openai", lambda text, voice, speed: calls.append(text) or b"ID3" + text.encode())
+    first = voice_tts.synthesize("Go to Settings, then Battery.")
+    assert voice_tts.synthesize("Go to Settings, then Battery.") == first
+    assert len(calls) == 1
+    voice_tts.synthesize("Go to Settings, then Battery.", speed=1.2)  # different speed -> new audio
+    assert len(calls) == 2
@@ -0,0 +1,26 @@
+"""Tests for web search gating and the speculative web-need predictor."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import web_search
+
+
+def test_is_web_search_needed():
+    assert web_search.is_web_search_needed([], threshold=0.85) is True
+    assert web_search.is_web_search_needed([0.6], threshold=0.85) is True
+    assert web_search.is_web_search_needed([0.9], threshold=0.85) is False
+
+
+def test_predictor_uses_query_features_and_history():
+    p = web_search.WebNeedPredictor()
+    covered = p.predict("battery drains fast", "battery")
+    specific = p.predict("iOS 18 error 4013 after update", "general")
+    assert covered < 0.5 <= specific
+    # Weak vector scores for this turn dominate
+    assert p.predict("battery drains fast", "battery", vector_scores=[0.3]) >= 0.9
+    # A category that keeps needing the web drifts upward
+    for _ in range(10):
+        p.record("bluetooth", top_score=0.4, needed_web=True)
+    assert p.predict("airpods won't pair", "bluetooth") > p.predict("airpods won't pair", "screen")
@@ -0,0 +1,73 @@
+"""Tests for the per-session retrieval working set."""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules import metrics, rag_engine, working_set
+from modules.context_manager import ConversationContext
+
+EMBEDDINGS = {
+    "battery drains fast": [1.0, 0.0, 0.0],
+    "battery drains fast what next?": [0.95, 0.3, 0.0],
+    "how do I back up to iCloud": [0.0, 0.0, 1.0],
+}
+CHUNKS = {"a#1": [0.0, 1.0, 0.0], "b#1": [1.0, 0.0, 0.0]}
+
+
+def _results():
+    return [{"chunk_id": cid, "content": cid, "rerank_score": score} for cid, score in (("b#1", 0.9), ("a#1", 0.6))]
+
+
+def _patch(monkeypatch):
+    monkeypatch.setattr(rag_engine, "RETRIEVE_EMBED_TIMEOUT", 0.1)
+    monkeypatch.setattr(rag_engine, "embed_query", lambda q: EMBEDDINGS[q])
+    monkeypatch.setattr(rag_engine, "chunk_embeddings", lambda ids: np.array([CHUNKS[i] for i in ids], dtype=np.float32))
+    metrics.reset()
+
+
+def test_on_topic_turns_reuse_the_set_ranked_for_the_new_query(monkeypatch):
+    _patch(monkeypatch)
+    ctx = ConversationContext("s")
+    assert working_set.lookup(ctx, "battery drains fast", "battery") is None
+    working_set.remember(ctx, "battery drains fast", "battery", _results())
+
+    reused = working_set.lookup(ctx, "battery drains fast what next?", "battery")
+    assert [r["chunk_id"] for r in reused] == ["b#1", "a#1"] and all(r["reused"] for r in reused)
+    # Scores belonged to the old query: the rerank stage scores reused chunks again
+    assert "rerank_score" not in reused[0] and ctx.working_set.results[0]["rerank_score"] == 0.9
+    assert "reused" not in ctx.working_set.results[0]
+    assert metrics.snapshot()["counters"]["working_set_hit"] == 1
+
+    # Drift, another category, or too many turns served: retrieve again
+    assert working_set.lookup(ctx, "how do I back up to iCloud", "battery") is None
+    assert working_set.lookup(ctx, "battery drains fast", "storage") is None
+    for _ in range(working_set.WORKING_SET_MAX_TURNS - 1):
+        assert working_set.lookup(ctx, "battery drains fast", "battery") is not None
+    assert working_set.lookup(ctx, "battery drains fast", "battery") is None
+    counters = metrics.snapshot()["counters"]
+    assert counters["working_set_drift"] == 1 and counters["working_set_expired"] == 2
+
+
+def test_slow_query_embedding_counts_as_drift(monkeypatch):
+    _patch(monkeypatch)
+    ctx = ConversationContext("s")
+    working_set.remember(ctx, "battery drains fast", "battery", _results())
+    monkeypatch.setattr(rag_engine, "embed_query", lambda q: time.sleep(0.5) or EMBEDDINGS[q])
+    started = time.perf_counter()
+    assert working_set.lookup(ctx, "battery drains fast", "battery") is None
+    assert time.perf_counter() - started < 0.4 and metrics.snapshot()["counters"]["working_set_drift"] == 1
+
+
+def test_unranked_results_are_not_kept_and_ingestion_drops_sets(monkeypatch):
+    _patch(monkeypatch)
+    ctx = ConversationContext("s")
+    working_set.remember(ctx, "battery drains fast", "battery", _results())
+    working_set.remember(ctx, "battery drains fast", "battery", [{"chunk_id": "a#1", "content": "a"}])  # Reranker down
+    assert ctx.working_set is None
+    working_set.remember(ctx, "battery drains fast", "battery", _results())
+    working_set.drop([ctx])
+    assert ctx.working_set is None